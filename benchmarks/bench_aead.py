@@ -0,0 +1,97 @@
+"""AEAD record layer: records/sec and MB/s of _EncryptedSocket vs the previous wrapper.
+
+The previous wrapper is reproduced below (fresh nonce bytes, lock, allocated ciphertext,
+concatenated length prefix, two recv_exact per record). Both run over a socketpair,
+the main thread reads the plaintext stream back with recv_into.
+
+Scenarios:
+    single   - one sender thread, one record per message
+    burst    - four sender threads, concurrently queued plaintexts may share a record
+
+'msg/s' counts sendall calls, with one record per message for the previous wrapper.
+
+Usage: python -m benchmarks.bench_aead [bytes per case]
+"""
+import os
+import sys
+import socket
+import threading
+from time import perf_counter
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+from onionchat.plugin.aead import _EncryptedSocket
+from onionchat.utils.funcs import recv_exact
+
+class LegacyEncryptedSocket:
+    """Record layer before buffer reuse."""
+    def __init__(self, raw_sock: socket.socket, send_key: bytes, recv_key: bytes):
+        self._sock = raw_sock
+        self._send_aead = ChaCha20Poly1305(send_key)
+        self._recv_aead = ChaCha20Poly1305(recv_key)
+        self._send_counter = 0
+        self._recv_counter = 0
+        self._lock = threading.Lock()
+        self._pt = b""
+
+    def _nonce(self, counter: int) -> bytes:
+        return b"\x00\x00\x00\x00" + counter.to_bytes(8, "big")
+
+    def sendall(self, data: bytes) -> None:
+        # the original released the lock before sending, concurrent senders could reorder nonces
+        with self._lock:
+            nonce = self._nonce(self._send_counter)
+            self._send_counter += 1
+            ct = self._send_aead.encrypt(nonce, data, None)
+            self._sock.sendall(len(ct).to_bytes(4, "big") + ct)
+
+    def recv_into(self, buffer, nbytes: int = 0) -> int:
+        if not self._pt:
+            length = int.from_bytes(recv_exact(self._sock, 4), "big")
+            ct = recv_exact(self._sock, length)
+            with self._lock:
+                nonce = self._nonce(self._recv_counter)
+                self._recv_counter += 1
+            self._pt = self._recv_aead.decrypt(nonce, ct, None)
+        n = min(nbytes or len(buffer), len(self._pt))
+        buffer[:n] = self._pt[:n]
+        self._pt = self._pt[n:]
+        return n
+
+def run(cls, size: int, senders: int, total: int) -> tuple[float, float]:
+    """Send about 'total' bytes split over 'senders' threads, returns (msg/s, MB/s)."""
+    a, b = socket.socketpair()
+    k1, k2 = os.urandom(32), os.urandom(32)
+    tx, rx = cls(a, k1, k2), cls(b, k2, k1)
+    msg = os.urandom(size)
+    count = max(1, min(total // size, 200_000) // senders)
+
+    def send() -> None:
+        for _ in range(count):
+            tx.sendall(msg)
+
+    threads = [threading.Thread(target=send) for _ in range(senders)]
+    expected = count * senders * size
+    got = 0
+    buf = bytearray(1 << 20)
+    t0 = perf_counter()
+    for t in threads:
+        t.start()
+    while got < expected:
+        got += rx.recv_into(buf, len(buf))
+    elapsed = perf_counter() - t0
+    for t in threads:
+        t.join()
+    a.close()
+    b.close()
+    return count * senders / elapsed, got / elapsed / 1e6
+
+def main() -> None:
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 256 * 1024 * 1024
+    print(f"{'scenario':<9}{'size':>8}{'wrapper':>10}{'msg/s':>12}{'MB/s':>10}")
+    for scenario, senders in (("single", 1), ("burst", 4)):
+        for size in (64, 1024, 16 * 1024, 256 * 1024):
+            for name, cls in (("legacy", LegacyEncryptedSocket), ("current", _EncryptedSocket)):
+                rate, mbs = run(cls, size, senders, total)
+                print(f"{scenario:<9}{size:>8}{name:>10}{rate:>12.0f}{mbs:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""PayloadChat codecs: encode/decode cost and bytes on the wire, json vs binary.
+
+Usage: python -m benchmarks.bench_payload_codec [iterations]
+"""
+import sys
+from time import perf_counter, time
+import onionchat.config as cfg
+from onionchat import __protocol_version__
+from onionchat.utils.payload_codec import make_codec
+
+FIELDS = {'s': "192.168.1.20", 'r': "192.168.1.21", 't': time(), 'x': "text", 'v': __protocol_version__, 'n': 42}
+
+def per_op_us(fn, iterations: int) -> float:
+    t0 = perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (perf_counter() - t0) / iterations * 1e6
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"{'flags':<8}{'msg':>6}{'codec':>8}{'wire B':>8}{'enc us':>9}{'dec us':>9}")
+    for flags in ("", "st", "srtxvn"):
+        fields = {f: FIELDS[f] for f in flags}
+        for size in (16, 256):
+            msg = "m" * size
+            for name in ("json", "binary"):
+                codec = make_codec(name, flags, cfg.encoding) # type: ignore
+                data = codec.encode(fields, msg)
+                enc = per_op_us(lambda: codec.encode(fields, msg), iterations)
+                dec = per_op_us(lambda: codec.decode(data), iterations)
+                wire = cfg.frame_len_bytes + len(data)
+                print(f"{flags or '-':<8}{size:>6}{name:>8}{wire:>8}{enc:>9.2f}{dec:>9.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Peering latency: serial connect-then-host vs concurrent connect-and-listen race.
+
+Two peers run in threads on 127.0.0.1 / 127.0.0.2 (Linux routes all of 127/8 to lo).
+Reports time from the later peer's start until the first message arrives.
+
+Scenarios:
+    refused   - the late peer's port is closed, connects are refused instantly (LAN)
+    filtered  - SYNs to the late peer are dropped until it starts (firewalls, Tor-like paths)
+
+Usage: python -m benchmarks.bench_peering [rounds]
+"""
+import sys
+import socket
+import logging
+import random
+import threading
+from time import monotonic, sleep
+from statistics import median
+from onionchat.conn.p2p import PeerConnection
+from onionchat.utils.types import EmptySocket
+
+A_IP, B_IP = "127.0.0.2", "127.0.0.1"
+LIMITS = {"con_attempt_lim": 5, "con_timeout": 1.0, "host_timeout": 0.1, "host_listen_lim": 3.0}
+
+def peer(host_ip: str, dest_ip: str, port: int, mode: str, out: dict) -> None:
+    conn = PeerConnection(dest_ip, port)
+    conn.host_ip = host_ip
+    conn.est_connection(con_mode=mode, **LIMITS)
+    out["conn"] = conn
+
+def blackhole(ip: str, port: int) -> list[socket.socket]:
+    """Listener with a full accept queue, further SYNs to it are dropped."""
+    bh = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    bh.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    bh.bind((ip, port))
+    bh.listen(0)
+    socks = [bh]
+    for _ in range(3):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setblocking(False)
+        s.connect_ex((ip, port))
+        socks.append(s)
+    sleep(0.05)
+    return socks
+
+def run_once(mode: str, scenario: str, stagger: float) -> float | None:
+    port = random.randint(20000, 60000)
+    a, b = {}, {}
+    held = blackhole(B_IP, port) if scenario == "filtered" else []
+    ta = threading.Thread(target=peer, args=(A_IP, B_IP, port, mode, a))
+    tb = threading.Thread(target=peer, args=(B_IP, A_IP, port, mode, b))
+    ta.start()
+    sleep(stagger)
+    for s in held:
+        s.close()
+    t0 = monotonic()
+    tb.start()
+    ta.join()
+    tb.join()
+
+    if isinstance(a["conn"].client, EmptySocket) or isinstance(b["conn"].client, EmptySocket):
+        for c in (a["conn"].client, b["conn"].client):
+            if not isinstance(c, EmptySocket):
+                c.close()
+        return None
+
+    try:
+        b["conn"].client.sendall(b"x")
+        a["conn"].client.settimeout(1.0)
+        ok = a["conn"].client.recv(1) == b"x"
+        return monotonic() - t0 if ok else None
+    finally:
+        a["conn"].client.close()
+        b["conn"].client.close()
+
+def main() -> None:
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    logging.basicConfig(level=logging.CRITICAL)
+    print(f"{'scenario':<10}{'mode':<8}{'stagger':>9}{'median ms':>12}{'fail':>6}")
+    for scenario, stagger in (("refused", 0.0), ("refused", 0.5), ("filtered", 0.5)):
+        for mode in ("serial", "race"):
+            res = [run_once(mode, scenario, stagger) for _ in range(rounds)]
+            ok = [r for r in res if r is not None]
+            med = f"{median(ok) * 1000:.1f}" if ok else "-"
+            print(f"{scenario:<10}{mode:<8}{stagger:>9.2f}{med:>12}{len(res) - len(ok):>6}")
+
+if __name__ == "__main__":
+    main()
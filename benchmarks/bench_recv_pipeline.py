@@ -0,0 +1,59 @@
+"""Receive pipeline: messages/sec of an encrypted GenericChat with and without read-ahead.
+
+The sender's records are sealed up front and written raw over a socketpair, so the
+receiver (GenericChat.recv_msg: read, decrypt, JSON decode) is the bottleneck. With
+read-ahead a reader thread pulls ciphertext records into a bounded queue meanwhile
+(see FramePipeline), 'peak' is the largest queue depth seen.
+
+Usage: python -m benchmarks.bench_recv_pipeline [messages per case] [read-ahead depth]
+"""
+import os
+import sys
+import socket
+import threading
+from time import perf_counter
+from onionchat.plugin.aead import _EncryptedSocket, _RecordCipher
+from onionchat.utils.framing import frame_header
+from onionchat.chat.generic_chat import GenericChat
+
+class _Conn:
+    """Minimal connection layer around an already wrapped socket."""
+    def __init__(self, sock) -> None:
+        self.sock = sock
+
+    def get_client(self):
+        return self.sock
+
+def run(size: int, count: int, depth: int) -> tuple[float, float, int]:
+    """Receive 'count' messages of 'size' characters, returns (msg/s, MB/s, peak queue depth)."""
+    a, b = socket.socketpair()
+    k1, k2 = os.urandom(32), os.urandom(32)
+    rx = GenericChat(_Conn(_EncryptedSocket(b, k2, k1, recv_pipeline=depth))) # type: ignore
+    cipher = _RecordCipher(k1, k2, rx.sock._cipher.suite)
+    frame = rx._encode("x" * size)
+    wire = b"".join(cipher.seal(frame_header(len(frame)) + frame) for _ in range(count))
+
+    t = threading.Thread(target=a.sendall, args=(wire,))
+    t0 = perf_counter()
+    t.start()
+    for _ in range(count):
+        m = rx.recv_msg()
+        assert isinstance(m, dict)
+    elapsed = perf_counter() - t0
+    t.join()
+    peak = rx.sock.recv_stats().get("peak_depth", 0)
+    a.close()
+    rx.close()
+    return count / elapsed, count * size / elapsed / 1e6, peak
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    depth = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    print(f"{'size':>8}{'depth':>7}{'msg/s':>12}{'MB/s':>10}{'peak':>6}")
+    for size in (64, 1024, 16 * 1024, 64 * 1024):
+        for d in (0, depth):
+            rate, mbs, peak = run(size, count, d)
+            print(f"{size:>8}{d:>7}{rate:>12.0f}{mbs:>10.1f}{peak:>6}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""AEAD rekeying: throughput across key switches vs the same stream without rekeying.
+
+One sender streams fixed-size records over a socketpair through _EncryptedSocket, the
+receiver times every window of records. With rekeying on, the key ratchets every
+'epoch' records, windows are aligned so each one contains a switch. A dip would show
+as a lower min or p10 window rate than without rekeying.
+
+Usage: python -m benchmarks.bench_rekey [record size] [records per epoch] [epochs]
+"""
+import os
+import sys
+import socket
+import threading
+from time import perf_counter
+from statistics import mean, quantiles
+from onionchat.plugin.aead import _EncryptedSocket, _ratchet
+
+def run(size: int, epoch: int, epochs: int, rekey: bool) -> list[float]:
+    """Stream 'epochs' * 'epoch' records, returns the MB/s of each window of 'epoch' records."""
+    a, b = socket.socketpair()
+    k1, k2 = os.urandom(32), os.urandom(32)
+    limit = epoch if rekey else 0
+    tx = _EncryptedSocket(a, k1, k2, rekey_records=limit, rekey_bytes=0)
+    rx = _EncryptedSocket(b, k2, k1, rekey_records=limit, rekey_bytes=0)
+    msg = os.urandom(size)
+
+    def send() -> None:
+        for _ in range(epoch * epochs):
+            tx.sendall(msg)
+
+    # windows straddle the switches: half an epoch before, half after
+    offset = epoch // 2
+    rates = []
+    buf = bytearray(size)
+    view = memoryview(buf)
+    t = threading.Thread(target=send)
+    t.start()
+    for i in range(epoch * epochs):
+        got = 0
+        while got < size:
+            got += rx.recv_into(view[got:], size - got)
+        if i == offset:
+            t0 = perf_counter()
+        elif i > offset and (i - offset) % epoch == 0:
+            t1 = perf_counter()
+            rates.append(epoch * size / (t1 - t0) / 1e6)
+            t0 = t1
+    t.join()
+    if rekey:
+        assert tx._cipher.send_epoch == rx._cipher.recv_epoch == (epochs - 1) & 0xFF
+    a.close()
+    b.close()
+    return rates
+
+def main() -> None:
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 16 * 1024
+    epoch = int(sys.argv[2]) if len(sys.argv) > 2 else 512
+    epochs = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+
+    key = os.urandom(32)
+    t0 = perf_counter()
+    for _ in range(1000):
+        key = _ratchet(key)
+    print(f"ratchet: {(perf_counter() - t0) * 1000:.1f} us per key")
+
+    print(f"{size} B records, switch every {epoch} records, MB/s per {epoch}-record window")
+    print(f"{'rekey':<7}{'windows':>9}{'mean':>10}{'p10':>10}{'min':>10}")
+    for rekey in (False, True):
+        rates = run(size, epoch, epochs, rekey)
+        p10 = quantiles(rates, n=10)[0]
+        print(f"{'on' if rekey else 'off':<7}{len(rates):>9}{mean(rates):>10.1f}{p10:>10.1f}{min(rates):>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""CLI cold start: wall time and import time breakdown of fresh interpreters.
+
+Scenarios (each in a new process, so nothing is cached in memory):
+    help     - build the argument parser (what --help renders)
+    generic  - parser + PipelineBuilder for p2p/generic/generic_cli, no plugins
+    secure   - parser + PipelineBuilder with x25519, aead and compress
+
+For each: median wall time over the runs, total import time (-X importtime), the
+modules with the most self time, and which heavy modules were loaded at all.
+
+Usage: python -m benchmarks.bench_startup [runs]
+"""
+import sys
+import subprocess
+from statistics import median
+from time import perf_counter
+
+SCENARIOS = {
+    "help": "import chat; chat.build_parser()",
+    "generic": "import chat; chat.build_parser(); chat.PipelineBuilder('p2p', 'generic', 'generic_cli', [])",
+    "secure": "import chat; chat.build_parser(); chat.PipelineBuilder('p2p', 'generic', 'generic_cli', ['x25519', 'aead', 'compress'])",
+}
+
+# modules a plain pipeline should not need
+HEAVY = ("curses", "ssl", "asyncio", "cryptography", "cryptography.hazmat.primitives.asymmetric.x25519", "cryptography.hazmat.primitives.ciphers.aead")
+
+def importtime(code: str) -> list[tuple[int, int, str]]:
+    """(self us, cumulative us, indented module name) per import of one run."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in out.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cum_us), name.rstrip()))
+    return rows
+
+def wall(code: str, runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        t0 = perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True, capture_output=True)
+        times.append(perf_counter() - t0)
+    return median(times)
+
+def main() -> None:
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    for name, code in SCENARIOS.items():
+        rows = importtime(code)
+        loaded = {r[2].strip() for r in rows}
+        top = sorted(rows, key=lambda r: -r[0])[:8]
+        print(f"{name}: wall {wall(code, runs) * 1000:.1f} ms (median of {runs}), imports {sum(r[0] for r in rows) / 1000:.1f} ms")
+        for self_us, cum_us, mod in top:
+            print(f"    {self_us / 1000:>7.1f} ms self {cum_us / 1000:>7.1f} ms total  {mod.strip()}")
+        print(f"    heavy modules loaded: {', '.join(m for m in HEAVY if m in loaded) or 'none'}")
+
+if __name__ == "__main__":
+    main()
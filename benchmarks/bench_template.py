@@ -0,0 +1,56 @@
+"""Per session setup cost: a PipelineBuilder per connection vs one compiled PipelineTemplate.
+
+Each session runs over a fresh loopback TCP pair, the peer side is built on a thread with
+its own template. 'builder' constructs and compiles a builder per session (class lookup,
+argument reflection, manifest), 'template' reuses one compiled template (accept()).
+
+Usage: python -m benchmarks.bench_template [sessions] [plugin ...]
+"""
+import sys
+import copy
+import socket
+import threading
+from time import perf_counter
+from onionchat.pipeline_builder import PipelineBuilder
+
+ARGS = {"dest_ip": "127.0.0.1"}
+
+def pair() -> tuple[socket.socket, socket.socket]:
+    with socket.create_server(("127.0.0.1", 0)) as srv:
+        client = socket.create_connection(srv.getsockname())
+        server, _ = srv.accept()
+    return server, client
+
+def run(sessions: int, plugins: list[str], per_session_builder: bool) -> float:
+    peer = PipelineBuilder("p2p", "generic", "generic_cli", plugins, dict(ARGS)).compile()
+    template = PipelineBuilder("p2p", "generic", "generic_cli", plugins, dict(ARGS)).compile()
+    proto = PipelineBuilder.instantiate_class(peer.builder.conn_cls, ARGS)
+
+    total = 0.0
+    for _ in range(sessions):
+        server, client = pair()
+        conn = copy.deepcopy(proto)
+        conn.client, conn.is_server, conn.is_host = client, False, False
+        t = threading.Thread(target=peer.build_chat, args=(conn,))
+        t.start()
+
+        t0 = perf_counter()
+        if per_session_builder:
+            template = PipelineBuilder("p2p", "generic", "generic_cli", plugins, dict(ARGS)).compile()
+        chat = template.accept(server, ("127.0.0.1", 0), chat_only=True)
+        total += perf_counter() - t0
+
+        t.join()
+        chat.sock.close()
+        client.close()
+    return total / sessions
+
+def main() -> None:
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    plugins = sys.argv[2:] or ["x25519", "aead", "compress"]
+    print(f"{sessions} sessions, plugins: {', '.join(plugins)}")
+    for name, per_session in (("builder", True), ("template", False)):
+        print(f"{name:>9}: {run(sessions, plugins, per_session) * 1e6:.0f} us/session")
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ from typing import Tuple
 from argparse import ArgumentParser, RawTextHelpFormatter
 import onionchat.config as cfg
 from onionchat.pipeline_builder import PipelineBuilder
-from onionchat.utils.funcs import load_class
+from onionchat.utils import help_index
 import ast
 
 logger = logging.getLogger(__name__)
@@ -19,7 +19,8 @@ def cls_help_pair(alias: str) -> Tuple[str, str]:
     if not path:
         return (alias, "Unknown class alias")
 
-    return (alias, load_class(path).__doc__ or "No documentation available")
+    # read from source, only the selected pipeline gets imported (PipelineBuilder)
+    return (alias, help_index.class_doc(path) or "No documentation available")
 
 def format_choices(mapping: dict) -> str:
     lines = []
@@ -68,6 +69,7 @@ def build_parser() -> ArgumentParser:
         dest="plugins"
     )
 
+    help_index.save()
     return parser
 
 def main() -> None:
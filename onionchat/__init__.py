@@ -1,3 +1,3 @@
 __version__ = "1.1.0a1"
-__protocol_version__ = "1.0"
+__protocol_version__ = "1.1"
 __author__ = "dheb"
\ No newline at end of file
@@ -2,6 +2,8 @@ import socket
 import json
 import onionchat.config as cfg
 from onionchat.utils.types import *
+from onionchat.utils.funcs import arecv_exact
+from onionchat.utils.framing import frame_header
 from onionchat.core.conn_core import ConnectionCore
 from onionchat.core.chat_core import ChatCore
 from typing import Optional, Dict
@@ -13,10 +15,17 @@ class GenericChat(ChatCore):
         connection (ConnectionCore): Connection prepared socket
         encoding (str): Message encoding type
         recv_timeout (float): Receive timeout
+        low_latency (bool): Send every message immediately, else coalesce bursts
     """
 
-    def __init__(self, conn: ConnectionCore, encoding: str = cfg.encoding, recv_timeout: float = cfg.recv_timeout) -> None:
-        super().__init__(conn, encoding, recv_timeout)
+    def __init__(
+        self,
+        conn: ConnectionCore,
+        encoding: str = cfg.encoding,
+        recv_timeout: float = cfg.recv_timeout,
+        low_latency: bool = cfg.low_latency
+    ) -> None:
+        super().__init__(conn, encoding, recv_timeout, low_latency)
 
     def send_msg(self, msg: str) -> Optional[TerminateConnection]:
         """Send message to peer.
@@ -25,12 +34,8 @@ class GenericChat(ChatCore):
             msg: Message to send
         """
 
-        data = {
-            "msg": msg
-        }
-
         try:
-            self.sock.sendall(json.dumps(data).encode(self.encoding))
+            self.frame_writer.send(self._encode(msg))
         except (BrokenPipeError, OSError):
             return TerminateConnection()
 
@@ -42,13 +47,49 @@ class GenericChat(ChatCore):
         """
 
         try:
-            data = self.sock.recv(cfg.recv_buf)
-            if not data:
+            data = self.frame_reader.read_frame()
+            if data is None:
                 return TerminateConnection()
-            return json.loads(data.decode(self.encoding))
-        except json.JSONDecodeError:
-            return {'msg': 'system[JSON decode error. Invalid message format.]'}
+            return self._handle_frame(data)
         except socket.timeout:
             return EmptyMessage()
         except (ConnectionResetError, OSError):
-            return TerminateConnection()
\ No newline at end of file
+            return TerminateConnection()
+
+    async def asend_msg(self, msg: str) -> Optional[TerminateConnection]:
+        """Send message to peer (asyncio)."""
+
+        try:
+            data = self._encode(msg)
+            self.writer.writelines((frame_header(len(data)), data))
+            await self.writer.drain()
+        except (BrokenPipeError, OSError):
+            return TerminateConnection()
+
+    async def arecv_msg(self) -> TerminateConnection | Dict:
+        """Wait for the next message from peer (asyncio)."""
+
+        length_data = await arecv_exact(self.reader, cfg.frame_len_bytes)
+        if not length_data:
+            return TerminateConnection()
+        length = int.from_bytes(length_data, cfg.byteorder)
+        data = await arecv_exact(self.reader, length)
+        if len(data) != length:
+            return TerminateConnection()
+        return self._decode(data)
+
+    def _handle_frame(self, frame: memoryview) -> Dict:
+        return self._decode(frame)
+
+    def _encode(self, msg: str) -> bytes:
+        """Build a message frame body (length prefix is added by the writer)."""
+        data = {
+            "msg": msg
+        }
+        return json.dumps(data).encode(self.encoding)
+
+    def _decode(self, data: bytes | memoryview) -> Dict:
+        try:
+            return json.loads(str(data, self.encoding))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return {'msg': 'system[JSON decode error. Invalid message format.]'}
\ No newline at end of file
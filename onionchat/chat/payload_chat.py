@@ -1,12 +1,34 @@
-import socket
-from typing import Dict, Optional
+import os
+import mmap
 import json
+import socket
+import struct
+import asyncio
+import logging
+import itertools
+import threading
+from collections import deque
+from typing import Callable, Dict, Optional, Literal
 from time import time
 import onionchat.config as cfg
 from onionchat.core.conn_core import ConnectionCore
+from onionchat.core.async_conn_core import AsyncConnectionCore
 from onionchat.core.chat_core import ChatCore
 from onionchat import __protocol_version__
 from onionchat.utils.types import *
+from onionchat.utils.funcs import arecv_exact
+from onionchat.utils.framing import frame_header
+from onionchat.utils.payload_codec import FLAG_TITLES, canonical_flags, make_codec
+from onionchat.utils.file_transfer import CHUNK_HEADER, FileReceiver
+from onionchat.utils.mux import STREAM_HEADER, CONTROL, CHAT, FIRST_DATA_STREAM, MAX_STREAM, MuxWriter
+
+logger = logging.getLogger(__name__)
+
+# frame kinds, first byte of every frame body
+MSG, FILE_OFFER, FILE_CHUNK, FILE_END, KEEPALIVE, ACK, RESUME, FILE_ACCEPT = (bytes([k]) for k in range(8))
+
+# body of ACK / RESUME frames: highest in-order sequence number received
+SEQ = struct.Struct("!Q")
 
 class PayloadChat(ChatCore):
     """Chat with payload handling.
@@ -15,7 +37,33 @@ class PayloadChat(ChatCore):
         connection (ConnectionCore): Connection prepared socket
         encoding (str): Message encoding type
         recv_timeout (float): Receive timeout
+        low_latency (bool): Send every message immediately, else coalesce bursts
         payload_flags (str): Payload handling flags
+        payload_codec (str): 'json' or 'binary' (fixed struct header, needs module signing to agree on flags)
+        file_recv_dir (str | None): Directory for received files
+        file_accept (bool): Accept incoming files (off by default, offers are refused)
+        file_max_size (int): Largest accepted file in bytes
+        file_progress (Callable | None): Called with the Transfer after every received chunk
+        payload_mux (bool): Prefix frames with a stream id and interleave streams (peers must agree)
+
+    Files:
+        send_file offers a file and waits for the peer's answer (FILE_ACCEPT with the offset to
+        resume from, or the refusal), then streams it in chunks (socket.sendfile without wrapping
+        plugins, else mmap). The answer arrives through recv_msg, which must keep running on
+        another thread. Received chunks are written straight to disk, see FileReceiver, progress
+        is reported every file_progress_step of the file. Receiving is opt-in (file_accept) and
+        capped at file_max_size.
+
+    Streams:
+        With payload_mux, '__exit__' and keepalives go on the control stream (strict priority),
+        messages on the chat stream and every file transfer on its own stream, see MuxWriter.
+
+    Acknowledgements:
+        With the 'n' flag messages carry sequence numbers, the peer acks them cumulatively
+        (after ack_every messages or ack_delay seconds). Unacked messages stay in a window of
+        ack_window, after reattach (see PipelineBuilder.reconnect) the peer reports what it got
+        and only the tail is resent. Resuming is API only, the CLI handlers end the session
+        when the connection drops.
 
     Flags:
         Metadata:
@@ -36,11 +84,24 @@ class PayloadChat(ChatCore):
         conn: ConnectionCore,
         encoding: str = cfg.encoding,
         recv_timeout: float = cfg.recv_timeout,
-        payload_flags: str = cfg.payload_flags
+        low_latency: bool = cfg.low_latency,
+        payload_flags: str = cfg.payload_flags,
+        payload_codec: Literal['json', 'binary'] = cfg.payload_codec,
+        file_recv_dir: Optional[str] = cfg.file_recv_dir,
+        payload_mux: bool = cfg.payload_mux,
+        file_accept: bool = cfg.file_accept,
+        file_max_size: int = cfg.file_max_size,
+        file_progress: Callable | None = None
     ) -> None:
-        super().__init__(conn, encoding, recv_timeout)
+        super().__init__(conn, encoding, recv_timeout, low_latency)
         self.payload_flags = payload_flags
 
+        if payload_codec != "json" and getattr(cfg, "module_sign_level") == "broad":
+            # the flag set is agreed through the manifest, which 'broad' does not cover
+            logger.warning(f"Payload codec '{payload_codec}' needs module signing, falling back to json")
+            payload_codec = "json"
+        self.codec = make_codec(payload_codec, payload_flags, encoding)
+
         # flag functionallity
         self.flag_encode = {
             's': self.conn.host_ip,
@@ -49,49 +110,371 @@ class PayloadChat(ChatCore):
             'x': 'text',
             'v': __protocol_version__,
             'e': None, # signature data placeholder
-            'n': None, # sequence number placeholder
+            'n': None, # sequence number, set per message
             'p': None # push title placeholder
         }
 
         # flag titles
-        self.flag_titles = {
-            's': "sender_ip",
-            'r': "recv_ip",
-            't': "timestamp",
-            'x': "data_type",
-            'v': "ver",
-            'e': "sig_data",
-            'n': "seq_num",
-            'p': "push"
-        }    
+        self.flag_titles = FLAG_TITLES
+        self._active = [(flag, self.flag_encode[flag]) for flag in self.codec.flags]
+
+        self.files = FileReceiver(file_recv_dir, file_accept, file_max_size, file_progress)
+        self._tids = itertools.count()
+        # answers to pending offers: transfer id -> offset to send from, refusal reason or None (waiting)
+        self._answers: Dict[int, int | str | None] = {}
+        self._answers_cond = threading.Condition()
+
+        self.mux = None
+        if payload_mux and hasattr(self, "frame_writer"):
+            self.mux = MuxWriter(self.frame_writer, keepalive=(KEEPALIVE,))
+        self._stream_header = payload_mux
+
+        # acknowledgements ('n' flag)
+        self._reliable = 'n' in self.codec.flags
+        self._send_seq = 0
+        self._unacked: deque[tuple[int, bytes]] = deque()
+        self._seq_lock = threading.Lock()
+        self._resuming = False
+        self._recv_seq = 0
+        self._ack_pending = 0
+        self._ack_timer: threading.Timer | asyncio.TimerHandle | None = None
+        self._ack_lock = threading.Lock()
+
+    @staticmethod
+    def wire_options(args: Dict) -> Dict:
+        """Options the peer must agree on, added to the module-sign manifest."""
+        options = {}
+        if args.get("payload_mux", cfg.payload_mux):
+            # stream ids change every frame, peers without them must not match
+            options["payload_mux"] = True
+        codec = args.get("payload_codec", cfg.payload_codec)
+        flags = canonical_flags(args.get("payload_flags", cfg.payload_flags))
+        if 'n' in flags:
+            # both sides must ack, else the sender's window never drains
+            options["payload_acks"] = True
+        if codec != "json":
+            # json is self-describing, keeps manifests of json peers unchanged
+            options["payload_codec"] = codec
+            options["payload_flags"] = flags
+        return options
 
     def send_msg(self, msg: str) -> Optional[TerminateConnection]:
-        payload = {}
-        for flag in self.payload_flags:
-            val = self.flag_encode[flag]
-            # call callables (e.g., timestamp) to get the actual value
-            payload[self.flag_titles[flag]] = val() if callable(val) else val
-        payload["msg"] = msg
+        try:
+            self._send_msg(msg)
+        except (BrokenPipeError, OSError):
+            return TerminateConnection()
+
+    def send_file(
+        self,
+        path: str,
+        resume: bool = True,
+        chunk_size: int = cfg.file_chunk_size,
+        progress: Callable[[int, int], None] | None = None,
+        timeout: float = cfg.file_offer_timeout
+    ) -> Optional[TerminateConnection]:
+        """Stream a file to peer without reading it into memory.
 
-        data = json.dumps(payload).encode(self.encoding)
-        length = len(data).to_bytes(cfg.frame_len_bytes, byteorder=cfg.byteorder)
+        Args:
+            path: File to send
+            resume: Let the peer continue from the part it already has
+            chunk_size: Bytes per chunk frame
+            progress: Called with (bytes sent, total) after every chunk
+            timeout: Seconds to wait for the peer to accept the offer
+        """
 
+        tid = next(self._tids)
+        sid = FIRST_DATA_STREAM + tid % (MAX_STREAM - FIRST_DATA_STREAM + 1)
         try:
-            self.sock.sendall(length + data)
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                meta = {"id": tid, "name": os.path.basename(path), "size": size, "resume": resume}
+                with self._answers_cond:
+                    self._answers[tid] = None
+                try:
+                    self._send(sid, FILE_OFFER, json.dumps(meta).encode(self.encoding))
+                    self._drain(sid)
+                    self.frame_writer.flush()
+                    with self._answers_cond:
+                        self._answers_cond.wait_for(lambda: self._answers[tid] is not None, timeout)
+                finally:
+                    with self._answers_cond:
+                        answer = self._answers.pop(tid)
+                if not isinstance(answer, int):
+                    logger.error(f"File '{meta['name']}' not sent: {answer or 'no answer from peer'}")
+                    return None
+                offset = min(answer, size)
+
+                if self.frame_writer.can_sendfile():
+                    for pos in range(offset, size, chunk_size):
+                        n = min(chunk_size, size - pos)
+                        if self.mux is not None:
+                            self.mux.sendfile(sid, f, pos, n, FILE_CHUNK, CHUNK_HEADER.pack(tid, pos))
+                        else:
+                            self.frame_writer.sendfile(f, pos, n, FILE_CHUNK, CHUNK_HEADER.pack(tid, pos))
+                        if progress:
+                            progress(pos + n, size)
+                    # queued chunks reference the open file
+                    self._drain(sid)
+                elif offset < size:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        view = memoryview(mm)
+                        try:
+                            for pos in range(offset, size, chunk_size):
+                                n = min(chunk_size, size - pos)
+                                self._send(sid, FILE_CHUNK, CHUNK_HEADER.pack(tid, pos), view[pos:pos + n])
+                                if progress:
+                                    progress(pos + n, size)
+                            # queued chunks reference the mapping
+                            self._drain(sid)
+                            self.frame_writer.flush()
+                        finally:
+                            view.release()
+
+                self._send(sid, FILE_END, json.dumps({"id": tid}).encode(self.encoding))
         except (BrokenPipeError, OSError):
             return TerminateConnection()
 
     def recv_msg(self) -> Dict | TerminateConnection | EmptyMessage:
         try:
-            length_data = self.sock.recv(cfg.frame_len_bytes)
-            if not length_data:
+            data = self.frame_reader.read_frame()
+            if data is None:
                 return TerminateConnection()
-            length = int.from_bytes(length_data, cfg.byteorder)
-            data = self.sock.recv(length).decode(self.encoding)
-            return json.loads(data)
-        except json.JSONDecodeError:
-            return {'msg': 'system[JSON decode error. Invalid message format.]'}
+            return self._handle_frame(data)
         except socket.timeout:
             return EmptyMessage()
         except (ConnectionResetError, OSError):
             return TerminateConnection()
+
+    async def asend_msg(self, msg: str) -> Optional[TerminateConnection]:
+        """Send message to peer (asyncio)."""
+
+        try:
+            self._send_msg(msg)
+            await self.writer.drain()
+        except (BrokenPipeError, OSError):
+            return TerminateConnection()
+
+    async def arecv_msg(self) -> Dict | TerminateConnection:
+        """Wait for the next message from peer (asyncio)."""
+
+        while True:
+            length_data = await arecv_exact(self.reader, cfg.frame_len_bytes)
+            if not length_data:
+                return TerminateConnection()
+            length = int.from_bytes(length_data, cfg.byteorder)
+            data = await arecv_exact(self.reader, length)
+            if len(data) != length:
+                return TerminateConnection()
+            msg = self._handle_frame(memoryview(data))
+            if not isinstance(msg, EmptyMessage):
+                return msg
+
+    def reattach(self, conn: ConnectionCore) -> None:
+        """Continue the session over a new connection. With acknowledgements, new messages
+        are held back until the peer reports what it received, then the unacked tail is resent."""
+        if self.mux is not None:
+            self.mux.close()
+        self._cancel_ack()
+        super().reattach(conn)
+        if self.mux is not None:
+            self.mux = MuxWriter(self.frame_writer, keepalive=(KEEPALIVE,))
+        if self._reliable:
+            with self._seq_lock:
+                self._resuming = True
+            with self._ack_lock:
+                self._ack_pending = 0
+                seq = self._recv_seq
+            self._send(CONTROL, RESUME, SEQ.pack(seq))
+
+    def close(self) -> None:
+        if self.mux is not None:
+            self.mux.close()
+        self._cancel_ack()
+        self.files.close()
+        super().close()
+
+    def _send(self, sid: int, *parts) -> None:
+        if self.mux is not None:
+            self.mux.send(sid, *parts)
+        elif isinstance(self.conn, AsyncConnectionCore):
+            if self._stream_header:
+                parts = (STREAM_HEADER.pack(sid), *parts)
+            self.writer.writelines((frame_header(sum(len(p) for p in parts)), *parts))
+        else:
+            self.frame_writer.send(*parts)
+
+    def _send_msg(self, msg: str) -> None:
+        if msg == "__exit__" or not self._reliable:
+            # control messages carry no sequence number, they may overtake the chat stream
+            self._send(CONTROL if msg == "__exit__" else CHAT, MSG, self._encode(msg))
+            return
+
+        with self._seq_lock:
+            self._send_seq += 1
+            data = self._encode(msg, self._send_seq)
+            self._unacked.append((self._send_seq, data))
+            if len(self._unacked) > cfg.ack_window:
+                seq, _ = self._unacked.popleft()
+                logger.warning(f"Unacked window full, message {seq} can no longer be resent")
+            if not self._resuming:
+                # under the lock, so sequence numbers go out in order
+                self._send(CHAT, MSG, data)
+
+    def _on_ack(self, seq: int, resume: bool = False) -> None:
+        """Peer received everything up to 'seq'. On resume, resend the rest in order."""
+        with self._seq_lock:
+            while self._unacked and self._unacked[0][0] <= seq:
+                self._unacked.popleft()
+            if not resume:
+                return
+            tail = list(self._unacked)
+        if tail:
+            logger.info(f"Resending {len(tail)} unacknowledged messages")
+
+        # sent without the lock (both peers may resend into full buffers at once), new
+        # messages stay held back (_resuming) until everything older is out
+        while True:
+            for _, data in tail:
+                self._send(CHAT, MSG, data)
+            last = tail[-1][0] if tail else seq
+            with self._seq_lock:
+                tail = [(n, data) for n, data in self._unacked if n > last]
+                if not tail:
+                    self._resuming = False
+                    return
+
+    def _on_seq(self, seq: int) -> bool:
+        """Record a received sequence number, False for duplicates of resent messages."""
+        with self._ack_lock:
+            fresh = seq > self._recv_seq
+            if fresh:
+                self._recv_seq = seq
+            self._ack_pending += 1
+            if self._ack_pending < cfg.ack_every:
+                if self._ack_timer is None:
+                    if isinstance(self.conn, AsyncConnectionCore):
+                        self._ack_timer = asyncio.get_running_loop().call_later(cfg.ack_delay, self._flush_ack)
+                    else:
+                        self._ack_timer = threading.Timer(cfg.ack_delay, self._flush_ack)
+                        self._ack_timer.daemon = True
+                        self._ack_timer.start()
+                return fresh
+        self._flush_ack()
+        return fresh
+
+    def _flush_ack(self) -> None:
+        with self._ack_lock:
+            self._cancel_ack()
+            if not self._ack_pending:
+                return
+            self._ack_pending = 0
+            seq = self._recv_seq
+        try:
+            self._send(CONTROL, ACK, SEQ.pack(seq))
+        except OSError:
+            # connection lost, the RESUME after reattach covers it
+            pass
+
+    def _cancel_ack(self) -> None:
+        if self._ack_timer is not None:
+            self._ack_timer.cancel()
+            self._ack_timer = None
+
+    def _drain(self, sid: int) -> None:
+        if self.mux is not None:
+            self.mux.drain(sid)
+
+    def _handle_frame(self, frame: memoryview) -> Dict | EmptyMessage:
+        """Dispatch a frame body by kind, file chunks are consumed here."""
+        if self._stream_header:
+            # the stream id only orders sending, frames are self-contained
+            frame = frame[STREAM_HEADER.size:]
+        kind, body = frame[:1], frame[1:]
+        if kind == MSG:
+            msg = self._decode(body)
+            seq = msg.get("seq_num") if self._reliable else None
+            if isinstance(seq, int) and not self._on_seq(seq):
+                return EmptyMessage()
+            return msg
+        if kind == KEEPALIVE:
+            return EmptyMessage()
+        if kind == FILE_ACCEPT:
+            self._on_answer(body)
+            return EmptyMessage()
+        if kind in (ACK, RESUME):
+            try:
+                self._on_ack(SEQ.unpack(body)[0], resume=kind == RESUME)
+            except (struct.error, OSError) as e:
+                logger.error(f"Invalid acknowledgement: {e}")
+            return EmptyMessage()
+
+        try:
+            if kind == FILE_CHUNK:
+                t = self.files.chunk(body)
+                step = cfg.file_progress_step
+                if t is None or step <= 0 or t.received >= t.size or int(t.progress / step) <= t.reported:
+                    return EmptyMessage()
+                t.reported = int(t.progress / step)
+                return {"msg": f"system[Receiving file '{t.name}' {t.progress:.0%} ({t.received}/{t.size} bytes)]", "data_type": "file"}
+            meta = json.loads(str(body, self.encoding))
+            if kind == FILE_OFFER:
+                try:
+                    t = self.files.offer(meta)
+                except (ValueError, OSError) as e:
+                    tid = meta.get("id") if isinstance(meta, dict) else None
+                    if isinstance(tid, int):
+                        self._answer({"id": tid, "error": str(e)})
+                    raise
+                self._answer({"id": t.tid, "offset": t.received})
+                note = f" from offset {t.received}" if t.received else ""
+                return {"msg": f"system[Receiving file '{t.name}' ({t.size} bytes){note}]", "data_type": "file"}
+            if kind == FILE_END:
+                t = self.files.end(meta)
+                if t is None:
+                    return EmptyMessage()
+                if t.received < t.size:
+                    return {"msg": f"system[File '{t.name}' incomplete ({t.received}/{t.size} bytes), kept for resume]", "data_type": "file"}
+                return {"msg": f"system[Received file '{t.name}' ({t.size} bytes) -> {t.path}]", "data_type": "file", "path": str(t.path)}
+        except (ValueError, KeyError, TypeError, struct.error, OSError) as e:
+            # malformed or refused peer frames end the transfer, not the session
+            logger.error(f"File transfer failed: {e}")
+            return {"msg": f"system[File transfer failed: {e}]", "data_type": "file"}
+        return {'msg': 'system[Unknown frame kind.]'}
+
+    def _answer(self, reply: Dict) -> None:
+        """Answer a file offer: the offset to send from, or why it was refused."""
+        try:
+            self._send(CONTROL, FILE_ACCEPT, json.dumps(reply).encode(self.encoding))
+        except OSError as e:
+            logger.error(f"Cannot answer file offer: {e}")
+
+    def _on_answer(self, body: memoryview) -> None:
+        try:
+            reply = json.loads(str(body, self.encoding))
+            tid = FileReceiver._int(reply, "id")
+            answer = str(reply["error"]) if "error" in reply else FileReceiver._int(reply, "offset")
+        except (ValueError, KeyError) as e:
+            logger.error(f"Invalid file offer answer: {e}")
+            return
+        with self._answers_cond:
+            # late answers (offer timed out) are dropped
+            if tid in self._answers:
+                self._answers[tid] = answer
+                self._answers_cond.notify_all()
+
+    def _encode(self, msg: str, seq: Optional[int] = None) -> bytes:
+        """Build a message body (kind byte and length prefix are added on send)."""
+        # call callables (e.g., timestamp) to get the actual value
+        fields = {flag: val() if callable(val) else val for flag, val in self._active}
+        if 'n' in fields:
+            fields['n'] = seq
+        return self.codec.encode(fields, msg)
+
+    def _decode(self, data: bytes | memoryview) -> Dict:
+        try:
+            msg = self.codec.decode(data)
+        except ValueError:
+            msg = None
+        if not isinstance(msg, dict):
+            return {'msg': f'system[{self.codec.name.upper()} decode error. Invalid message format.]'}
+        return msg
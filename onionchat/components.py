@@ -1,5 +1,6 @@
 CONNS = {
-    "p2p": "onionchat.conn.p2p:PeerConnection"
+    "p2p": "onionchat.conn.p2p:PeerConnection",
+    "async_p2p": "onionchat.conn.async_p2p:AsyncPeerConnection"
 }
 
 CHATS = {
@@ -13,9 +14,12 @@ HANDLERS = {
 }
 
 # !ORDER MATTERS!
+# socket wrappers apply inside out: a later plugin sees the data first,
+# so compress comes after aead to compress before encrypting
 PLUGINS = {
     "ssl": "onionchat.plugin.ssl_wrap:SSLWrap",
     "save_history": "onionchat.plugin.save_history:SaveHistory",
     "x25519": "onionchat.plugin.x25519:X25519",
-    "aead": "onionchat.plugin.aead:AEAD"
+    "aead": "onionchat.plugin.aead:AEAD",
+    "compress": "onionchat.plugin.compress:Compress"
 }
\ No newline at end of file
@@ -18,25 +18,93 @@ con_attempt_lim: int = 5
 con_timeout: float = 5.0
 host_timeout: float = 1.0
 host_listen_lim: float = 60.0
+# 'serial': connect, then fall back to hosting; 'race': connect and host concurrently (both peers must agree)
+con_mode: Literal['serial', 'race'] = "serial"
+race_retry_interval: float = 0.25
 
 # chat settings
 encoding: str = "utf-8"
 recv_timeout: float = 1.0
 payload_flags: str = ""
+# 'json' or 'binary' (struct header, flag set agreed once through the module-sign manifest)
+payload_codec: Literal['json', 'binary'] = "json"
 
 # framing/buffers
-recv_buf: int = 1024
+recv_buf: int = 1024 # initial frame buffer, grows to fit the largest frame
 frame_len_bytes: int = 4
+max_frame_size: int = 16 * 1024 * 1024
+
+# send path
+low_latency: bool = True # write every frame immediately, else coalesce bursts
+send_flush_bytes: int = 16 * 1024
+send_flush_delay: float = 0.002
 byteorder: Literal['little', 'big'] = "big"
 
+# file transfer (payload chat)
+file_chunk_size: int = 64 * 1024
+file_recv_dir: Optional[str] = None # defaults to ~/<file_dir_name>
+file_dir_name: str = ".onionchat_files"
+file_accept: bool = False # receive files offered by the peer
+file_max_size: int = 1024 * 1024 * 1024 # largest accepted file in bytes
+file_offer_timeout: float = 30.0 # seconds a sender waits for the peer to accept an offer
+file_progress_step: float = 0.1 # fraction of a file between receive progress messages (0 disables)
+
+# logical streams (payload chat): control, chat and each file transfer interleave over one connection
+payload_mux: bool = True # peers must agree, part of the module-sign manifest
+mux_window: int = 8 # max queued frames per stream
+keepalive_interval: float = 15.0 # idle seconds before a keepalive frame, 0 disables
+
+# acknowledgements (payload chat, 'n' flag)
+ack_every: int = 16 # ack at once after this many messages
+ack_delay: float = 0.2 # else ack this many seconds after the first unacked one
+ack_window: int = 1024 # unacked messages kept for resending after a reconnect
+
 # encrypted socket
 enc_recv_buf: int = 4096
+enc_max_record: int = 256 * 1024 # max plaintext per record, larger sends are split
+# 'auto' negotiates the fastest suite both peers support (x25519 handshake), else a fixed suite name
+aead_cipher: str = "auto"
+aead_bench_size: int = 16 * 1024
+aead_bench_rounds: int = 32
+aead_bench_cache: Optional[str] = None # defaults to ~/<cache_dir_name>/aead_bench.json
+cache_dir_name: str = ".onionchat_cache"
+# ratchet the aead keys after this many records or plaintext bytes per direction (0 disables)
+rekey_records: int = 1 << 20
+rekey_bytes: int = 1 << 30
+# records read ahead on a reader thread while the receiver decrypts and decodes (0 disables)
+# pays off with spare cores and bursty links, costs a thread handoff per record otherwise
+recv_pipeline: int = 0
+
+# ephemeral x25519 keypairs generated ahead of handshakes (0 generates inline)
+key_pool_size: int = 4
+
+# session resumption (x25519 handshake): reconnects to a known peer skip the key exchange (peers must agree)
+session_resumption: bool = True
+session_ticket_ttl: float = 24 * 3600.0
+session_cache_size: int = 256 # peers
+session_cache_path: Optional[str] = None # defaults to ~/<cache_dir_name>/sessions.bin
+session_cache_secret: Optional[str] = None # encrypts the cache file, without it tickets stay in memory
+session_cache_flush_delay: float = 1.0 # seconds, changes within it are written together
+
+# compress plugin
+compress_level: int = 6
+compress_threshold: int = 32 # bytes, smaller messages go out uncompressed
+compress_persistent: bool = True # keep the zlib context across messages (peers must agree)
+
+# ssl plugin
+tls13_only: bool = False
+tls_ciphers: Optional[str] = None # OpenSSL cipher names, ':' separated
+tls_session_reuse: bool = True # clients resume the last session with a peer
 
 # handlers
 input_sym: str = ">"
 cedit_timestamps: bool = True
-cedit_max_display_size: int = 1024
+cedit_wrap_cache_size: int = 1024 # messages kept wrapped for the current terminal width
 cedit_max_input_size: int = 256
+cedit_max_fps: int = 30 # redraw rate cap, 0 for no cap
+history_ring_size: int = 1024 # messages kept in memory
+history_page_size: int = 256 # messages per spill write / read back
+history_spill: bool = True # older messages go to a temporary file, otherwise dropped
 
 # save_history plugin
 log_file_path: Optional[str] = None
@@ -44,6 +112,11 @@ reset_history: bool = False
 log_dir_name: str = ".onionchat_logs"
 log_file_prefix: str = "chat_log_"
 log_file_ext: str = ".txt"
+log_tail_lines: int = 1024 # messages loaded from the log at startup
+log_fsync: str = "interval" # 'none', 'interval' or 'always' (after every write batch)
+log_fsync_interval: float = 1.0 # seconds
+log_max_bytes: int = 16 * 1024 * 1024 # rotate beyond this size, 0 never rotates
+log_backups: int = 3 # rotated logs kept (<log>.1 is the newest)
 
 # misc
 unknown_client: str = "unknown"
@@ -52,4 +125,8 @@ unknown_client: str = "unknown"
 # note: this can't be set using the ui
 module_sign_level: Literal['strict', 'secure', 'broad'] = "secure"
 # PEM-encoded Ed25519 public keys of trusted signers (optional; empty -> skip signature auth)
-trusted_signing_pubkeys: list[str] = []
\ No newline at end of file
+trusted_signing_pubkeys: list[str] = []
+# signed module hashes generated at install time (python -m onionchat.utils.module_sign <key.pem>)
+attestation_path: Optional[str] = None # defaults to attestation.json in the package directory
+# send the manifest with the first connection plugin's handshake (x25519) instead of its own round trip
+combined_handshake: bool = True
\ No newline at end of file
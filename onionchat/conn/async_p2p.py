@@ -0,0 +1,182 @@
+from typing import Literal
+import asyncio
+import socket
+import logging
+import onionchat.config as cfg
+from onionchat.core.async_conn_core import AsyncConnectionCore
+from onionchat.conn.p2p import RACE_MARK, PeerConnection
+
+logger = logging.getLogger(__name__)
+
+Streams = tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+class AsyncPeerConnection(AsyncConnectionCore):
+    """P2P connection handler (asyncio, build with PipelineBuilder.abuild).
+    Note: Same wire protocol as PeerConnection and listed as it in module-sign manifests
+    (manifest_as), so sync and asyncio peers match at every level.
+
+    Args:
+        dest_ip (str): Destination IPv4 address
+        port (int): Destination port
+    """
+
+    def __init__(self, dest_ip, port: int = cfg.port) -> None:
+        super().__init__(dest_ip, port)
+        try:
+            socket.inet_aton(dest_ip)
+        except socket.error:
+            logger.critical(f"{dest_ip} is not a valid ipv4 address")
+            raise ValueError(f"{dest_ip} is not a valid ipv4 address")
+
+        self.rejected = []
+        self.is_host = False
+
+    # the module-sign manifest lists this class as PeerConnection
+    manifest_as: type = PeerConnection
+
+    async def est_connection(
+        self,
+        con_attempt_lim: int = cfg.con_attempt_lim,
+        con_timeout: float = cfg.con_timeout,
+        host_listen_lim: float = cfg.host_listen_lim,
+        con_mode: Literal['serial', 'race'] = cfg.con_mode
+    ) -> None:
+        """Establish connection by connecting or hosting. Wire compatible with PeerConnection.
+
+        Args:
+            con_attempt_lim (int): Max connection attempts
+            con_timeout (float): Timeout per connection attempt
+            host_listen_lim (float): Max time to listen as host
+            con_mode (str): 'serial' (connect, then host) or 'race' (connect and host concurrently)
+        """
+
+        await self.resolve_host_ip()
+        if con_mode == "race" and self.host_ip == self.dest_ip:
+            logger.warning("Cannot race connect/listen against own address, falling back to serial")
+            con_mode = "serial"
+
+        streams: Streams | None
+        if con_mode == "race":
+            streams = await self._race(host_listen_lim, con_timeout)
+        else:
+            streams = await self._con(con_attempt_lim, con_timeout)
+            if streams is None:
+                logger.warning("Failed to connect, setting up host")
+                self.is_host = True
+                streams = await self._host(host_listen_lim)
+
+        if streams is None:
+            logger.error(f"Failed to peer with {self.dest_ip}. Host listen timed out ({host_listen_lim})")
+            return
+        self.reader, self.writer = streams
+        self.is_server = self.is_host
+
+    async def _con(self, attempt_lim: int, timeout: float) -> Streams | None:
+        for _ in range(attempt_lim):
+            try:
+                streams = await asyncio.wait_for(asyncio.open_connection(self.dest_ip, self.port), timeout)
+                logger.info(f"Connected to {self.dest_ip}:{self.port}")
+                return streams
+            except asyncio.TimeoutError:
+                continue
+            except OSError as e:
+                logger.debug(f"While trying to connect: {e}")
+        return None
+
+    async def _host(self, listen_lim: float) -> Streams | None:
+        accepted: asyncio.Future[Streams] = asyncio.get_running_loop().create_future()
+
+        def on_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            ip, port = writer.get_extra_info("peername")[:2]
+            if ip != self.dest_ip or accepted.done():
+                writer.close()
+                logger.debug(f"Rejected {ip}:{port}")
+                self.rejected.append((ip, port))
+                return
+            logger.info(f"Peer connected ({self.dest_ip}:{self.port})")
+            accepted.set_result((reader, writer))
+
+        server = await asyncio.start_server(on_client, self.host_ip, self.port, reuse_address=True)
+        logger.debug("Listening...")
+        try:
+            return await asyncio.wait_for(accepted, listen_lim)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            server.close()
+
+    async def _race(self, listen_lim: float, timeout: float) -> Streams | None:
+        """Connect to and listen for peer at the same time, see PeerConnection._race."""
+
+        decider = socket.inet_aton(self.host_ip) < socket.inet_aton(self.dest_ip)
+        winner: asyncio.Future[tuple[Streams, bool]] = asyncio.get_running_loop().create_future()
+        losers: list[asyncio.StreamWriter] = []
+
+        async def take(streams: Streams, inbound: bool) -> None:
+            reader, writer = streams
+            try:
+                if decider:
+                    if winner.done():
+                        raise ConnectionAbortedError
+                    writer.write(RACE_MARK)
+                    await writer.drain()
+                elif await reader.readexactly(len(RACE_MARK)) != RACE_MARK:
+                    raise ConnectionAbortedError
+            except (OSError, asyncio.IncompleteReadError):
+                writer.close()
+                return
+            if winner.done():
+                writer.close()
+                return
+            winner.set_result((streams, inbound))
+
+        def on_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            ip, port = writer.get_extra_info("peername")[:2]
+            if ip != self.dest_ip:
+                writer.close()
+                logger.debug(f"Rejected {ip}:{port}")
+                self.rejected.append((ip, port))
+                return
+            logger.info(f"Peer connected ({self.dest_ip}:{self.port})")
+            losers.append(writer)
+            tasks.add(asyncio.ensure_future(take((reader, writer), True)))
+
+        async def connect() -> None:
+            while True:
+                try:
+                    streams = await asyncio.wait_for(
+                        # pin the source address, the peer filters inbound connections by it
+                        asyncio.open_connection(self.dest_ip, self.port, local_addr=(self.host_ip, 0)),
+                        timeout
+                    )
+                except (OSError, asyncio.TimeoutError) as e:
+                    logger.debug(f"While trying to connect: {e!r}")
+                    await asyncio.sleep(cfg.race_retry_interval)
+                    continue
+                logger.info(f"Connected to {self.dest_ip}:{self.port}")
+                losers.append(streams[1])
+                await take(streams, False)
+                return
+
+        tasks: set[asyncio.Future] = set()
+        server = None
+        try:
+            server = await asyncio.start_server(on_client, self.host_ip, self.port, reuse_address=True)
+            logger.debug("Listening...")
+        except OSError as e:
+            logger.warning(f"Cannot listen on {self.host_ip}:{self.port} ({e}), racing connect only")
+        tasks.add(asyncio.ensure_future(connect()))
+
+        try:
+            streams, self.is_host = await asyncio.wait_for(asyncio.shield(winner), listen_lim)
+            return streams
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            if server is not None:
+                server.close()
+            for task in tasks:
+                task.cancel()
+            for writer in losers:
+                if not winner.done() or writer is not winner.result()[0][1]:
+                    writer.close()
@@ -1,5 +1,8 @@
-from time import time
+from time import time, monotonic
+from typing import Literal
 import socket
+import selectors
+import os
 import logging
 import onionchat.config as cfg
 from onionchat.utils.types import *
@@ -7,6 +10,9 @@ from onionchat.core.conn_core import ConnectionCore
 
 logger = logging.getLogger(__name__)
 
+# sent by the deciding side on the socket that won the connect/listen race
+RACE_MARK = b"\x01"
+
 class PeerConnection(ConnectionCore):
     """P2P connection handler.
 
@@ -32,7 +38,8 @@ class PeerConnection(ConnectionCore):
         con_attempt_lim: int = cfg.con_attempt_lim,
         con_timeout: float = cfg.con_timeout,
         host_timeout: float = cfg.host_timeout,
-        host_listen_lim: float = cfg.host_listen_lim
+        host_listen_lim: float = cfg.host_listen_lim,
+        con_mode: Literal['serial', 'race'] = cfg.con_mode
     ) -> None:
         """Establish connection by connecting or hosting.
         
@@ -41,8 +48,20 @@ class PeerConnection(ConnectionCore):
             con_timeout (float): Timeout per connection attempt
             host_timeout (float): Timeout for accepting connections
             host_listen_lim (float): Max time to listen as host
+            con_mode (str): 'serial' (connect, then host) or 'race' (connect and host concurrently)
         """
 
+        if con_mode == "race" and self.host_ip == self.dest_ip:
+            logger.warning("Cannot race connect/listen against own address, falling back to serial")
+            con_mode = "serial"
+
+        if con_mode == "race":
+            self.client, self.is_host = self._race(host_listen_lim, con_timeout)
+            self.is_server = self.is_host if not isinstance(self.client, EmptySocket) else EmptyConnection()
+            if isinstance(self.client, EmptySocket):
+                logger.error(f"Failed to peer with {self.dest_ip}. Race timed out ({host_listen_lim})")
+            return
+
         self.client = self._con(con_attempt_lim, con_timeout)
         self.is_server = False if not isinstance(self.client, EmptySocket) else EmptyConnection()
 
@@ -123,6 +142,139 @@ class PeerConnection(ConnectionCore):
         finally:
             server.close()
     
+    def _race(self, listen_lim: float, timeout: float) -> tuple[socket.socket | EmptySocket, bool]:
+        """Connect to and listen for peer at the same time.
+
+        The first established socket wins. The side with the lower address decides: it picks
+        a socket, marks it with a single byte and closes the rest. The other side keeps every
+        established candidate until one of them carries the mark.
+
+        Args:
+            listen_lim: Max time to race
+            timeout: Timeout per connection attempt
+
+        Returns:
+            (Connected socket or EmptySocket, whether the winning socket was accepted)
+        """
+
+        decider = socket.inet_aton(self.host_ip) < socket.inet_aton(self.dest_ip)
+        sel = selectors.DefaultSelector()
+        candidates: dict[socket.socket, bool] = {}  # socket -> accepted (inbound)
+        pending: socket.socket | None = None
+        pending_since = next_attempt = 0.0
+        winner: tuple[socket.socket | EmptySocket, bool] = (EmptySocket(), False)
+
+        server: socket.socket | None = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            server.bind((self.host_ip, self.port))
+            server.listen()
+            server.setblocking(False)
+            sel.register(server, selectors.EVENT_READ, "accept")
+            logger.debug("Listening...")
+        except OSError as e:
+            logger.warning(f"Cannot listen on {self.host_ip}:{self.port} ({e}), racing connect only")
+            server.close()
+            server = None
+
+        def take(sock: socket.socket, inbound: bool) -> bool:
+            nonlocal winner
+            if not decider:
+                candidates[sock] = inbound
+                sel.register(sock, selectors.EVENT_READ, "mark")
+                return False
+            try:
+                sock.setblocking(True)
+                sock.settimeout(timeout)
+                sock.sendall(RACE_MARK)
+            except OSError as e:
+                logger.debug(f"While marking race winner: {e}")
+                sock.close()
+                return False
+            winner = (sock, inbound)
+            return True
+
+        t_end = monotonic() + listen_lim
+        try:
+            while (now := monotonic()) < t_end:
+                if pending is None and now >= next_attempt:
+                    pending = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                    pending.setblocking(False)
+                    try:
+                        # pin the source address, the peer filters inbound connections by it
+                        pending.bind((self.host_ip, 0))
+                    except OSError:
+                        pass
+                    pending.connect_ex((self.dest_ip, self.port))
+                    sel.register(pending, selectors.EVENT_WRITE, "connect")
+                    pending_since = now
+                elif pending is not None and now - pending_since >= timeout:
+                    sel.unregister(pending)
+                    pending.close()
+                    pending = None
+                    next_attempt = now
+
+                wait = t_end - now
+                if pending is None:
+                    wait = min(wait, max(0.0, next_attempt - now))
+                else:
+                    wait = min(wait, pending_since + timeout - now)
+
+                for key, _ in sel.select(max(0.0, wait)):
+                    sock = key.fileobj
+                    assert isinstance(sock, socket.socket)
+
+                    if key.data == "connect":
+                        sel.unregister(sock)
+                        pending = None
+                        err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                        if err:
+                            logger.debug(f"While trying to connect: {os.strerror(err)}")
+                            sock.close()
+                            next_attempt = monotonic() + cfg.race_retry_interval
+                            continue
+                        logger.info(f"Connected to {self.dest_ip}:{self.port}")
+                        next_attempt = t_end
+                        if take(sock, False):
+                            return winner
+
+                    elif key.data == "accept":
+                        try:
+                            sock, addr = sock.accept()
+                        except BlockingIOError:
+                            continue
+                        ip, port = addr
+                        if ip != self.dest_ip:
+                            sock.close()
+                            logger.debug(f"Rejected {ip}:{port}")
+                            self.rejected.append(addr)
+                            continue
+                        logger.info(f"Peer connected ({self.dest_ip}:{self.port})")
+                        if take(sock, True):
+                            return winner
+
+                    else:  # "mark"
+                        sel.unregister(sock)
+                        inbound = candidates.pop(sock)
+                        try:
+                            mark = sock.recv(len(RACE_MARK))
+                        except OSError:
+                            mark = b""
+                        if mark != RACE_MARK:
+                            sock.close()
+                            continue
+                        winner = (sock, inbound)
+                        return winner
+            return winner
+
+        finally:
+            for sock in [*candidates, pending, server]:
+                if sock is not None and sock is not winner[0]:
+                    sock.close()
+            sel.close()
+            if isinstance(winner[0], socket.socket):
+                winner[0].setblocking(True)
+
     def get_client(self) -> socket.socket:
         """Get established client socket.
         
@@ -0,0 +1,58 @@
+from __future__ import annotations
+from abc import abstractmethod
+from typing import TYPE_CHECKING
+import socket
+import onionchat.config as cfg
+from onionchat.core.conn_core import ConnectionCore
+from onionchat.utils.types import EmptySocket, EmptyConnection
+
+if TYPE_CHECKING:
+    # annotations only, asyncio is imported by the asyncio pipelines themselves
+    import asyncio
+
+class AsyncConnectionCore(ConnectionCore):
+    """Core asyncio connection creation. (Virtual class)
+    Built with PipelineBuilder.abuild, layers above talk to the peer through asyncio streams.
+    Note: host_ip is resolved by resolve_host_ip (in est_connection), not in the constructor,
+    so building a connection never blocks the event loop on a name lookup.
+
+    Args:
+        dest_ip (str): Destination IPv4 address
+        port (int): Destination port
+    """
+
+    def __init__(self, dest_ip: str, port: int = cfg.port) -> None:
+        # ConnectionCore.__init__ without the blocking gethostbyname
+        self.host_ip = ""
+        self.dest_ip = dest_ip
+        self.port = port
+        self.is_server: bool | EmptyConnection = EmptyConnection()
+        self.client: socket.socket | EmptySocket = EmptySocket()
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+
+    async def resolve_host_ip(self) -> str:
+        """Own IPv4 address (as ConnectionCore.host_ip), looked up without blocking the loop."""
+        import asyncio
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(socket.gethostname(), None, family=socket.AF_INET)
+            self.host_ip = infos[0][4][0]
+        except (OSError, IndexError):
+            self.host_ip = "127.0.0.1"
+        return self.host_ip
+
+    @abstractmethod
+    async def est_connection(self, *args, **kwargs) -> None:
+        """Establish connection (connect or host)."""
+        ...
+
+    def get_streams(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """Return established (reader, writer) streams (raise on missing)."""
+        if self.reader is None or self.writer is None:
+            raise ValueError("Connection must be established first")
+        return self.reader, self.writer
+
+    def get_client(self):
+        """Return the transport socket of the established streams (raise on missing)."""
+        _, writer = self.get_streams()
+        return writer.get_extra_info("socket")
@@ -1,24 +1,54 @@
 from onionchat.core.conn_core import ConnectionCore
+from onionchat.core.async_conn_core import AsyncConnectionCore
 from onionchat.utils.types import EmptyConnection, TerminateConnection, EmptyMessage
+from onionchat.utils.framing import FrameReader, FrameWriter
 from onionchat import config as cfg
 from abc import ABC, abstractmethod
+import socket
 from typing import Optional, Dict
 
 class ChatCore(ABC):
     """Core messaging over socket. (Virtual class)
     
     Args:
-        connection (ConnectionCore): Connection prepared socket
+        connection (ConnectionCore): Connection prepared socket (or asyncio streams for AsyncConnectionCore)
+        low_latency (bool): Send every frame immediately, else coalesce bursts into fewer writes
     """
 
-    def __init__(self, conn: ConnectionCore, encoding: str = cfg.encoding, recv_timeout: float = cfg.recv_timeout) -> None:
+    def __init__(
+        self,
+        conn: ConnectionCore,
+        encoding: str = cfg.encoding,
+        recv_timeout: float = cfg.recv_timeout,
+        low_latency: bool = cfg.low_latency
+    ) -> None:
+        self.recv_timeout = recv_timeout
+        self.low_latency = low_latency
+        self._bind(conn)
+        self.encoding = encoding
+
+    def reattach(self, conn: ConnectionCore) -> None:
+        """Continue the session over a newly established connection (after a drop)."""
+        if not isinstance(conn, AsyncConnectionCore):
+            self.frame_writer.close()
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        self._bind(conn)
+
+    def _bind(self, conn: ConnectionCore) -> None:
         self.conn = conn
         try:
             self.sock = conn.get_client()
+            if isinstance(conn, AsyncConnectionCore):
+                self.reader, self.writer = conn.get_streams()
         except ValueError as e:
             raise RuntimeError(f"Failed to get client socket from connection: {e}") from e
-        self.sock.settimeout(recv_timeout)
-        self.encoding = encoding
+        if not isinstance(conn, AsyncConnectionCore):
+            self.sock.settimeout(self.recv_timeout)
+            self.frame_reader = FrameReader(self.sock)
+            self.frame_writer = FrameWriter(self.sock, self.low_latency)
 
     @abstractmethod
     def send_msg(self, msg: str) -> Optional[TerminateConnection]:
@@ -28,9 +58,45 @@ class ChatCore(ABC):
     def recv_msg(self) -> Dict | TerminateConnection | EmptyMessage:
         ...
 
+    def poll_msg(self) -> Dict | TerminateConnection | EmptyMessage:
+        """Receive without waiting, for a readable socket (see RecvDispatcher).
+        At most one socket read, EmptyMessage until a full frame is in."""
+        try:
+            data = self.frame_reader.poll_frame()
+        except (socket.timeout, BlockingIOError, InterruptedError):
+            return EmptyMessage()
+        except OSError:
+            return TerminateConnection()
+        return EmptyMessage() if data is None else self._handle_frame(data)
+
+    def recv_buffered(self) -> bool:
+        """Whether a message may be received without new data on the socket."""
+        pending = getattr(self.sock, "pending", None)
+        return self.frame_reader.has_frame() or bool(pending and pending())
+
+    def _handle_frame(self, frame: memoryview) -> Dict | EmptyMessage:
+        """Turn a received frame body into a message."""
+        raise NotImplementedError(f"{type(self).__name__} has no frame handler")
+
+    async def asend_msg(self, msg: str) -> Optional[TerminateConnection]:
+        """Send message to peer over asyncio streams (AsyncConnectionCore only)."""
+        raise NotImplementedError(f"{type(self).__name__} has no asyncio support")
+
+    async def arecv_msg(self) -> Dict | TerminateConnection:
+        """Wait for the next message from peer over asyncio streams (AsyncConnectionCore only)."""
+        raise NotImplementedError(f"{type(self).__name__} has no asyncio support")
+
     # @abstractmethod
     # def ping(self) -> bool:
     #     pass
 
     def close(self) -> None:
-        self.sock.close()
\ No newline at end of file
+        self.frame_writer.close()
+        self.sock.close()
+
+    async def aclose(self) -> None:
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except OSError:
+            pass
\ No newline at end of file
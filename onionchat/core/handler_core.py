@@ -1,9 +1,12 @@
 from abc import ABC, abstractmethod
 import onionchat.config as cfg
 from onionchat.core.chat_core import ChatCore
+from onionchat.utils.history_store import HistoryStore
 
 class HandlerCore(ABC):
     """Core chat UI / handler. (Virtual class)
+    Note: history is a HistoryStore, older messages spill to disk past history_ring_size.
+    open() closes it (its spill file) when the session ends.
     
     Args:
         chat (ChatCore): ChatCore instance to handle
@@ -11,10 +14,14 @@ class HandlerCore(ABC):
 
     def __init__(self, chat: ChatCore) -> None:
         self.client_pref = str(chat.sock.getpeername()[0]) or cfg.unknown_client
-        self.history = []
+        self.history = HistoryStore(encoding=chat.encoding)
         self.chat = chat
 
     @abstractmethod
     def open(self) -> None:
-        """Start the UI / handler loop."""
-        ...
\ No newline at end of file
+        """Start the UI / handler loop, close() once it ends."""
+        ...
+
+    def close(self) -> None:
+        """Release the history's spill file."""
+        self.history.close()
\ No newline at end of file
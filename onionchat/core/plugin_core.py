@@ -16,6 +16,10 @@ class PluginCore(Generic[CoreT], ABC):
         self._layer: CoreT = layer
 
     wire_affecting: bool = False
+    # sends the module-sign manifest along with its own first handshake message (see PipelineBuilder)
+    carries_manifest: bool = False
+    # connection plugin whose records leave encrypted (see Compress)
+    encrypts: bool = False
 
     @staticmethod
     @abstractmethod
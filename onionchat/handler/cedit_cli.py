@@ -2,13 +2,14 @@ import curses
 import threading
 import logging
 import socket
-import datetime
+import time
 import onionchat.config as cfg
-from onionchat.utils.funcs import wrap_text
+from onionchat.utils.scroll_view import ScrollView
 from onionchat.utils.types import *
 from onionchat.chat.generic_chat import GenericChat
 from onionchat.core.chat_core import ChatCore
 from onionchat.core.handler_core import HandlerCore
+from onionchat.utils.dispatcher import dispatcher_for, shared_dispatcher
 
 logger = logging.getLogger(__name__)
 
@@ -19,28 +20,47 @@ class CEditCLI(HandlerCore):
             chat (ChatCore): ChatCore instance to handle
             input_sym (str): Input prompt symbol
             timestamps (str): Whether to show timestamps on messages
+            max_fps (int): Redraw rate cap, 0 for no cap
+
+        Note: Drawing happens on one render thread, woken only when the input, history or
+        terminal size changed (dirty flags). Changes within one frame are drawn together.
+        Note: History keeps whole messages, the display is a ScrollView (only visible lines are
+        wrapped and drawn, a resize re-wraps lazily).
     """
 
-    def __init__(self, chat: ChatCore, input_sym: str = cfg.input_sym, timestamps: bool = cfg.cedit_timestamps) -> None:
+    def __init__(
+        self,
+        chat: ChatCore,
+        input_sym: str = cfg.input_sym,
+        timestamps: bool = cfg.cedit_timestamps,
+        max_fps: int = cfg.cedit_max_fps
+    ) -> None:
         super().__init__(chat)
 
         self.stdscr = None
         self.height, self.width = 0, 0
-        self.max_display_size, self.max_input_size = cfg.cedit_max_display_size, cfg.cedit_max_input_size
-       
+        self.max_input_size = cfg.cedit_max_input_size
+        self.view = ScrollView(self.history)
+
         self.input_sym = input_sym.strip() + " "
         self.inp = ""
-        self.inp_pos, self.display_pos = 0, 0
+        self.inp_pos = 0
 
         self.dt_format = "[%d-%m-%Y %H:%M:%S] " if timestamps else ""
-        self.now = ""
+
+        self.frame_time = 1 / max_fps if max_fps > 0 else 0.0
+        self._render_cond = threading.Condition()
+        self._dirty_input = self._dirty_display = self._dirty_size = False
 
         self.running = False
 
     def open(self) -> None:
         """Start chat session."""
         self.running = True
-        curses.wrapper(self._handle_ui)
+        try:
+            curses.wrapper(self._handle_ui)
+        finally:
+            self.close()
 
     def _handle_ui(self, stdscr) -> None:
         self.stdscr = stdscr
@@ -50,32 +70,87 @@ class CEditCLI(HandlerCore):
         self.height, self.width = self.stdscr.getmaxyx()
         self.stdscr.addstr(self.height - 1, 0, self.input_sym)
         self.input_pad = curses.newpad(1, self.max_input_size)
-        self.display_pad = curses.newpad(self.max_display_size, self.width)
+        # one spare row, a full last line would move the cursor past the pad
+        self.display_pad = curses.newpad(self.height, self.width)
+        self.view.resize(self.width)
 
         self.stdscr.refresh()
 
         # Init threads
         t_in = threading.Thread(target=self._in_thread)
-        t_out = threading.Thread(target=self._out_thread)
-        t_clock = threading.Thread(target=self._clock_thread, daemon=True)
+        t_render = threading.Thread(target=self._render_thread)
 
         t_in.start()
         logger.debug("Started input thread")
-        t_out.start()
-        logger.debug("Started ouput thread")
-        t_clock.start()
-        logger.debug("Started clock thread")
+        t_render.start()
+        logger.debug("Started render thread")
+
+        self._request_render(display=True, input=True)
+        self.dispatcher = dispatcher = dispatcher_for(self.chat)
+        dispatcher.register(self.chat, self._on_msg, self._on_close)
+        logger.debug("Registered chat with receive dispatcher")
 
         try:
             t_in.join()
-            t_out.join()
-            t_clock.join()
         except KeyboardInterrupt:
             pass
+        finally:
+            dispatcher.unregister(self.chat)
+            if dispatcher is not shared_dispatcher():
+                dispatcher.stop()
+            self._stop()
+            t_render.join()
 
-    def _clock_thread(self) -> None:
-        while self.running:
-            self.now = datetime.datetime.now().strftime(self.dt_format)
+    def _stop(self) -> None:
+        self.running = False
+        with self._render_cond:
+            self._render_cond.notify_all()
+
+    def _timestamp(self) -> str:
+        return time.strftime(self.dt_format) if self.dt_format else ""
+
+    def _request_render(self, display: bool = False, input: bool = False, size: bool = False) -> None:
+        """Mark parts of the screen dirty and wake the render thread."""
+        with self._render_cond:
+            self._dirty_display |= display
+            self._dirty_input |= input
+            self._dirty_size |= size
+            self._render_cond.notify()
+
+    def _render_thread(self) -> None:
+        last = 0.0
+        while True:
+            with self._render_cond:
+                while self.running and not (self._dirty_display or self._dirty_input or self._dirty_size):
+                    self._render_cond.wait()
+                if not self.running:
+                    return
+
+            # frame rate cap (monotonic), whatever changes meanwhile is drawn in the same frame
+            wait = last + self.frame_time - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+            with self._render_cond:
+                size, display, input = self._dirty_size, self._dirty_display, self._dirty_input
+                self._dirty_size = self._dirty_display = self._dirty_input = False
+
+            if size:
+                self._resize()
+            if size or display:
+                self._render_display()
+            # last, leaves the cursor in the input line
+            if size or input or display:
+                self._render_input()
+            last = time.monotonic()
+
+    def _resize(self) -> None:
+        self.height, self.width = self.stdscr.getmaxyx() # type: ignore
+        self.stdscr.clear() # type: ignore
+        self.stdscr.addstr(self.height - 1, 0, self.input_sym) # type: ignore
+        self.stdscr.refresh() # type: ignore
+        self.display_pad.resize(self.height, self.width)
+        self.view.resize(self.width)
     
     def _in_thread(self) -> None:
         while self.running:
@@ -85,7 +160,7 @@ class CEditCLI(HandlerCore):
                     msg = self.inp.strip()
                     self.inp = ""
                     self.inp_pos = 0
-                    self._render_input()
+                    self._request_render(input=True)
                     if not msg or not msg.isprintable():
                         logger.debug(f"Unable to send invalid message: {msg!r}")
                         continue
@@ -95,41 +170,40 @@ class CEditCLI(HandlerCore):
                         self.chat.send_msg(msg)
                     except (BrokenPipeError, OSError):
                         logger.info("Connection lost")
-                        self.running = False
+                        self._stop()
 
-                    self.history += wrap_text(f"{self.now}You: {msg}", self.width)                  
-                    self._render_display()
+                    self.history.append(f"{self._timestamp()}You: {msg}")
+                    self._request_render(display=True)
                 case 265 | curses.KEY_F1:  # F1
                     try:
                         self.chat.send_msg("__exit__")
                     except:
                         pass
                     logger.info("Exit chat")
-                    self.running = False
+                    self._stop()
                 case 127 | curses.KEY_BACKSPACE: # Backspace
                     # remove character left of cursor
                     if self.inp and self.inp_pos > 0:
                         self.inp = self.inp[: self.inp_pos - 1] + self.inp[self.inp_pos :]
                         self.inp_pos -= 1
-                        self._render_input()
+                        self._request_render(input=True)
 
                 # Scrolling
-                case curses.KEY_UP:
-                    if self.get_bounded_display_pos() > 0:
-                        self.display_pos -= 1
-                        self._render_display()
-                case curses.KEY_DOWN:
-                    if self.display_pos < 0:
-                        self.display_pos += 1
-                        self._render_display()
+                case curses.KEY_UP | curses.KEY_DOWN | curses.KEY_PPAGE | curses.KEY_NPAGE:
+                    usable_height = self.height - 1
+                    step = 1 if key in (curses.KEY_UP, curses.KEY_DOWN) else usable_height
+                    if self.view.scroll(-step if key in (curses.KEY_UP, curses.KEY_PPAGE) else step, usable_height):
+                        self._request_render(display=True)
                 case curses.KEY_LEFT:
                     # clamp to start
                     self.inp_pos = max(0, self.inp_pos - 1)
-                    self._render_input()
+                    self._request_render(input=True)
                 case curses.KEY_RIGHT:
                     # clamp to end
                     self.inp_pos = min(len(self.inp), self.inp_pos + 1)
-                    self._render_input()
+                    self._request_render(input=True)
+                case curses.KEY_RESIZE:
+                    self._request_render(size=True)
 
                 case _:
                     # 32 - 126 printable ASCII
@@ -142,39 +216,26 @@ class CEditCLI(HandlerCore):
                         # insert at cursor: left + char + right
                         self.inp = self.inp[: self.inp_pos] + char + self.inp[self.inp_pos :]
                         self.inp_pos += 1
-                        self._render_input()
-
-    def _out_thread(self) -> None:
-        while self.running:
-            self._render_display()
-            data = self.chat.recv_msg()
-
-            if isinstance(data, EmptyMessage):
-                continue
+                        self._request_render(input=True)
 
-            if isinstance(data, TerminateConnection) or data.get("msg", "").strip() == "__exit__":
-                logger.info("Peer disconnected")
-                self.running = False
-                break
+    def _on_msg(self, data: dict) -> None:
+        if data.get("msg", "").strip() == "__exit__":
+            self._on_close()
+            return
 
-            self.history += wrap_text(f"{self.now}{self.client_pref}: {data.get('msg', '')}", self.width)
-            
-    
-    def get_bounded_display_pos(self) -> int:
-        """
-        Returns current display line position. Helper function, can use outside class threads,
-        but is mainly meant for internal use.
-        """
+        self.history.append(f"{self._timestamp()}{self.client_pref}: {data.get('msg', '')}")
+        self._request_render(display=True)
 
-        usable_height = self.height - 1
-        return max(usable_height, len(self.history)) - usable_height + self.display_pos
+    def _on_close(self) -> None:
+        logger.info("Peer disconnected")
+        self._stop()
+        self.dispatcher.unregister(self.chat)
 
     def get_bounded_input_pos(self) -> tuple[int, int]:
         """
         Compute input pad column (pad_col) and cursor x on the screen.
         Returns (pad_col, cursor_x).
-        This mirrors get_bounded_display_pos but for input rendering/cursor.
-        Also a helper function, refer to get_bounded_display_pos() docs.
+        Helper function, can use outside class threads, but is mainly meant for internal use.
         """
 
         usable_width = max(0, self.width - 1 - len(self.input_sym))
@@ -197,7 +258,7 @@ class CEditCLI(HandlerCore):
         self.input_pad.refresh(0, pad_col, self.height - 1, len(self.input_sym), self.height - 1, self.width - 1)
 
     def _render_display(self) -> None:
-        self.display_pad.clear()
-        for i, msg in enumerate(self.history[:self.max_display_size]):
-            self.display_pad.addstr(i, 0, msg)
-        self.display_pad.refresh(self.get_bounded_display_pos(), 0, 0, 0, self.height - 2, self.width - 1)
\ No newline at end of file
+        self.display_pad.erase()
+        for i, line in enumerate(self.view.window(self.height - 1)):
+            self.display_pad.addstr(i, 0, line)
+        self.display_pad.refresh(0, 0, 0, 0, self.height - 2, self.width - 1)
\ No newline at end of file
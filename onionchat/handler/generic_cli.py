@@ -6,6 +6,7 @@ from onionchat.utils.types import *
 from onionchat.chat.generic_chat import GenericChat
 from onionchat.core.chat_core import ChatCore
 from onionchat.core.handler_core import HandlerCore
+from onionchat.utils.dispatcher import dispatcher_for, shared_dispatcher
 
 logger = logging.getLogger(__name__)
 
@@ -23,22 +24,29 @@ class GenericCLIHandler(HandlerCore):
     def open(self) -> None:
         """Start chat session."""
         self.running = True
-        self._handle_ui()
+        try:
+            self._handle_ui()
+        finally:
+            self.close()
     
     def _handle_ui(self) -> None:
         t_in = threading.Thread(target=self._in_thread)
-        t_out = threading.Thread(target=self._out_thread)
 
-        logger.debug("Started input thread")
-        t_in.start()
+        for msg in self.history:
+            print(f"\n{self.client_pref}:{msg}\n{cfg.input_sym} ", end="", flush=True)
 
-        logger.debug("Started ouput thread")
-        t_out.start()
+        self.dispatcher = dispatcher = dispatcher_for(self.chat)
+        dispatcher.register(self.chat, self._on_msg, self._on_close)
+        logger.debug("Registered chat with receive dispatcher")
 
+        logger.debug("Started input thread")
+        t_in.start()
         t_in.join()
-        t_out.join()
-        
-        self.chat.sock.close()
+
+        dispatcher.unregister(self.chat)
+        if dispatcher is not shared_dispatcher():
+            dispatcher.stop()
+        self.chat.close()
 
     def _in_thread(self) -> None:
         while self.running:
@@ -63,20 +71,15 @@ class GenericCLIHandler(HandlerCore):
                 self.running = False
                 break
 
-    def _out_thread(self) -> None:
-        for msg in self.history:
-            print(f"\n{self.client_pref}:{msg}\n{cfg.input_sym} ", end="", flush=True)
-
-        while self.running:
-            data = self.chat.recv_msg()
-
-            if isinstance(data, EmptyMessage):
-                continue
+    def _on_msg(self, data: dict) -> None:
+        if data.get("msg", "").strip() == "__exit__":
+            self._on_close()
+            return
 
-            if isinstance(data, TerminateConnection) or data.get("msg", "").strip() == "__exit__":
-                logger.info("\nPeer disconnected")
-                self.running = False
-                break
+        self.history.append(data.get("msg", ""))
+        print(f"\n{self.client_pref}:{data.get('msg', '')}\n{cfg.input_sym} ", end="", flush=True)
 
-            self.history.append(data.get("msg", ""))
-            print(f"\n{self.client_pref}:{data.get('msg', '')}\n{cfg.input_sym} ", end="", flush=True)
\ No newline at end of file
+    def _on_close(self) -> None:
+        logger.info("\nPeer disconnected")
+        self.running = False
+        self.dispatcher.unregister(self.chat)
\ No newline at end of file
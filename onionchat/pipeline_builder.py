@@ -1,16 +1,26 @@
 from typing import Dict, Any, List
+from functools import lru_cache
+import copy
+import socket
 import logging
 import onionchat.config as cfg
 from onionchat.utils.types import CoreT
 from onionchat.core.chat_core import ChatCore
 from onionchat.core.handler_core import HandlerCore
 from onionchat.core.conn_core import ConnectionCore
+from onionchat.core.async_conn_core import AsyncConnectionCore
 from onionchat.core.plugin_core import PluginCore
 from onionchat.utils.funcs import load_class
 from onionchat.utils import module_sign as ms
 
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=None)
+def _parameters(func) -> frozenset[str]:
+    """Parameter names of a function (signatures don't change, reflect once per function)."""
+    import inspect
+    return frozenset(inspect.signature(func).parameters)
+
 class PipelineBuilder:
     """Prepare connection, 3 layer chat pipeline
     
@@ -54,59 +64,180 @@ class PipelineBuilder:
             raise ValueError(f"Invalid pipeline component alias: {e}")
         self.args = args or {}
 
+        # plugins may start background work (key generation) while the connection is set up
+        for cls in self.plugins_cls:
+            if hasattr(cls, "prepare"):
+                cls.prepare()
+
     def build(self) -> HandlerCore:
+        if issubclass(self.conn_cls, AsyncConnectionCore):
+            raise ValueError(f"'{self.conn_alias}' is an asyncio connection, use abuild()")
+
         # Layer 1: Connection
-        conn = PipelineBuilder.instantiate_class(self.conn_cls, self.args)
-        conn.est_connection(**PipelineBuilder.validate_args(conn.est_connection, self.args))
+        self.args["conn"] = self._connect()
 
-        level = getattr(cfg, "module_sign_level")
-        if level != "broad":
-            classes = ms.select_classes_for_level(self.conn_cls, self.chat_cls, self.handler_cls, self.plugins_cls, level)
-
-            # map classes to user-provided aliases for readability
-            alias_by_cls = {
-                self.conn_cls: self.conn_alias,
-                self.chat_cls: self.chat_alias,
-                self.handler_cls: self.handler_alias,
-            }
-            for cls, alias in zip(self.plugins_cls, self.plugins_aliases):
-                alias_by_cls[cls] = alias
-
-            manifest = ms.manifest_for_classes(classes, alias_by_cls)
-            mbytes = ms.serialize_manifest(manifest)
-            ldigest = ms.digest_for_manifest_bytes(mbytes)
+        # Layer 2: Chat
+        chat = PipelineBuilder.instantiate_class(self.chat_cls, self.args)
+        chat = self._apply_plugins(chat, self.plugins_cls)
+        assert isinstance(chat, ChatCore)
+        self.args["chat"] = chat
 
-            try:
-                peer_manifest = ms.exchange_manifest(conn.get_client(), mbytes)
-            except Exception as e:
-                logger.error(f"Module-sign manifest exchange failed: {e}")
-                raise
+        # Layer 3: Handler
+        handler = PipelineBuilder.instantiate_class(self.handler_cls, self.args)
+        handler = self._apply_plugins(handler, self.plugins_cls)
+        assert isinstance(handler, HandlerCore)
+
+        return handler
+
+    def reconnect(self, chat: ChatCore) -> ChatCore:
+        """Re-establish the connection layer (handshake and connection plugins included)
+        and continue 'chat' over it, see ChatCore.reattach."""
+        if issubclass(self.conn_cls, AsyncConnectionCore):
+            raise ValueError(f"'{self.conn_alias}' is an asyncio connection, reconnect is not supported")
+        try:
+            conn = self._connect()
+            conn.get_client()  # raises when peering failed
+        except ValueError as e:
+            raise ConnectionError(f"Reconnect failed: {e}") from e
+        self.args["conn"] = conn
+        chat.reattach(conn)
+        return chat
 
-            pdigest = ms.digest_for_manifest_bytes(ms.serialize_manifest(peer_manifest)) if peer_manifest else b""
-            if not peer_manifest or pdigest != ldigest:
-                logger.error("Peer module set mismatch")
-                logger.info(f"Local: {ms.summarize_manifest(manifest)}")
-                logger.info(f"Peer:  {ms.summarize_manifest(peer_manifest)}")
-                raise ConnectionError("Peer module set mismatch")
+    def _connect(self) -> ConnectionCore:
+        conn = PipelineBuilder.instantiate_class(self.conn_cls, self.args)
+        conn.est_connection(**PipelineBuilder.validate_args(conn.est_connection, self.args))
 
-            logger.info(f"Module set match: {ms.summarize_manifest(manifest)}")
+        self._attest()
+        self._handshake(conn, self._local_manifest(), self._combined_handshake())
 
         conn = self._apply_plugins(conn, self.plugins_cls)
         assert isinstance(conn, ConnectionCore)
+        return conn
+
+    async def abuild(self) -> ChatCore:
+        """Build an asyncio pipeline (AsyncConnectionCore) up to the chat layer.
+        Handlers are blocking terminal UIs, drive the returned chat with asend_msg/arecv_msg instead.
+        """
+        if not issubclass(self.conn_cls, AsyncConnectionCore):
+            raise ValueError(f"'{self.conn_alias}' is not an asyncio connection, use build()")
+
+        # Layer 1: Connection
+        conn = PipelineBuilder.instantiate_class(self.conn_cls, self.args)
+        await conn.est_connection(**PipelineBuilder.validate_args(conn.est_connection, self.args))
+
+        self._attest()
+        await self._ahandshake(conn, self._local_manifest(), self._combined_handshake())
+
+        conn = await self._aapply_plugins(conn, self.plugins_cls)
+        assert isinstance(conn, AsyncConnectionCore)
         self.args["conn"] = conn
 
         # Layer 2: Chat
         chat = PipelineBuilder.instantiate_class(self.chat_cls, self.args)
-        chat = self._apply_plugins(chat, self.plugins_cls)
+        chat = await self._aapply_plugins(chat, self.plugins_cls)
         assert isinstance(chat, ChatCore)
         self.args["chat"] = chat
 
-        # Layer 3: Handler
-        handler = PipelineBuilder.instantiate_class(self.handler_cls, self.args)
-        handler = self._apply_plugins(handler, self.plugins_cls)
-        assert isinstance(handler, HandlerCore)
+        return chat
 
-        return handler
+    def compile(self) -> "PipelineTemplate":
+        """Resolve everything that doesn't depend on the connection once, see PipelineTemplate."""
+        return PipelineTemplate(self)
+
+    def _handshake(self, conn: ConnectionCore, local: tuple[Dict, bytes, bytes] | None, combined: bool) -> None:
+        """Exchange (or, combined, hand to the first connection plugin) the module-sign manifest."""
+        if not self._prepare_handshake(conn, local, combined):
+            return
+        manifest, mbytes, digest = local # type: ignore
+        try:
+            peer_manifest = ms.exchange_manifest(conn.get_client(), mbytes)
+        except Exception as e:
+            logger.error(f"Module-sign manifest exchange failed: {e}")
+            raise
+        self._check_peer_manifest(manifest, digest, peer_manifest)
+
+    async def _ahandshake(self, conn: AsyncConnectionCore, local: tuple[Dict, bytes, bytes] | None, combined: bool) -> None:
+        """_handshake over asyncio streams."""
+        if not self._prepare_handshake(conn, local, combined):
+            return
+        manifest, mbytes, digest = local # type: ignore
+        try:
+            peer_manifest = await ms.aexchange_manifest(*conn.get_streams(), mbytes)
+        except Exception as e:
+            logger.error(f"Module-sign manifest exchange failed: {e}")
+            raise
+        self._check_peer_manifest(manifest, digest, peer_manifest)
+
+    def _prepare_handshake(self, conn: ConnectionCore, local: tuple[Dict, bytes, bytes] | None, combined: bool) -> bool:
+        """Bind the manifest to 'conn', True if it still has to be exchanged separately."""
+        if local is None:
+            return False
+        manifest, mbytes, digest = local
+        # session tickets are bound to the peer's module set
+        conn.manifest_digest = digest
+        if combined:
+            conn.handshake_manifest = (mbytes, lambda peer: self._check_peer_manifest(manifest, digest, peer))
+            return False
+        return True
+
+    def _combined_handshake(self) -> bool:
+        """Whether the manifest rides on the first connection plugin's handshake message.
+        The byte stream is the same as a separate exchange followed by that handshake, only
+        the wait for the peer's manifest goes away (it is still verified before any key is derived)."""
+        if not cfg.combined_handshake:
+            return False
+        first = next((p for p in self.plugins_cls if issubclass(self.conn_cls, p.get_layer())), None)
+        return first is not None and first.carries_manifest
+
+    def _local_manifest(self) -> tuple[Dict, bytes, bytes] | None:
+        """Return (manifest, serialized manifest, digest) for the configured level, None if not exchanged."""
+        level = getattr(cfg, "module_sign_level")
+        if level == "broad":
+            return None
+        classes = ms.select_classes_for_level(self.conn_cls, self.chat_cls, self.handler_cls, self.plugins_cls, level)
+
+        # map classes to user-provided aliases for readability
+        alias_by_cls = {
+            self.conn_cls: self.conn_alias,
+            self.chat_cls: self.chat_alias,
+            self.handler_cls: self.handler_alias,
+        }
+        for cls, alias in zip(self.plugins_cls, self.plugins_aliases):
+            alias_by_cls[cls] = alias
+
+        # components declare wire options (codecs, flag sets) through an optional wire_options(args),
+        # those depending on other plugins also take the plugin order ('plugins')
+        options = {}
+        context = {"args": self.args, "plugins": self.plugins_cls}
+        for cls in classes:
+            if hasattr(cls, "wire_options") and (opts := cls.wire_options(**PipelineBuilder.validate_args(cls.wire_options, context))):
+                options[alias_by_cls[cls]] = opts
+
+        manifest, mbytes = ms.cached_manifest(classes, alias_by_cls, options)
+        return manifest, mbytes, ms.digest_for_manifest_bytes(mbytes)
+
+    def _attest(self) -> None:
+        """With trusted signing keys configured, every pipeline module must match the signed
+        attestation (see module_sign.sign_attestation) before anything is sent."""
+        if not cfg.trusted_signing_pubkeys:
+            return
+        classes = [self.conn_cls, self.chat_cls, self.handler_cls, *self.plugins_cls]
+        try:
+            attested = ms.verify_attestation(ms.default_attestation_path(), cfg.trusted_signing_pubkeys)
+            ms.check_attested(classes, attested)
+        except ValueError as e:
+            logger.critical(f"Module attestation failed: {e}")
+            raise
+
+    def _check_peer_manifest(self, manifest: Dict, digest: bytes, peer_manifest: Dict) -> None:
+        pdigest = ms.digest_for_manifest_bytes(ms.serialize_manifest(peer_manifest)) if peer_manifest else b""
+        if not peer_manifest or pdigest != digest:
+            logger.error("Peer module set mismatch")
+            logger.info(f"Local: {ms.summarize_manifest(manifest)}")
+            logger.info(f"Peer:  {ms.summarize_manifest(peer_manifest)}")
+            raise ConnectionError("Peer module set mismatch")
+
+        logger.info(f"Module set match: {ms.summarize_manifest(manifest)}")
 
     def _apply_plugins(self, layer: CoreT, plugins_cls: List[type[PluginCore]]) -> CoreT:
         for plugin_cls in plugins_cls:
@@ -120,12 +251,121 @@ class PipelineBuilder:
                 raise
         return layer    
 
+    async def _aapply_plugins(self, layer: CoreT, plugins_cls: List[type[PluginCore]]) -> CoreT:
+        for plugin_cls in plugins_cls:
+            if not isinstance(layer, plugin_cls.get_layer()):
+                continue
+            t = PipelineBuilder.instantiate_class(plugin_cls, {"layer": layer})
+            # connection plugins touch the wire and need an asyncio variant, others transform in place
+            atransform = getattr(t, "atransform", None)
+            if atransform is None and isinstance(layer, ConnectionCore):
+                logger.error(f"Plugin {plugin_cls.__name__} has no asyncio support")
+                raise ValueError(f"Plugin {plugin_cls.__name__} has no asyncio support")
+            try:
+                if atransform is not None:
+                    layer = await atransform(**PipelineBuilder.validate_args(atransform, self.args))
+                else:
+                    layer = t.transform(**PipelineBuilder.validate_args(t.transform, self.args))
+            except Exception as e:
+                logger.error(f"Error applying plugin {plugin_cls.__name__}: {e}")
+                raise
+        return layer
+
     @staticmethod
     def validate_args(func, args: Dict) -> Dict:
         """Filter a dict to only include keys that are valid arguments for a function."""
-        import inspect
-        return {k: v for k, v in args.items() if k in sig.parameters} if (sig := inspect.signature(func)) else {}
+        params = _parameters(getattr(func, "__func__", func))
+        return {k: v for k, v in args.items() if k in params}
 
     @staticmethod
     def instantiate_class(cls, args: Dict):
-        return cls(**PipelineBuilder.validate_args(cls.__init__, args))
\ No newline at end of file
+        return cls(**PipelineBuilder.validate_args(cls.__init__, args))
+
+class PipelineTemplate:
+    """Compiled pipeline for many sessions in one process (compile with PipelineBuilder.compile)
+    Note: Argument bindings of every constructor and transform, the plugin order per layer, the
+    module attestation and the module-sign manifest (with its digest) are resolved once.
+    build() and accept() only instantiate the layers and run the per connection handshakes.
+    Note: Args are a snapshot taken at compile time, later changes to builder.args are not seen.
+
+    Args:
+        builder (PipelineBuilder): Pipeline to compile (blocking connections only)
+    """
+
+    def __init__(self, builder: PipelineBuilder) -> None:
+        if issubclass(builder.conn_cls, AsyncConnectionCore):
+            raise ValueError(f"'{builder.conn_alias}' is an asyncio connection, templates are blocking only")
+        self.builder = builder
+        args = {k: v for k, v in builder.args.items() if k not in ("conn", "chat", "layer")}
+
+        builder._attest()
+        self._local = builder._local_manifest()
+        self._combined = builder._combined_handshake()
+        self.manifest_digest = self._local[2] if self._local else None
+
+        self._conn_kwargs = PipelineBuilder.validate_args(builder.conn_cls.__init__, args)
+        self._est_kwargs = PipelineBuilder.validate_args(builder.conn_cls.est_connection, args)
+        self._chat_kwargs = PipelineBuilder.validate_args(builder.chat_cls.__init__, args)
+        self._handler_kwargs = PipelineBuilder.validate_args(builder.handler_cls.__init__, args)
+        # (plugin, transform kwargs) in application order, per layer
+        self._conn_plugins = self._bind_plugins(builder.conn_cls, args)
+        self._chat_plugins = self._bind_plugins(builder.chat_cls, args)
+        self._handler_plugins = self._bind_plugins(builder.handler_cls, args)
+        # accept() copies this instead of constructing (host lookup) per socket
+        self._prototype: ConnectionCore | None = None
+
+    def build(self, conn: ConnectionCore | None = None) -> HandlerCore:
+        """A new handler over 'conn' (established), or over a connection established with the compiled args."""
+        chat = self.build_chat(conn)
+        handler = self.builder.handler_cls(chat=chat, **self._handler_kwargs)
+        handler = self._apply(handler, self._handler_plugins)
+        assert isinstance(handler, HandlerCore)
+        return handler
+
+    def build_chat(self, conn: ConnectionCore | None = None) -> ChatCore:
+        """Like build, up to the chat layer (sessions driven without a terminal UI)."""
+        if conn is None:
+            conn = self.builder.conn_cls(**self._conn_kwargs)
+            conn.est_connection(**self._est_kwargs)
+        self.builder._handshake(conn, self._local, self._combined)
+        conn = self._apply(conn, self._conn_plugins)
+        assert isinstance(conn, ConnectionCore)
+
+        chat = self.builder.chat_cls(conn=conn, **self._chat_kwargs)
+        chat = self._apply(chat, self._chat_plugins)
+        assert isinstance(chat, ChatCore)
+        return chat
+
+    def accept(self, sock: socket.socket, addr: tuple[str, int], chat_only: bool = False) -> HandlerCore | ChatCore:
+        """A new pipeline over a socket accepted by the caller (this side hosts).
+
+        Args:
+            sock (socket.socket): Accepted client socket
+            addr (tuple[str, int]): Peer address as returned by accept()
+            chat_only (bool): Stop at the chat layer (see build_chat)
+        """
+        if self._prototype is None:
+            self._prototype = self.builder.conn_cls(**{**self._conn_kwargs, "dest_ip": addr[0]})
+        conn = copy.deepcopy(self._prototype)
+        conn.dest_ip = addr[0]
+        conn.client = sock
+        conn.is_server = True
+        if hasattr(conn, "is_host"):
+            conn.is_host = True
+        return self.build_chat(conn) if chat_only else self.build(conn)
+
+    def _bind_plugins(self, layer_cls: type, args: Dict) -> List[tuple[type[PluginCore], Dict]]:
+        return [
+            (p, PipelineBuilder.validate_args(p.transform, args))
+            for p in self.builder.plugins_cls if issubclass(layer_cls, p.get_layer())
+        ]
+
+    @staticmethod
+    def _apply(layer: CoreT, plugins: List[tuple[type[PluginCore], Dict]]) -> CoreT:
+        for plugin_cls, kwargs in plugins:
+            try:
+                layer = plugin_cls(layer).transform(**kwargs) # type: ignore
+            except Exception as e:
+                logger.error(f"Error applying plugin {plugin_cls.__name__}: {e}")
+                raise
+        return layer
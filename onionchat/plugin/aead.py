@@ -1,20 +1,44 @@
+import struct
 import logging
 import socket
+import asyncio
 import threading
-from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+from typing import Dict
 import onionchat.config as cfg
 from onionchat.core.plugin_core import PluginCore
 from onionchat.core.conn_core import ConnectionCore
-from onionchat.utils.funcs import recv_exact
+from onionchat.utils.funcs import arecv_exact
+from onionchat.utils.framing import FrameReader, RecordSocket
+from onionchat.utils.recv_pipeline import FramePipeline
+from onionchat.utils.cipher_suites import SUITES, DEFAULT_SUITE, suite_cls
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives import hashes
 
 logger = logging.getLogger(__name__)
 
+_LEN = struct.Struct("!I")
+_COUNTER = struct.Struct("!Q")
+_TAG = 16
+# epoch byte + tag
+_BODY_OVERHEAD = 1 + _TAG
+# length prefix + epoch byte + tag
+RECORD_OVERHEAD = _LEN.size + _BODY_OVERHEAD
+
+def _ratchet(key: bytes) -> bytes:
+    """Next epoch's key, derived one way from the current one."""
+    return HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b"onionchat rekey").derive(key)
+
 class AEAD(PluginCore):
     """Encrypted transport (AEAD)
-    Note: Requires previous transformations for ConnectionCore to obtain send_key and recv_key
+    Note: Requires previous transformations for ConnectionCore to obtain send_key and recv_key,
+    uses the cipher suite negotiated by x25519 (chacha20-poly1305 if none was)
     
     Args:
         layer (ConnectionCore): The layer type a plugin applies to
+
+    Transform args:
+        rekey_records, rekey_bytes (int): Key ratchet limits per direction, 0 disables
+        recv_pipeline (int): Records read ahead on a reader thread, 0 disables (blocking sockets only)
     """
 
     def __init__(self, layer: ConnectionCore) -> None:
@@ -22,26 +46,176 @@ class AEAD(PluginCore):
         self._sock = self._layer.get_client()
 
     wire_affecting: bool = True
+    encrypts: bool = True
 
     @staticmethod
     def get_layer() -> type[ConnectionCore]:
         return ConnectionCore
-    
-    def transform(self) -> ConnectionCore:
-        if not hasattr(self._layer, 'send_key') or not hasattr(self._layer, 'recv_key'):
-            logger.error("AEAD transform requires 'send_key' and 'recv_key' attributes on ConnectionCore")
-            raise ValueError("Missing 'send_key' or 'recv_key' in ConnectionCore for AEAD transform")
 
+    @staticmethod
+    def wire_options(args: Dict) -> Dict:
+        """Options the peer must agree on, added to the module-sign manifest."""
+        # suites this build can negotiate, the choice itself is bound into the x25519 keys
+        # record_epoch: records carry the key epoch (rekeying)
+        return {"cipher_suites": sorted(SUITES), "record_epoch": True}
+    
+    def transform(
+        self,
+        rekey_records: int = cfg.rekey_records,
+        rekey_bytes: int = cfg.rekey_bytes,
+        recv_pipeline: int = cfg.recv_pipeline
+    ) -> ConnectionCore:
+        self._check_keys()
         enc_sock = _EncryptedSocket(
             raw_sock=self._sock,
-            send_key=self._layer.send_key,
-            recv_key=self._layer.recv_key
+            send_key=self._layer.send_key, # type: ignore
+            recv_key=self._layer.recv_key, # type: ignore
+            suite=getattr(self._layer, "cipher", DEFAULT_SUITE),
+            rekey_records=rekey_records,
+            rekey_bytes=rekey_bytes,
+            recv_pipeline=recv_pipeline
         )
 
         self._layer.client = enc_sock
         return self._layer
 
-class _EncryptedSocket:
+    async def atransform(self, rekey_records: int = cfg.rekey_records, rekey_bytes: int = cfg.rekey_bytes) -> ConnectionCore:
+        """Asyncio variant of transform, wraps the layer's streams."""
+        self._check_keys()
+        reader, writer = self._layer.get_streams() # type: ignore
+        cipher = _RecordCipher(
+            self._layer.send_key, self._layer.recv_key, # type: ignore
+            getattr(self._layer, "cipher", DEFAULT_SUITE), rekey_records, rekey_bytes
+        )
+
+        self._layer.reader = _EncryptedStreamReader(reader, cipher) # type: ignore
+        self._layer.writer = _EncryptedStreamWriter(writer, cipher) # type: ignore
+        return self._layer
+
+    def _check_keys(self) -> None:
+        if not hasattr(self._layer, 'send_key') or not hasattr(self._layer, 'recv_key'):
+            logger.error("AEAD transform requires 'send_key' and 'recv_key' attributes on ConnectionCore")
+            raise ValueError("Missing 'send_key' or 'recv_key' in ConnectionCore for AEAD transform")
+
+class _RecordCipher:
+    """
+    Sans-IO record layer shared by the socket and stream wrappers.
+    Record format: 4-byte big-endian len + epoch byte + ciphertext (epoch authenticated as
+    associated data), nonce is an implicit per-direction counter.
+    Nonces are preformatted and updated in place, callers serialize each direction.
+
+    Rekeying: after rekey_records records or rekey_bytes bytes the sender ratchets its key
+    (HKDF of the current one), bumps the epoch and restarts the counter. The receiver ratchets
+    when it sees the next epoch, no extra round trip.
+
+    Args:
+        send_key: 32-byte key for encrypting outgoing messages
+        recv_key: 32-byte key for decrypting incoming messages
+        suite: cipher suite name (see cipher_suites.SUITES)
+        rekey_records: Records per key, 0 disables
+        rekey_bytes: Plaintext bytes per key, 0 disables
+    """
+    def __init__(
+        self,
+        send_key: bytes,
+        recv_key: bytes,
+        suite: str = DEFAULT_SUITE,
+        rekey_records: int = cfg.rekey_records,
+        rekey_bytes: int = cfg.rekey_bytes
+    ):
+        self._aead_cls = suite_cls(suite)
+        self.suite = suite
+        self.rekey_records = rekey_records or float("inf")
+        self.rekey_bytes = rekey_bytes or float("inf")
+        self._send_key, self._recv_key = send_key, recv_key
+        self._send_aead = self._aead_cls(send_key)
+        self._recv_aead = self._aead_cls(recv_key)
+        # encrypt_into / decrypt_into need cryptography >= 47, else results are copied into the buffers
+        self._into = hasattr(self._aead_cls, "encrypt_into")
+        # 12 bytes nonce: 4 zero bytes + 8-byte big-endian counter
+        self._send_nonce = bytearray(12)
+        self._recv_nonce = bytearray(12)
+        self._send_counter = 0
+        self._recv_counter = 0
+        self._send_bytes = 0
+        self.send_epoch = 0
+        self.recv_epoch = 0
+        self._send_ad = bytes(1)
+        self._recv_ad = bytes(1)
+        self._pt_buf = bytearray(cfg.enc_recv_buf)
+
+    def seal_into(self, data, buf: bytearray, pos: int = 0) -> int:
+        """Encrypt 'data' into 'buf' at 'pos' as one record, returns the record end.
+        'buf' needs room for len(data) + RECORD_OVERHEAD bytes."""
+        if self._send_counter >= self.rekey_records or self._send_bytes >= self.rekey_bytes:
+            self._rekey_send()
+        n = len(data) + _BODY_OVERHEAD
+        _LEN.pack_into(buf, pos, n)
+        buf[pos + _LEN.size] = self.send_epoch
+        _COUNTER.pack_into(self._send_nonce, 4, self._send_counter)
+        self._send_counter += 1
+        self._send_bytes += len(data)
+        start = pos + _LEN.size + 1
+        out = memoryview(buf)[start:start + n - 1]
+        if self._into:
+            self._send_aead.encrypt_into(self._send_nonce, data, self._send_ad, out)
+        else:
+            out[:] = self._send_aead.encrypt(bytes(self._send_nonce), bytes(data), self._send_ad)
+        return start + n - 1
+
+    def seal(self, data: bytes) -> bytearray:
+        """Encrypt 'data' into a new record."""
+        buf = bytearray(len(data) + RECORD_OVERHEAD)
+        self.seal_into(data, buf)
+        return buf
+
+    def open(self, record) -> memoryview:
+        """Decrypt a record body into the reusable plaintext buffer (valid until the next open).
+        Empty if authentication fails."""
+        n = max(0, len(record) - _BODY_OVERHEAD)
+        if n > len(self._pt_buf):
+            # replace, never resize, the previous plaintext may still be referenced
+            self._pt_buf = bytearray(max(n, 2 * len(self._pt_buf)))
+        out = memoryview(self._pt_buf)[:n]
+        return out if self.open_into(record, out) else memoryview(b"")
+
+    def open_into(self, record, out) -> bool:
+        """Decrypt a record body into 'out' (exactly len(record) - 17 bytes), False if authentication fails."""
+        if len(record) < _BODY_OVERHEAD:
+            return False
+        if record[0] != self.recv_epoch:
+            if record[0] != (self.recv_epoch + 1) & 0xFF:
+                logger.error(f"Unexpected record epoch {record[0]} (current {self.recv_epoch})")
+                return False
+            self._rekey_recv()
+        _COUNTER.pack_into(self._recv_nonce, 4, self._recv_counter)
+        self._recv_counter += 1
+        ct = record[1:]
+        try:
+            if self._into:
+                self._recv_aead.decrypt_into(self._recv_nonce, ct, self._recv_ad, out)
+            else:
+                out[:] = self._recv_aead.decrypt(bytes(self._recv_nonce), bytes(ct), self._recv_ad)
+        except Exception:
+            # authentication failed or other error -> treat as closed
+            return False
+        return True
+
+    def _rekey_send(self) -> None:
+        self._send_key = _ratchet(self._send_key)
+        self._send_aead = self._aead_cls(self._send_key)
+        self.send_epoch = (self.send_epoch + 1) & 0xFF
+        self._send_ad = bytes([self.send_epoch])
+        self._send_counter = self._send_bytes = 0
+
+    def _rekey_recv(self) -> None:
+        self._recv_key = _ratchet(self._recv_key)
+        self._recv_aead = self._aead_cls(self._recv_key)
+        self.recv_epoch = (self.recv_epoch + 1) & 0xFF
+        self._recv_ad = bytes([self.recv_epoch])
+        self._recv_counter = 0
+
+class _EncryptedSocket(RecordSocket):
     """
     Small socket-like wrapper presenting key socket methods:
 
@@ -49,57 +223,218 @@ class _EncryptedSocket:
         raw_sock: underlying connected socket.socket
         send_key: 32-byte key for encrypting outgoing messages
         recv_key: 32-byte key for decrypting incoming messages
+        suite: cipher suite name
+        rekey_records, rekey_bytes: rekeying limits (see _RecordCipher)
+        recv_pipeline: Records read ahead by a reader thread (see FramePipeline), 0 reads on the caller's thread
 
     Methods:
-        sendall(bytes)
+        sendall(bytes), send_buffers(list) (plaintexts queued together share one record)
         recv(bufsize) -> bytes (returns full decrypted message frame)
+        recv_into(buffer, nbytes) -> int (streams decrypted bytes, for FrameReader)
+        poll_into(buffer, nbytes) -> int (recv_into that never waits for a partial record)
         settimeout, getpeername, getsockname, close
+        recv_stats() -> dict (read-ahead queue metrics)
     """
-    def __init__(self, raw_sock: socket.socket, send_key: bytes, recv_key: bytes):
-        self._sock = raw_sock
-        self._send_aead = ChaCha20Poly1305(send_key)
-        self._recv_aead = ChaCha20Poly1305(recv_key)
-        self._send_counter = 0
-        self._recv_counter = 0
-        self._lock = threading.Lock()
+    encrypted: bool = True
+
+    def __init__(
+        self,
+        raw_sock: socket.socket,
+        send_key: bytes,
+        recv_key: bytes,
+        suite: str = DEFAULT_SUITE,
+        rekey_records: int = cfg.rekey_records,
+        rekey_bytes: int = cfg.rekey_bytes,
+        recv_pipeline: int = cfg.recv_pipeline
+    ):
+        super().__init__(raw_sock)
+        self._cipher = _RecordCipher(send_key, recv_key, suite, rekey_records, rekey_bytes)
+        self._frames = FrameReader(raw_sock, buf_size=cfg.enc_recv_buf, len_bytes=4, byteorder="big")
+        self._pipeline: FramePipeline | None = None
+        self._timeout = raw_sock.gettimeout()
+        if recv_pipeline > 0:
+            # the reader thread owns the raw socket, timeouts apply to the queue instead
+            raw_sock.settimeout(None)
+            self._pipeline = FramePipeline(raw_sock, recv_pipeline)
+
+        # plaintext staged by senders, whoever holds the send lock seals all of it
+        self._stage = bytearray(cfg.enc_recv_buf)
+        self._spare = bytearray(cfg.enc_recv_buf)
+        self._staged = 0
+        self._stage_lock = threading.Lock()
+        # records must go out in nonce order
+        self._send_lock = threading.Lock()
+        self._out = bytearray(cfg.enc_max_record + RECORD_OVERHEAD)
+        self._out_view = memoryview(self._out)
+        self._error: OSError | None = None
 
-    # framing helpers
-    def _nonce_from_counter(self, counter: int) -> bytes:
-        # 12 bytes nonce: 4 zero bytes + 8-byte big-endian counter
-        return b"\x00\x00\x00\x00" + counter.to_bytes(8, "big")
-    
     def sendall(self, data: bytes):
         """Encrypt 'data' and send as: 4-byte len + ciphertext"""
+        self.send_buffers([data])
 
-        with self._lock:
-            nonce = self._nonce_from_counter(self._send_counter)
-            self._send_counter += 1
-        ct = self._send_aead.encrypt(nonce, data, None)
-        length = len(ct).to_bytes(4, "big")
-        self._sock.sendall(length + ct)
+    def send_buffers(self, buffers: list) -> None:
+        """Encrypt and send 'buffers' in order. Records hold at most enc_max_record bytes,
+        plaintexts of concurrent senders are packed into the same records."""
+        if self._send_lock.acquire(blocking=False):
+            # uncontended, seal straight from the caller's buffers
+            try:
+                if not self._staged:
+                    if self._error:
+                        raise self._error
+                    data = buffers[0] if len(buffers) == 1 else b"".join(buffers)
+                    self._seal_send(data, len(data))
+                    return
+            finally:
+                self._send_lock.release()
 
-    def recv(self, bufsize: int = cfg.enc_recv_buf) -> bytes:
-        """Read a full framed ciphertext message, decrypt and return plaintext bytes."""
+        with self._stage_lock:
+            size = self._staged + sum(len(b) for b in buffers)
+            if size > len(self._stage):
+                grown = bytearray(max(size, 2 * len(self._stage)))
+                grown[:self._staged] = memoryview(self._stage)[:self._staged]
+                self._stage = grown
+            for b in buffers:
+                self._stage[self._staged:self._staged + len(b)] = b
+                self._staged += len(b)
 
-        # read 4-byte length
-        length_data = recv_exact(self._sock, 4)
-        if not length_data:
-            return b""
-        length = int.from_bytes(length_data, "big")
-        if length <= 0:
-            return b""
-        ct = recv_exact(self._sock, length)
-        if not ct:
-            return b""
-        with self._lock:
-            nonce = self._nonce_from_counter(self._recv_counter)
-            self._recv_counter += 1
+        with self._send_lock:
+            if self._error:
+                raise self._error
+            with self._stage_lock:
+                if not self._staged:
+                    # sent along with another sender's record
+                    return
+                plain, staged = self._stage, self._staged
+                self._stage, self._spare, self._staged = self._spare, plain, 0
+            self._seal_send(plain, staged)
+
+    def _seal_send(self, data, size: int) -> None:
+        """Seal the first 'size' bytes of 'data' into the send buffer and write them, send lock held."""
         try:
-            pt = self._recv_aead.decrypt(nonce, ct, None)
-            return pt
-        except Exception:
-            # authentication failed or other error -> treat as closed
+            if size <= cfg.enc_max_record:
+                self._sock.sendall(self._out_view[:self._cipher.seal_into(data if size == len(data) else memoryview(data)[:size], self._out)])
+                return
+            view = memoryview(data)
+            for pos in range(0, size, cfg.enc_max_record):
+                end = self._cipher.seal_into(view[pos:min(pos + cfg.enc_max_record, size)], self._out)
+                self._sock.sendall(self._out_view[:end])
+        except OSError as e:
+            self._error = e
+            raise
+
+    def recv_into(self, buffer, nbytes: int = 0) -> int:
+        """Decrypt straight into 'buffer' when the next record fits, else stream it (see RecordSocket)."""
+        if self._pt:
+            return super().recv_into(buffer, nbytes)
+        ct = self._next_record()
+        if not ct:
+            return 0
+        n = len(ct) - _BODY_OVERHEAD
+        if 0 < n <= (nbytes or len(buffer)):
+            return n if self._cipher.open_into(ct, memoryview(buffer)[:n]) else 0
+        self._pt = self._cipher.open(ct)
+        return super().recv_into(buffer, nbytes) if self._pt else 0
+
+    def _unwrap(self, record) -> memoryview:
+        """Decrypted plaintext of a framed ciphertext record (valid until the next read)."""
+        return self._cipher.open(record)
+
+    def _next_record(self) -> bytes | memoryview | None:
+        if self._pipeline is not None:
+            return self._pipeline.get(self._timeout)
+        return self._frames.read_frame()
+
+    def _poll_record(self) -> bytes | memoryview | None:
+        if self._pipeline is not None:
+            try:
+                return self._pipeline.get(0)
+            except socket.timeout:
+                raise BlockingIOError("No record queued") from None
+        return super()._poll_record()
+
+    def _record_buffered(self) -> bool:
+        if self._pipeline is not None:
+            return self._pipeline.has_frame()
+        return super()._record_buffered()
+
+    def settimeout(self, timeout: float | None) -> None:
+        self._timeout = timeout
+        if self._pipeline is None:
+            self._sock.settimeout(timeout)
+
+    def gettimeout(self) -> float | None:
+        return self._timeout
+
+    def fileno(self) -> int:
+        """Readable while records are available, the pipeline's signal when reading ahead."""
+        return self._pipeline.fileno() if self._pipeline is not None else self._sock.fileno()
+
+    def close(self) -> None:
+        if self._pipeline is not None:
+            # receivers waiting on the queue get EOF, as do all later reads
+            self._pipeline.close()
+            # a recv blocked on the reader thread keeps the connection open past close()
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._sock.close()
+
+    def recv_stats(self) -> dict:
+        """Read-ahead metrics: queued records now, peak, total read (empty without pipeline)."""
+        if self._pipeline is None:
+            return {}
+        return {"depth": self._pipeline.queue_depth(), "peak_depth": self._pipeline.peak_depth, "records": self._pipeline.frames}
+
+class _EncryptedStreamWriter:
+    """asyncio.StreamWriter-like wrapper, every write()/writelines() is sealed into one record."""
+    def __init__(self, writer: asyncio.StreamWriter, cipher: _RecordCipher):
+        self._writer = writer
+        self._cipher = cipher
+
+    def write(self, data: bytes) -> None:
+        self._writer.write(self._cipher.seal(data))
+
+    def writelines(self, data) -> None:
+        self.write(b"".join(data))
+
+    def __getattr__(self, name):
+        return getattr(self._writer, name)
+
+class _EncryptedStreamReader:
+    """asyncio.StreamReader-like wrapper (read, readexactly) over decrypted records."""
+    def __init__(self, reader: asyncio.StreamReader, cipher: _RecordCipher):
+        self._reader = reader
+        self._cipher = cipher
+        self._buf = bytearray()
+
+    async def _fill(self) -> bool:
+        length_data = await arecv_exact(self._reader, _LEN.size)
+        if not length_data:
+            return False
+        length = _LEN.unpack(length_data)[0]
+        ct = await arecv_exact(self._reader, length) if length > 0 else b""
+        pt = self._cipher.open(ct) if ct else b""
+        if not pt:
+            return False
+        self._buf += pt
+        return True
+
+    async def read(self, n: int = -1) -> bytes:
+        if not self._buf and not await self._fill():
             return b""
-        
+        n = len(self._buf) if n < 0 else n
+        data = bytes(self._buf[:n])
+        del self._buf[:n]
+        return data
+
+    async def readexactly(self, n: int) -> bytes:
+        while len(self._buf) < n:
+            if not await self._fill():
+                raise asyncio.IncompleteReadError(bytes(self._buf), n)
+        data = bytes(self._buf[:n])
+        del self._buf[:n]
+        return data
+
     def __getattr__(self, name):
-        return getattr(self._sock, name)
\ No newline at end of file
+        return getattr(self._reader, name)
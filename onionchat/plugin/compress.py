@@ -0,0 +1,140 @@
+import sys
+import zlib
+import hashlib
+import logging
+import threading
+from typing import Dict, List
+import onionchat.config as cfg
+from onionchat.core.plugin_core import PluginCore
+from onionchat.core.conn_core import ConnectionCore
+from onionchat.utils.framing import FrameReader, RecordSocket, send_buffers
+from onionchat.utils.payload_codec import FLAG_TITLES
+
+logger = logging.getLogger(__name__)
+
+# preset dictionary of common chat / payload tokens, most frequent last (zlib favours the tail)
+ZDICT = b"".join((
+    b" the and you that this have with for not are was what just like know ",
+    b"system[", b"__exit__", b"text", b"null, ", b"true, ", b"false, ",
+    *(f'"{title}": '.encode() for title in FLAG_TITLES.values()),
+    b'{"msg": "',
+))
+
+RAW, DEFLATE = b"\x00", b"\x01"
+
+class Compress(PluginCore):
+    """Compression (zlib with a preset chat dictionary)
+    Note: Applied after aead, so messages are compressed before they are encrypted.
+    Compressing before encrypting leaks through the record length how well a message compresses
+    (CRIME-style): a peer or observer that gets its own text sent next to a secret can guess the
+    secret from the sizes. A persistent context widens this to earlier messages, so it is reset per
+    message over an encrypted connection (aead, ssl), whatever 'compress_persistent' says (the
+    manifest reports the effective value). Turn the plugin off when attacker-influenced text
+    shares messages with secrets.
+
+    Args:
+        layer (ConnectionCore): The connection layer to transform.
+
+    Transform args:
+        compress_level (int): zlib level (0-9)
+        compress_threshold (int): Messages smaller than this go out uncompressed
+        compress_persistent (bool): Keep the zlib context across messages (must match the peer), unencrypted only
+    """
+
+    def __init__(self, layer: ConnectionCore) -> None:
+        super().__init__(layer)
+
+    wire_affecting: bool = True
+
+    @staticmethod
+    def get_layer() -> type[ConnectionCore]:
+        return ConnectionCore
+
+    @staticmethod
+    def wire_options(args: Dict, plugins: List[type] | None = None) -> Dict:
+        """Options the peer must agree on, added to the module-sign manifest.
+        'plugins' is the pipeline's plugin order, encrypting ones before this turn persistence off."""
+        plugins = plugins or []
+        below = plugins[:plugins.index(Compress)] if Compress in plugins else []
+        persistent = bool(args.get("compress_persistent", cfg.compress_persistent))
+        return {
+            "compress_persistent": persistent and not any(getattr(p, "encrypts", False) for p in below),
+            "zdict": hashlib.sha256(ZDICT).hexdigest()[:16]
+        }
+
+    def transform(
+        self,
+        compress_level: int = cfg.compress_level,
+        compress_threshold: int = cfg.compress_threshold,
+        compress_persistent: bool = cfg.compress_persistent
+    ) -> ConnectionCore:
+        try:
+            sock = self._layer.get_client()
+        except ValueError as e:
+            logger.error("Connection not established before Compress transform")
+            raise
+
+        if compress_persistent and _encrypted(sock):
+            logger.debug("Encrypted connection, compression context reset per message")
+            compress_persistent = False
+        self._layer.client = _CompressedSocket(sock, compress_level, compress_threshold, compress_persistent)
+        return self._layer
+
+def _encrypted(sock) -> bool:
+    while isinstance(sock, RecordSocket):
+        if sock.encrypted:
+            return True
+        sock = sock._sock
+    # without the ssl module loaded there are no TLS sockets
+    ssl = sys.modules.get("ssl")
+    return ssl is not None and isinstance(sock, ssl.SSLSocket)
+
+class _CompressedSocket(RecordSocket):
+    """
+    Socket-like wrapper sending every sendall() as one record:
+    4-byte big-endian len + 1-byte kind (RAW / DEFLATE) + data
+
+    Args:
+        sock: underlying socket (raw or encrypted)
+        level: zlib level
+        threshold: min message size to compress
+        persistent: share one compression context across messages (Z_SYNC_FLUSH per message)
+    """
+    def __init__(self, sock, level: int, threshold: int, persistent: bool):
+        super().__init__(sock)
+        self.level = level
+        self.threshold = threshold
+        self.persistent = persistent
+        self._comp = zlib.compressobj(level, zdict=ZDICT)
+        self._decomp = zlib.decompressobj(zdict=ZDICT)
+        self._frames = FrameReader(sock, buf_size=cfg.enc_recv_buf, len_bytes=4, byteorder="big")
+        # compression order must equal send order when the context is shared
+        self._lock = threading.Lock()
+
+    def sendall(self, data: bytes):
+        with self._lock:
+            if len(data) < self.threshold:
+                kind, body = RAW, data
+            elif self.persistent:
+                kind, body = DEFLATE, self._comp.compress(data) + self._comp.flush(zlib.Z_SYNC_FLUSH)
+            else:
+                comp = zlib.compressobj(self.level, zdict=ZDICT)
+                kind, body = DEFLATE, comp.compress(data) + comp.flush()
+                if len(body) >= len(data):
+                    kind, body = RAW, data
+            send_buffers(self._sock, [(len(body) + 1).to_bytes(4, "big"), kind, body])
+
+    def _unwrap(self, record) -> bytes:
+        kind, body = record[:1], record[1:]
+        if kind == RAW:
+            return bytes(body)
+        try:
+            decomp = self._decomp if self.persistent else zlib.decompressobj(zdict=ZDICT)
+            data = decomp.decompress(body, cfg.max_frame_size)
+        except zlib.error:
+            # corrupted stream -> treat as closed
+            return b""
+        if decomp.unconsumed_tail:
+            logger.error("Decompressed record exceeds max_frame_size")
+            return b""
+        return data
@@ -3,11 +3,14 @@ import logging
 import onionchat.config as cfg
 from onionchat.core.plugin_core import PluginCore
 from onionchat.core.handler_core import HandlerCore
+from onionchat.utils.history_log import FSYNC_POLICIES, HistoryLog, read_tail
 
 logger = logging.getLogger(__name__)
 
 class SaveHistory(PluginCore):
     """Chat history saving plugin
+    Note: Messages are appended to the log as they are sent or arrive (written behind by a
+    background thread), only the tail of the log is loaded at startup.
 
     Args:
         layer (HandlerCore): Handler instance to save history for
@@ -15,6 +18,11 @@ class SaveHistory(PluginCore):
     Transform args:
         log_file_path (str): Log file path, defaults to .onionchat_logs, named after a timestamp
         reset_history (bool): Whether to reset history on load
+        log_tail_lines (int): Messages loaded from the log at startup
+        log_fsync (str): 'none', 'interval' or 'always'
+        log_fsync_interval (float): Seconds between syncs with 'interval'
+        log_max_bytes (int): Rotate the log beyond this size, 0 never rotates
+        log_backups (int): Rotated logs kept
     """
 
     def __init__(self, layer: HandlerCore) -> None:
@@ -22,15 +30,35 @@ class SaveHistory(PluginCore):
         self.path = None
         self.reset_history = False
         self.encoding = self._layer.chat.encoding
+        self.log_options = {}
 
     wire_affecting: bool = False
 
     @staticmethod
     def get_layer() -> type[HandlerCore]:
         return HandlerCore
-    
-    def transform(self, log_file_path: str | None = cfg.log_file_path, reset_history: bool = cfg.reset_history) -> HandlerCore:
+
+    def transform(
+            self,
+            log_file_path: str | None = cfg.log_file_path,
+            reset_history: bool = cfg.reset_history,
+            log_tail_lines: int = cfg.log_tail_lines,
+            log_fsync: str = cfg.log_fsync,
+            log_fsync_interval: float = cfg.log_fsync_interval,
+            log_max_bytes: int = cfg.log_max_bytes,
+            log_backups: int = cfg.log_backups
+        ) -> HandlerCore:
+
+        if log_fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{log_fsync}', expected one of {FSYNC_POLICIES}")
         self.reset_history = reset_history
+        self.tail_lines = log_tail_lines
+        self.log_options = {
+            "fsync": log_fsync,
+            "fsync_interval": log_fsync_interval,
+            "max_bytes": log_max_bytes,
+            "backups": log_backups
+        }
         if not log_file_path:
             try:
                 self.path = pathlib.Path.home() / cfg.log_dir_name / f"{cfg.log_file_prefix}{self._layer.client_pref}{cfg.log_file_ext}"
@@ -44,11 +72,11 @@ class SaveHistory(PluginCore):
             except (ValueError, OSError) as e:
                 logger.error(f"Invalid log file path: {e}")
                 return self._layer
-            
+
         self.orig_open = self._layer.open
         self._layer.open = self.open_wrapper
         return self._layer
-            
+
     def open_wrapper(self) -> None:
         if not self.path:
             logger.error("Log file path not set. Cannot save chat history.")
@@ -57,24 +85,24 @@ class SaveHistory(PluginCore):
         # Load history
         if not self.reset_history:
             try:
-                if self.path.exists():
-                    with open(self.path, "r", encoding=self.encoding) as log_file:
-                        for line in log_file:
-                            self._layer.history.append(line.rstrip("\n"))
-            except (IOError, OSError, UnicodeDecodeError) as e:
+                self._layer.history.extend(read_tail(self.path, self.tail_lines, self.encoding))
+            except (IOError, OSError) as e:
                 logger.error(f"Failed to load chat history: {e}")
 
-        # Start the handler loop
-        self.orig_open()
+        try:
+            log = HistoryLog(self.path, self.encoding, truncate=self.reset_history, **self.log_options)
+        except (IOError, OSError) as e:
+            logger.error(f"Cannot open chat log, history won't be saved: {e}")
+            self.orig_open()
+            return
 
-        # Save history
+        # Start the handler loop, new messages are logged as they are added
+        self._layer.history.subscribe(log.write)
         try:
-            self.path.parent.mkdir(parents=True, exist_ok=True)
-            with open(self.path, "w", encoding=self.encoding) as log_file:
-                for msg in self._layer.history:
-                    log_file.write(msg + "\n")
-        except (IOError, OSError, UnicodeEncodeError) as e:
-            logger.error(f"Failed to save chat history: {e}")
+            self.orig_open()
+        finally:
+            self._layer.history.unsubscribe(log.write)
+            log.close()
 
     def open(self) -> None:
-        raise NotImplementedError("Use the wrapped layer.open instead.")
\ No newline at end of file
+        raise NotImplementedError("Use the wrapped layer.open instead.")
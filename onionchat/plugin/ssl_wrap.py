@@ -1,23 +1,59 @@
+import os
 import ssl
 import logging
 import socket
+import threading
+import onionchat.config as cfg
 from onionchat.utils.types import EmptySocket
 from onionchat.core.plugin_core import PluginCore
 from onionchat.core.conn_core import ConnectionCore
 
 logger = logging.getLogger(__name__)
 
+# process wide: (role, certfile, keyfile, cafile, capath, pin, ciphers, file mtimes) -> context
+_contexts: dict[tuple, ssl.SSLContext] = {}
+# client side: (peer address, context key) -> last session
+_sessions: dict[tuple, ssl.SSLSession] = {}
+_lock = threading.Lock()
+
+def _store_session(sock: ssl.SSLSocket) -> None:
+    key = getattr(sock, "_session_key", None)
+    if key is None:
+        return
+    try:
+        session = sock.session
+    except (OSError, ValueError):
+        session = None
+    # TLS 1.3 sessions are only resumable once a ticket arrived
+    if session is not None and (session.has_ticket or sock.version() != "TLSv1.3"):
+        with _lock:
+            _sessions.pop(key, None)
+            _sessions[key] = session
+            while len(_sessions) > cfg.session_cache_size:
+                del _sessions[next(iter(_sessions))]
+
 class SSLWrap(PluginCore):
     """SSL/TLS wrapping plugin
+    Note: Contexts are cached per process (keyed by role, files and options, reloaded when a
+    file changes), clients resume the last session with the same peer (abbreviated handshake).
+    The session is cached after the handshake and again on close / shutdown (TLS 1.3 tickets arrive later).
 
     Args:
         layer (ConnectionCore): ConnectionCore instance to wrap with SSL
+
+    Transform args:
+        cafile, capath, certfile, keyfile (str | None): Verification locations and own cert chain
+        tls13_only (bool): Refuse protocol versions below TLS 1.3
+        tls_ciphers (str | None): Allowed ciphers (OpenSSL names), enforced after the handshake for TLS 1.3
+        tls_session_reuse (bool): Resume cached client sessions
     """
 
     def __init__(self, layer: ConnectionCore) -> None:
         super().__init__(layer)
+        self.wrapped: ssl.SSLSocket | None = None
 
     wire_affecting: bool = True
+    encrypts: bool = True
 
     @staticmethod
     def get_layer() -> type[ConnectionCore]:
@@ -29,32 +65,102 @@ class SSLWrap(PluginCore):
             capath: str | None = None,
             certfile: str | None = None,
             keyfile: str | None = None,
+            tls13_only: bool = cfg.tls13_only,
+            tls_ciphers: str | None = cfg.tls_ciphers,
+            tls_session_reuse: bool = cfg.tls_session_reuse
         ) -> ConnectionCore:
 
         sock = self._layer.get_client()
+        server_side = self._layer.is_host
 
-        if self._layer.is_host:
-            
-            ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-            
-        else:
-            ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-
-        if certfile:
-            ctx.load_cert_chain(certfile, keyfile)
-        if cafile or capath:
-            ctx.load_verify_locations(cafile=cafile, capath=capath)
-        ctx.verify_mode = ssl.CERT_REQUIRED
+        ctx, ctx_key = _context(server_side, certfile, keyfile, cafile, capath, tls13_only, tls_ciphers)
+        session_key = None
+        session = None
+        if not server_side and tls_session_reuse:
+            session_key = (self._layer.dest_ip, self._layer.port, ctx_key)
+            with _lock:
+                session = _sessions.get(session_key)
 
         try:
             wrapped = ctx.wrap_socket(
                 sock,
-                server_side=self._layer.is_host,
-                server_hostname=self._layer.dest_ip if not self._layer.is_host else None,
+                server_side=server_side,
+                server_hostname=self._layer.dest_ip if not server_side else None,
+                session=session
             )
         except Exception as e:
             logger.exception("TLS wrap/handshake failed")
             raise
 
+        if tls_ciphers and wrapped.version() == "TLSv1.3" and (c := wrapped.cipher()) and c[0] not in tls_ciphers.split(":"):
+            # TLS 1.3 suites can't be restricted through the ssl module, refuse the result instead
+            wrapped.close()
+            logger.error(f"TLS cipher {c[0]} not in the allowed list")
+            raise ssl.SSLError(f"TLS cipher {c[0]} not allowed")
+
+        if session_key is not None:
+            logger.debug(f"TLS session {'resumed' if wrapped.session_reused else 'established'}")
+            wrapped._session_key = session_key # type: ignore
+            _store_session(wrapped)
+            self.wrapped = wrapped
+            self.orig_close, self.orig_shutdown = wrapped.close, wrapped.shutdown
+            wrapped.close = self.close_wrapper # type: ignore
+            wrapped.shutdown = self.shutdown_wrapper # type: ignore
+
         self._layer.client = wrapped
         return self._layer
+
+    def close_wrapper(self) -> None:
+        _store_session(self.wrapped) # type: ignore
+        self.orig_close()
+
+    def shutdown_wrapper(self, how: int) -> None:
+        _store_session(self.wrapped) # type: ignore
+        self.orig_shutdown(how)
+
+def _context(
+    server_side: bool,
+    certfile: str | None,
+    keyfile: str | None,
+    cafile: str | None,
+    capath: str | None,
+    tls13_only: bool,
+    ciphers: str | None
+) -> tuple[ssl.SSLContext, tuple]:
+    """Cached context for the role, files and options. Server contexts keep their ticket keys,
+    which is what lets clients resume."""
+    mtimes = tuple(_mtime(p) for p in (certfile, keyfile, cafile, capath))
+    key = (server_side, certfile, keyfile, cafile, capath, tls13_only, ciphers, mtimes)
+    with _lock:
+        ctx = _contexts.get(key)
+        if ctx is not None:
+            return ctx, key
+
+        ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER if server_side else ssl.PROTOCOL_TLS_CLIENT)
+        if certfile:
+            ctx.load_cert_chain(certfile, keyfile)
+        if cafile or capath:
+            ctx.load_verify_locations(cafile=cafile, capath=capath)
+        ctx.verify_mode = ssl.CERT_REQUIRED
+        if tls13_only:
+            ctx.minimum_version = ssl.TLSVersion.TLSv1_3
+        if ciphers:
+            try:
+                # TLS 1.2 and below
+                ctx.set_ciphers(ciphers)
+            except ssl.SSLError:
+                if not tls13_only:
+                    raise
+        # drop contexts of replaced files
+        for old in [k for k in _contexts if k[:7] == key[:7]]:
+            del _contexts[old]
+        _contexts[key] = ctx
+        return ctx, key
+
+def _mtime(path: str | None) -> float | None:
+    if not path:
+        return None
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
@@ -1,79 +1,268 @@
+from typing import Callable, Dict, List
+import os
+import onionchat.config as cfg
 from onionchat.core.plugin_core import PluginCore
 from onionchat.core.conn_core import ConnectionCore
-from onionchat.utils.funcs import recv_exact
+from onionchat.utils.funcs import recv_exact, arecv_exact
+from onionchat.utils.cipher_suites import SUITES, choose_suite, decode_prefs, encode_prefs, suite_preferences
+from onionchat.utils.session_cache import TICKET_ID_SIZE, SECRET_SIZE, session_cache
+from onionchat.utils.key_pool import key_pool
+from onionchat.utils import module_sign as ms
 
 from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
 from cryptography.hazmat.primitives.kdf.hkdf import HKDF
-from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives import hashes
 import logging
 
 logger = logging.getLogger(__name__)
 
+class _Hello:
+    """One side's handshake message: mode byte (with session resumption) + 32-byte body + preferences.
+    Full: body is the public key. Resume: body is ticket id + fresh nonce."""
+    FULL, RESUME = 0, 1
+
+    def __init__(self, mode: int, body: bytes, prefs: bytes) -> None:
+        self.mode = mode
+        self.body = body
+        self.prefs = prefs
+        self.priv: X25519PrivateKey | None = None
+        self.secret: bytes | None = None
+
+    @classmethod
+    def full(cls, prefs: bytes) -> "_Hello":
+        priv, pub = X25519._keypair()
+        hello = cls(cls.FULL, pub, prefs)
+        hello.priv = priv
+        return hello
+
+    @classmethod
+    def resume(cls, ticket: tuple[bytes, bytes], prefs: bytes) -> "_Hello":
+        tid, secret = ticket
+        hello = cls(cls.RESUME, tid + os.urandom(32 - TICKET_ID_SIZE), prefs)
+        hello.secret = secret
+        return hello
+
+    def wire(self, resumption: bool) -> bytes:
+        return (bytes([self.mode]) if resumption else b"") + self.body + self.prefs
+
 class X25519(PluginCore):
     """Ephemeral key exchange (X25519)
-    
+    Note: Also negotiates the aead cipher suite, both sides send a preference list
+    (fastest first, see suite_preferences) with their public key. The choice is bound into the keys.
+    Note: With a pending module-sign manifest on the layer (combined handshake) it is sent in the
+    same message, setup takes one round trip. The peer's manifest is verified before key derivation.
+    Note: With session resumption every session leaves a single-use ticket in the session cache
+    (keyed by peer address and manifest digest). When both peers offer the same ticket the keys
+    are derived from its secret and fresh nonces, without a key exchange. Resumed sessions are
+    only as forward secret as the cached ticket. Otherwise the full exchange follows (one more
+    round trip for a side that offered a ticket).
+
     Args:
         layer (ConnectionCore): The connection layer to transform.
+
+    Transform args:
+        aead_cipher (str): 'auto' or a fixed cipher suite name
+        session_resumption (bool): Offer and issue session tickets (peers must agree)
     """
 
     def __init__(self, layer: ConnectionCore) -> None:
         super().__init__(layer)
 
     wire_affecting: bool = True
+    carries_manifest: bool = True
 
     @staticmethod
     def get_layer() -> type[ConnectionCore]:
         return ConnectionCore
 
-    def transform(self) -> ConnectionCore:
+    @staticmethod
+    def prepare() -> None:
+        """Called once the pipeline is chosen, before connecting: start generating keypairs."""
+        key_pool().start()
+
+    @staticmethod
+    def wire_options(args: Dict) -> Dict:
+        """Options the peer must agree on, added to the module-sign manifest."""
+        # public key is followed by a cipher suite preference list
+        options = {"cipher_negotiation": True}
+        # hellos start with a mode byte
+        if args.get("session_resumption", cfg.session_resumption):
+            options["session_resumption"] = True
+        return options
+
+    def transform(self, aead_cipher: str = cfg.aead_cipher, session_resumption: bool = cfg.session_resumption) -> ConnectionCore:
         try:
             sock = self._layer.get_client()
         except ValueError as e:
             logger.error("Connection not established before X25519 transform")
             raise
 
-        # generate ephemeral keypair
-        priv = X25519PrivateKey.generate()
-        pub = priv.public_key().public_bytes(
-            encoding=serialization.Encoding.Raw,
-            format=serialization.PublicFormat.Raw
-        )  # 32 bytes
+        prefs = encode_prefs(self._preferences(aead_cipher))
+        manifest = self._pending_manifest()
+        ticket = session_cache().take(self._peer_id()) if session_resumption else None
+        hello = _Hello.resume(ticket, prefs) if ticket else _Hello.full(prefs)
 
         try:
-            sock.sendall(pub)
+            sock.sendall((ms.manifest_frame(manifest[0]) if manifest else b"") + hello.wire(session_resumption))
         except Exception as e:
             logger.error(f"Failed to send public key: {e}")
             raise
 
-        peer_pub = recv_exact(sock, 32)
-        if not peer_pub or len(peer_pub) != 32:
+        if manifest:
+            manifest[1](ms.read_manifest(sock))
+        peer = self._read_hello(lambda n: recv_exact(sock, n), session_resumption)
+
+        if not self._resumable(hello, peer):
+            if hello.mode == _Hello.RESUME:
+                hello = _Hello.full(prefs)
+                sock.sendall(hello.wire(session_resumption))
+            if peer.mode == _Hello.RESUME:
+                peer = self._read_hello(lambda n: recv_exact(sock, n), session_resumption)
+        self._set_keys(hello, peer, session_resumption)
+        return self._layer
+
+    async def atransform(self, aead_cipher: str = cfg.aead_cipher, session_resumption: bool = cfg.session_resumption) -> ConnectionCore:
+        """Asyncio variant of transform, for AsyncConnectionCore layers."""
+        try:
+            reader, writer = self._layer.get_streams() # type: ignore
+        except (ValueError, AttributeError) as e:
+            logger.error("Async connection not established before X25519 transform")
+            raise ValueError("Async connection not established before X25519 transform") from e
+
+        prefs = encode_prefs(self._preferences(aead_cipher))
+        manifest = self._pending_manifest()
+        ticket = session_cache().take(self._peer_id()) if session_resumption else None
+        hello = _Hello.resume(ticket, prefs) if ticket else _Hello.full(prefs)
+
+        try:
+            writer.write((ms.manifest_frame(manifest[0]) if manifest else b"") + hello.wire(session_resumption))
+            await writer.drain()
+        except Exception as e:
+            logger.error(f"Failed to send public key: {e}")
+            raise
+
+        if manifest:
+            manifest[1](await ms.aread_manifest(reader))
+        peer = await self._aread_hello(reader, session_resumption)
+
+        if not self._resumable(hello, peer):
+            if hello.mode == _Hello.RESUME:
+                hello = _Hello.full(prefs)
+                writer.write(hello.wire(session_resumption))
+                await writer.drain()
+            if peer.mode == _Hello.RESUME:
+                peer = await self._aread_hello(reader, session_resumption)
+        self._set_keys(hello, peer, session_resumption)
+        return self._layer
+
+    def _pending_manifest(self) -> tuple | None:
+        """(serialized manifest, check) left on the layer by PipelineBuilder, consumed once."""
+        manifest = getattr(self._layer, "handshake_manifest", None)
+        if manifest is not None:
+            del self._layer.handshake_manifest
+        return manifest
+
+    def _peer_id(self) -> str:
+        """Session cache key: peer address + digest of the agreed module set."""
+        digest = getattr(self._layer, "manifest_digest", b"")
+        return f"{self._layer.dest_ip}:{self._layer.port}|{digest.hex()}"
+
+    @staticmethod
+    def _read_hello(recv: Callable[[int], bytes], resumption: bool) -> _Hello:
+        mode = recv(1) if resumption else bytes([_Hello.FULL])
+        body = recv(32) if mode else b""
+        count = recv(1) if body else b""
+        return X25519._parse_hello(mode, body, count + recv(count[0]) if count else b"")
+
+    @staticmethod
+    async def _aread_hello(reader, resumption: bool) -> _Hello:
+        mode = await arecv_exact(reader, 1) if resumption else bytes([_Hello.FULL])
+        body = await arecv_exact(reader, 32) if mode else b""
+        count = await arecv_exact(reader, 1) if body else b""
+        return X25519._parse_hello(mode, body, count + await arecv_exact(reader, count[0]) if count else b"")
+
+    @staticmethod
+    def _parse_hello(mode: bytes, body: bytes, prefs: bytes) -> _Hello:
+        if not mode or mode[0] not in (_Hello.FULL, _Hello.RESUME) or len(body) != 32:
             logger.error("Failed to receive peer public key")
             raise ConnectionError("Invalid peer public key")
+        if not prefs:
+            logger.error("Failed to receive peer cipher suites")
+            raise ConnectionError("Invalid peer cipher suites")
+        return _Hello(mode[0], body, prefs)
+
+    @staticmethod
+    def _resumable(hello: _Hello, peer: _Hello) -> bool:
+        return (
+            hello.mode == peer.mode == _Hello.RESUME
+            and hello.body[:TICKET_ID_SIZE] == peer.body[:TICKET_ID_SIZE]
+        )
 
+    @staticmethod
+    def _preferences(aead_cipher: str) -> List[str]:
+        if aead_cipher == "auto":
+            return suite_preferences()
+        if aead_cipher not in SUITES:
+            raise ValueError(f"Unknown cipher suite '{aead_cipher}', expected 'auto' or one of {list(SUITES)}")
+        return [aead_cipher]
+
+    @staticmethod
+    def _keypair() -> tuple[X25519PrivateKey, bytes]:
+        # ephemeral keypair, pregenerated off the connection path (single use)
+        return key_pool().take()
+
+    def _set_keys(self, hello: _Hello, peer: _Hello, resumption: bool) -> None:
+        if hello.body == peer.body:
+            logger.error("Peer echoed our handshake")
+            raise ConnectionError("Invalid peer public key")
+
+        # same order on both sides: preferences of the larger public key (nonce when resuming) first
+        larger = hello.body > peer.body
+        first, second = (hello, peer) if larger else (peer, hello)
         try:
-            peer_pub_obj = X25519PublicKey.from_public_bytes(peer_pub)
-            shared = priv.exchange(peer_pub_obj)  # 32 bytes shared secret
-        except Exception as e:
-            logger.error(f"X25519 exchange failed: {e}")
+            suite = choose_suite(decode_prefs(first.prefs[1:]), decode_prefs(second.prefs[1:]))
+        except ConnectionError as e:
+            logger.error(str(e))
             raise
 
+        # binds the negotiated suite, a tampered or mismatched choice yields different keys
+        transcript = suite.encode() + b"|" + first.prefs + b"|" + second.prefs
+        if hello.mode == _Hello.RESUME:
+            ikm = hello.secret
+            transcript += b"|" + first.body + b"|" + second.body
+            label = b"onionchat resume|"
+            logger.info(f"Session resumed, cipher suite: {suite}")
+        else:
+            try:
+                peer_pub_obj = X25519PublicKey.from_public_bytes(peer.body)
+                ikm = hello.priv.exchange(peer_pub_obj)  # type: ignore # 32 bytes shared secret
+            except Exception as e:
+                logger.error(f"X25519 exchange failed: {e}")
+                raise
+            label = b"onionchat x25519 handshake|"
+            logger.info(f"Cipher suite: {suite}")
+
         # derive two 32-byte keys (send / recv) deterministically
-        hkdf = HKDF(
-            algorithm=hashes.SHA256(),
-            length=64,
-            salt=None,
-            info=b"onionchat x25519 handshake"
-        )
-        key_material = hkdf.derive(shared)
+        hkdf = HKDF(algorithm=hashes.SHA256(), length=64, salt=None, info=label + transcript)
+        key_material = hkdf.derive(ikm) # type: ignore
         key_a = key_material[:32]
         key_b = key_material[32:]
 
-        if pub > peer_pub:
+        if larger:
             send_key, recv_key = key_a, key_b
         else:
             send_key, recv_key = key_b, key_a
 
         self._layer.send_key = send_key
         self._layer.recv_key = recv_key
+        self._layer.cipher = suite
 
-        return self._layer
\ No newline at end of file
+        if resumption:
+            # next session's ticket, both peers derive the same one
+            ticket = HKDF(
+                algorithm=hashes.SHA256(),
+                length=TICKET_ID_SIZE + SECRET_SIZE,
+                salt=None,
+                info=b"onionchat resumption|" + transcript
+            ).derive(ikm) # type: ignore
+            session_cache().put(self._peer_id(), ticket[:TICKET_ID_SIZE], ticket[TICKET_ID_SIZE:])
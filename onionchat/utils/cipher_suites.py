@@ -0,0 +1,86 @@
+from typing import Dict, List
+from pathlib import Path
+from time import perf_counter
+import os
+import json
+import logging
+import platform
+import cryptography
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+# at import time: imported lazily it races the key pool's thread for the import locks
+from cryptography.hazmat.backends.openssl import backend
+import onionchat.config as cfg
+
+logger = logging.getLogger(__name__)
+
+# name -> (wire id, AEAD class), every suite takes a 32-byte key, 12-byte nonce and has a 16-byte tag
+SUITES = {
+    "chacha20-poly1305": (1, ChaCha20Poly1305),
+    "aes-256-gcm": (2, AESGCM),
+}
+DEFAULT_SUITE = "chacha20-poly1305"
+
+_BY_ID = {sid: name for name, (sid, _) in SUITES.items()}
+
+def suite_cls(name: str) -> type:
+    if name not in SUITES:
+        raise ValueError(f"Unknown cipher suite '{name}', expected one of {list(SUITES)}")
+    return SUITES[name][1]
+
+def encode_prefs(names: List[str]) -> bytes:
+    """Wire form of a preference list: count byte + suite ids."""
+    return bytes([len(names), *(SUITES[n][0] for n in names)])
+
+def decode_prefs(ids: bytes) -> List[str]:
+    """Known suites of a peer's id list (count byte stripped), unknown ids are skipped."""
+    return [_BY_ID[i] for i in ids if i in _BY_ID]
+
+def choose_suite(first: List[str], second: List[str]) -> str:
+    """Fastest suite both sides support: lowest combined rank, ties go to 'first'.
+    Both peers must pass the lists in the same order (see X25519)."""
+    common = [n for n in first if n in second]
+    if not common:
+        raise ConnectionError(f"No common cipher suite ({first} / {second})")
+    return min(common, key=lambda n: (first.index(n) + second.index(n), first.index(n)))
+
+def benchmark_suites(names: List[str], size: int = cfg.aead_bench_size, rounds: int = cfg.aead_bench_rounds) -> Dict[str, float]:
+    """Encrypt+decrypt throughput (MB/s) of each suite on this machine, unusable suites are left out."""
+    data = os.urandom(size)
+    nonce = bytes(12)
+    results = {}
+    for name in names:
+        try:
+            aead = suite_cls(name)(os.urandom(32))
+            aead.decrypt(nonce, aead.encrypt(nonce, data, None), None)  # warm up
+            t0 = perf_counter()
+            for _ in range(rounds):
+                aead.decrypt(nonce, aead.encrypt(nonce, data, None), None)
+            results[name] = size * rounds / (perf_counter() - t0) / 1e6
+        except Exception as e:
+            logger.debug(f"Cipher suite {name} unavailable: {e}")
+    return results
+
+def suite_preferences(allowed: List[str] | None = None, cache_path: str | None = cfg.aead_bench_cache) -> List[str]:
+    """Allowed suites ordered fastest first. The benchmark runs once per machine and
+    library version, results are cached on disk (~/<cache_dir_name>/aead_bench.json by default)."""
+    allowed = list(allowed or SUITES)
+    path = Path(cache_path).expanduser() if cache_path else Path.home() / cfg.cache_dir_name / "aead_bench.json"
+    key = f"{platform.machine()}|{cryptography.__version__}|{backend.openssl_version_text()}"
+
+    try:
+        cache = json.loads(path.read_text())
+    except (OSError, ValueError):
+        cache = {}
+    speeds = cache.get(key)
+    if not isinstance(speeds, dict) or not set(allowed) <= speeds.keys():
+        speeds = {**(speeds if isinstance(speeds, dict) else {}), **benchmark_suites(allowed)}
+        # unusable suites are cached as 0, so they are not benchmarked again
+        speeds.update({n: 0.0 for n in allowed if n not in speeds})
+        logger.debug(f"Cipher suite benchmark: {speeds}")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps({key: speeds}))
+        except OSError as e:
+            logger.debug(f"Cannot cache cipher suite benchmark: {e}")
+
+    return sorted((n for n in allowed if speeds.get(n, 0) > 0), key=lambda n: -speeds[n])
@@ -0,0 +1,204 @@
+from typing import Callable, Dict
+import sys
+import socket
+import logging
+import selectors
+import threading
+from onionchat.utils.types import TerminateConnection, EmptyMessage
+from onionchat.core.chat_core import ChatCore
+from onionchat.utils.framing import RecordSocket
+
+logger = logging.getLogger(__name__)
+
+class _Entry:
+    def __init__(self, chat: ChatCore, on_msg: Callable[[Dict], None], on_close: Callable[[], None] | None) -> None:
+        self.chat = chat
+        self.sock = chat.sock
+        self.on_msg = on_msg
+        self.on_close = on_close
+
+class RecvDispatcher:
+    """Delivers received messages of many ChatCore instances to callbacks from one thread.
+
+    A selector waits on every registered chat socket, so idle sessions cost no wakeups.
+    Registration changes and stop go through a self-pipe, they take effect immediately.
+    Callbacks run on the dispatcher thread, on_close once the peer is gone or its
+    messages fail to decode (only that session is dropped).
+    Register a chat again after ChatCore.reattach, its socket changes.
+    Note: Reads never wait for the rest of a record of the encryption / compression
+    wrappers (RecordSocket.poll_into). A TLS socket does wait for a whole TLS record
+    (up to recv_timeout), give those their own dispatcher, see dispatcher_for.
+    """
+
+    def __init__(self) -> None:
+        self._sel = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._sel.register(self._wake_r, selectors.EVENT_READ)
+
+        self._entries: Dict[ChatCore, _Entry] = {}
+        self._changes: list[tuple[Callable[[], None], threading.Event]] = []
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._running = False
+
+    def register(
+        self,
+        chat: ChatCore,
+        on_msg: Callable[[Dict], None],
+        on_close: Callable[[], None] | None = None
+    ) -> None:
+        """Deliver messages of 'chat' to on_msg, starts the dispatcher thread if needed."""
+        if not hasattr(chat, "frame_reader"):
+            raise ValueError(f"{type(chat).__name__} is not a blocking-socket chat, use arecv_msg")
+        entry = _Entry(chat, on_msg, on_close)
+
+        def add() -> None:
+            if (old := self._entries.pop(chat, None)) is not None:
+                self._sel.unregister(old.sock)
+            self._entries[chat] = entry
+            self._sel.register(entry.sock, selectors.EVENT_READ, entry)
+            # data read before registering is invisible to the selector
+            if chat.recv_buffered():
+                self._service(entry)
+
+        self._change(add)
+        self.start()
+
+    def unregister(self, chat: ChatCore) -> None:
+        """Stop delivering messages of 'chat', no callback runs for it after this returns."""
+        def remove() -> None:
+            if (entry := self._entries.pop(chat, None)) is not None:
+                self._sel.unregister(entry.sock)
+
+        self._change(remove)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._running = True
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the dispatcher thread, registered chats stay open."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._running = False
+        self._wake()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _change(self, fn: Callable[[], None]) -> None:
+        """Apply a selector change on the dispatcher thread (selectors are not thread safe)."""
+        if threading.current_thread() is self._thread:
+            fn()
+            return
+        done = threading.Event()
+        with self._lock:
+            if self._thread is None:
+                # not running, nothing selects concurrently
+                fn()
+                return
+            self._changes.append((fn, done))
+        self._wake()
+        done.wait()
+
+    def _wake(self) -> None:
+        try:
+            self._wake_w.send(b"\x00")
+        except BlockingIOError:
+            # pipe full, a wakeup is already pending
+            pass
+
+    def _run(self) -> None:
+        while self._running:
+            for key, _ in self._sel.select():
+                if key.data is None:
+                    self._drain_wakeups()
+                elif self._entries.get(key.data.chat) is key.data:
+                    self._service(key.data)
+        self._apply_changes()
+
+    def _drain_wakeups(self) -> None:
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        self._apply_changes()
+
+    def _apply_changes(self) -> None:
+        with self._lock:
+            changes, self._changes = self._changes, []
+        for fn, done in changes:
+            try:
+                fn()
+            except (KeyError, ValueError, OSError) as e:
+                logger.error(f"Dispatcher registration failed: {e}")
+            finally:
+                done.set()
+
+    def _service(self, entry: _Entry) -> None:
+        """Deliver every message readable without blocking, a failing session is closed."""
+        try:
+            self._deliver(entry)
+        except Exception:
+            logger.exception(f"Receiving from {type(entry.chat).__name__} failed, closing the session")
+            self._drop(entry)
+
+    def _drop(self, entry: _Entry) -> None:
+        if self._entries.get(entry.chat) is not entry:
+            return
+        del self._entries[entry.chat]
+        try:
+            self._sel.unregister(entry.sock)
+        except (KeyError, ValueError):
+            pass
+        if entry.on_close is not None:
+            self._callback(entry.on_close)
+
+    def _deliver(self, entry: _Entry) -> None:
+        while True:
+            msg = entry.chat.poll_msg()
+            if isinstance(msg, TerminateConnection):
+                self._drop(entry)
+                return
+            if not isinstance(msg, EmptyMessage):
+                self._callback(entry.on_msg, msg)
+                if self._entries.get(entry.chat) is not entry:
+                    # unregistered by its callback
+                    return
+            if not entry.chat.recv_buffered():
+                return
+
+    @staticmethod
+    def _callback(fn: Callable, *args) -> None:
+        try:
+            fn(*args)
+        except Exception:
+            logger.exception("Receive callback failed")
+
+_shared: RecvDispatcher | None = None
+_shared_lock = threading.Lock()
+
+def shared_dispatcher() -> RecvDispatcher:
+    """Process wide dispatcher, handlers register their chats here."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = RecvDispatcher()
+        return _shared
+
+def dispatcher_for(chat: ChatCore) -> RecvDispatcher:
+    """The shared dispatcher, or a new one for a chat whose reads may wait mid-record (TLS),
+    so it can't stall the other sessions. Stop a dedicated one when done with it."""
+    sock = chat.sock
+    while isinstance(sock, RecordSocket):
+        sock = sock._sock
+    # without the ssl module loaded there are no TLS sockets
+    ssl = sys.modules.get("ssl")
+    if ssl is not None and isinstance(sock, ssl.SSLSocket):
+        return RecvDispatcher()
+    return shared_dispatcher()
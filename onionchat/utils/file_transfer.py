@@ -0,0 +1,153 @@
+from typing import Callable, Dict, Optional
+from pathlib import Path
+import os
+import struct
+import logging
+import onionchat.config as cfg
+
+logger = logging.getLogger(__name__)
+
+# file chunk frame header: transfer id, offset
+CHUNK_HEADER = struct.Struct("!IQ")
+
+class Transfer:
+    """State of one incoming file.
+
+    Args:
+        tid (int): Sender assigned transfer id
+        name (str): Sanitized file name
+        size (int): Total file size
+        path (Path): Final destination, data is written to '<path>.part' until complete
+    """
+
+    def __init__(self, tid: int, name: str, size: int, path: Path) -> None:
+        self.tid = tid
+        self.name = name
+        self.size = size
+        self.path = path
+        self.part = path.with_name(path.name + ".part")
+        self.received = 0
+        self.reported = 0  # progress steps reported so far
+        self.file = None
+
+    @property
+    def progress(self) -> float:
+        return self.received / self.size if self.size else 1.0
+
+class FileReceiver:
+    """Writes incoming file chunks straight to disk.
+    Incomplete files stay as '<name>.part', a later offer asking to resume continues them
+    from the data already received (see resume_offset, the offset goes back to the sender).
+    Note: Receiving is off unless 'accept' is set, offers are then refused (ValueError).
+    Offers above 'max_size' are refused, chunks may only land inside the announced size.
+
+    Args:
+        recv_dir (str | None): Directory for received files, defaults to ~/<file_dir_name>
+        accept (bool): Accept incoming files
+        max_size (int): Largest accepted file in bytes
+        progress (Callable | None): Called with the Transfer after every written chunk
+    """
+
+    def __init__(
+        self,
+        recv_dir: Optional[str] = cfg.file_recv_dir,
+        accept: bool = cfg.file_accept,
+        max_size: int = cfg.file_max_size,
+        progress: Callable[[Transfer], None] | None = None
+    ) -> None:
+        self.dir = Path(recv_dir).expanduser() if recv_dir else Path.home() / cfg.file_dir_name
+        self.accept = accept
+        self.max_size = max_size
+        self.progress = progress
+        self.transfers: Dict[int, Transfer] = {}
+
+    def resume_offset(self, name: str) -> int:
+        """Bytes already on disk for an incomplete file."""
+        part = self.dir / (self._sanitize(name) + ".part")
+        return part.stat().st_size if part.exists() else 0
+
+    def offer(self, meta: Dict) -> Transfer:
+        """Start receiving an offered file, from the resume offset if the sender asks to resume."""
+        tid, size = self._int(meta, "id"), self._int(meta, "size")
+        name, resume = meta.get("name"), meta.get("resume", False)
+        if not isinstance(name, str):
+            raise ValueError("Invalid file offer: 'name' must be a string")
+        if not isinstance(resume, bool):
+            raise ValueError("Invalid file offer: 'resume' must be a boolean")
+        name = self._sanitize(name)
+        if not self.accept:
+            raise ValueError(f"Refused file '{name}', receiving files is disabled (file_accept)")
+        if size > self.max_size:
+            raise ValueError(f"Refused file '{name}', {size} bytes is above the limit of {self.max_size}")
+
+        t = Transfer(tid, name, size, self.dir / name)
+        offset = min(self.resume_offset(name), size) if resume else 0
+
+        self.dir.mkdir(parents=True, exist_ok=True)
+        if (old := self.transfers.pop(tid, None)) is not None and old.file is not None:
+            old.file.close()
+        t.file = open(t.part, "r+b" if offset else "wb")
+        t.file.truncate(offset)
+        t.file.seek(offset)
+        t.received = offset
+        self.transfers[tid] = t
+        return t
+
+    def chunk(self, frame: memoryview) -> Transfer | None:
+        """Write a chunk frame body (CHUNK_HEADER + data) at its offset, None if unknown."""
+        if len(frame) < CHUNK_HEADER.size:
+            raise ValueError(f"Truncated file chunk ({len(frame)} bytes)")
+        tid, offset = CHUNK_HEADER.unpack_from(frame)
+        t = self.transfers.get(tid)
+        if t is None or t.file is None:
+            return None
+        if offset + len(frame) - CHUNK_HEADER.size > t.size:
+            raise ValueError(f"File chunk for '{t.name}' outside the announced {t.size} bytes")
+        if t.file.tell() != offset:
+            t.file.seek(offset)
+        t.received = offset + t.file.write(frame[CHUNK_HEADER.size:])
+        if self.progress:
+            self.progress(t)
+        return t
+
+    def end(self, meta: Dict) -> Transfer | None:
+        """Close a transfer, complete files are moved to their final name."""
+        t = self.transfers.pop(self._int(meta, "id"), None)
+        if t is None or t.file is None:
+            return None
+        t.file.close()
+        t.file = None
+        if t.received >= t.size:
+            t.path = self._free_path(t.path)
+            os.replace(t.part, t.path)
+        return t
+
+    def close(self) -> None:
+        """Close files of unfinished transfers, they stay on disk for resume."""
+        for t in self.transfers.values():
+            if t.file is not None:
+                t.file.close()
+        self.transfers.clear()
+
+    @staticmethod
+    def _int(meta: Dict, key: str, default: int | None = None) -> int:
+        """Non-negative integer field of a peer supplied offer / end frame."""
+        if not isinstance(meta, dict):
+            raise ValueError("Invalid file transfer metadata, expected an object")
+        val = meta.get(key, default)
+        if not isinstance(val, int) or isinstance(val, bool) or val < 0:
+            raise ValueError(f"Invalid file transfer metadata: '{key}' must be a non-negative integer")
+        return val
+
+    @staticmethod
+    def _sanitize(name: str) -> str:
+        name = os.path.basename(name.replace("\\", "/")).strip()
+        return name if name not in ("", ".", "..") else "unnamed"
+
+    @staticmethod
+    def _free_path(path: Path) -> Path:
+        candidate, i = path, 1
+        while candidate.exists():
+            candidate = path.with_name(f"{path.stem} ({i}){path.suffix}")
+            i += 1
+        return candidate
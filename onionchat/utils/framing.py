@@ -0,0 +1,375 @@
+from typing import Literal
+from time import monotonic
+import os
+import socket
+import threading
+import onionchat.config as cfg
+
+try:
+    _IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (AttributeError, ValueError, OSError):
+    _IOV_MAX = 1024
+
+def frame_header(length: int) -> bytes:
+    """Length prefix of a chat frame."""
+    return length.to_bytes(cfg.frame_len_bytes, cfg.byteorder)
+
+def send_buffers(sock, buffers: list) -> None:
+    """Write all buffers in order. Plain sockets get scatter/gather sendmsg without joining,
+    record wrappers (encryption, compression) their own send_buffers, others (TLS) a single
+    sendall of the joined data."""
+    if type(sock) is not socket.socket:
+        if isinstance(sock, RecordSocket):
+            sock.send_buffers(buffers)
+        else:
+            sock.sendall(buffers[0] if len(buffers) == 1 else b"".join(buffers))
+        return
+
+    views = [memoryview(b) for b in buffers if len(b)]
+    i = 0
+    while i < len(views):
+        sent = sock.sendmsg(views[i:i + _IOV_MAX])
+        # skip fully written buffers, keep the unsent tail of a partially written one
+        while i < len(views) and sent >= len(views[i]):
+            sent -= len(views[i])
+            i += 1
+        if sent:
+            views[i] = views[i][sent:]
+
+class FrameReader:
+    """Buffered reader of length-prefixed frames over a socket-like object (recv_into).
+
+    Frames are returned as memoryview slices of one preallocated buffer and stay valid
+    until the next read. A partial frame survives socket timeouts, the next call resumes it.
+
+    Args:
+        sock: Socket-like object providing recv_into
+        buf_size (int): Initial buffer capacity, grows to fit the largest frame seen
+        len_bytes (int): Length prefix size
+        byteorder (str): Length prefix byte order
+        greedy (bool): Read as much as available per syscall. Disable when another reader
+            takes over the socket afterwards (handshakes), so no bytes past the frame are consumed.
+    """
+
+    def __init__(
+        self,
+        sock,
+        buf_size: int = cfg.recv_buf,
+        len_bytes: int = cfg.frame_len_bytes,
+        byteorder: Literal['little', 'big'] = cfg.byteorder,
+        greedy: bool = True
+    ) -> None:
+        self._sock = sock
+        self._buf = bytearray(max(buf_size, len_bytes))
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+        self._need = len_bytes
+        self.len_bytes = len_bytes
+        self.byteorder: Literal['little', 'big'] = byteorder
+        self.greedy = greedy
+
+    def pending(self) -> int:
+        """Number of buffered, not yet returned bytes."""
+        return self._end - self._start
+
+    def read_frame(self) -> memoryview | None:
+        """Block until a full frame is buffered and return its body, None on EOF."""
+        while (frame := self.next_frame()) is None:
+            if not self.feed():
+                return None
+        return frame
+
+    def poll_frame(self) -> memoryview | None:
+        """Return the next frame with at most one read, None if still incomplete.
+        Meant for readable sockets (selectors), raises ConnectionError on EOF.
+        Record wrappers below are polled too (see RecordSocket.poll_into)."""
+        if (frame := self.next_frame()) is None:
+            if not self.feed(poll=True):
+                raise ConnectionError("Connection closed by peer")
+            frame = self.next_frame()
+        return frame
+
+    def has_frame(self) -> bool:
+        """Whether a complete frame is buffered."""
+        start, lb = self._start, self.len_bytes
+        avail = self._end - start
+        return avail >= lb and avail - lb >= int.from_bytes(self._view[start:start + lb], self.byteorder)
+
+    def read_exact(self, n: int) -> memoryview | None:
+        """Block until n raw (unframed) bytes are buffered and return them, None on EOF."""
+        self._reserve(n)
+        while self._end - self._start < n:
+            if not self.feed():
+                return None
+        data = self._view[self._start:self._start + n]
+        self._start += n
+        return data
+
+    def next_frame(self) -> memoryview | None:
+        """Return the next buffered frame without any I/O, None if incomplete."""
+        start, lb = self._start, self.len_bytes
+        avail = self._end - start
+        if avail < lb:
+            self._reserve(lb)
+            return None
+
+        length = int.from_bytes(self._view[start:start + lb], self.byteorder)
+        if length > cfg.max_frame_size:
+            raise ConnectionError(f"Frame too large ({length} bytes)")
+        if avail < lb + length:
+            self._reserve(lb + length)
+            return None
+
+        self._start = start + lb + length
+        self._need = lb
+        return self._view[start + lb:self._start]
+
+    def feed(self, poll: bool = False) -> bool:
+        """Single recv_into into the free buffer tail. Returns False on EOF.
+        With 'poll', record wrappers raise BlockingIOError instead of waiting for a whole record."""
+        want = len(self._buf) - self._end
+        if not self.greedy:
+            want = min(want, self._start + self._need - self._end)
+        recv = self._sock.poll_into if poll and isinstance(self._sock, RecordSocket) else self._sock.recv_into
+        n = recv(self._view[self._end:self._end + want], want)
+        if not n:
+            return False
+        self._end += n
+        return True
+
+    def _reserve(self, need: int) -> None:
+        """Make room for 'need' bytes from the current frame start."""
+        self._need = need
+        if self._start == self._end:
+            self._start = self._end = 0
+        if self._start + need <= len(self._buf):
+            return
+
+        avail = self._end - self._start
+        if need <= len(self._buf):
+            # compact in place (same size, allowed while frames are exported), copy only on overlap
+            tail = self._view[self._start:self._end]
+            self._buf[:avail] = tail if avail <= self._start else bytes(tail)
+        else:
+            # never resize in place, returned frames may still reference the old buffer
+            buf = bytearray(max(need, 2 * len(self._buf)))
+            buf[:avail] = self._view[self._start:self._end]
+            self._buf, self._view = buf, memoryview(buf)
+        self._start, self._end = 0, avail
+
+class RecordSocket:
+    """Base of socket wrappers that exchange whole records (encryption, compression).
+    Subclasses read records with a FrameReader ('_frames') and implement _unwrap, recv/recv_into
+    expose the records as a byte stream so a FrameReader can run on top, poll_into does the same
+    without ever waiting for the rest of a record. Other attributes pass through to the wrapped socket.
+
+    Args:
+        sock: Wrapped socket-like object
+    """
+
+    encrypted: bool = False  # records leave sealed (their length stays visible)
+
+    def __init__(self, sock) -> None:
+        self._sock = sock
+        self._pt = memoryview(b"")
+
+    def read_record(self) -> bytes | memoryview:
+        """Read and unwrap the next record, empty on EOF or failure.
+        May return a view of a reused buffer, valid until the next call."""
+        record = self._next_record()
+        return self._unwrap(record) if record else b""
+
+    def _next_record(self) -> bytes | memoryview | None:
+        return self._frames.read_frame()
+
+    def _poll_record(self) -> bytes | memoryview | None:
+        """Next wrapped record with at most one read below, None on EOF.
+        Raises BlockingIOError while it is incomplete (the partial record stays buffered)."""
+        if (record := self._frames.next_frame()) is None:
+            if not self._frames.feed(poll=True):
+                return None
+            if (record := self._frames.next_frame()) is None:
+                raise BlockingIOError("Partial record")
+        return record
+
+    def _unwrap(self, record) -> bytes | memoryview:
+        """Payload of a wrapped record, empty on failure."""
+        raise NotImplementedError
+
+    def send_buffers(self, buffers: list) -> None:
+        """Wrap and send 'buffers' in order, as one record by default."""
+        self.sendall(buffers[0] if len(buffers) == 1 else b"".join(buffers))
+
+    def recv(self, bufsize: int = cfg.recv_buf) -> bytes:
+        """Return the rest of the current record, or the next full record."""
+        if self._pt:
+            data, self._pt = bytes(self._pt), memoryview(b"")
+            return data
+        return bytes(self.read_record())
+
+    def recv_into(self, buffer, nbytes: int = 0) -> int:
+        """Copy unwrapped bytes into 'buffer', reading the next record only when none are pending."""
+        if not self._pt:
+            self._pt = memoryview(self.read_record())
+            if not self._pt:
+                return 0
+        n = min(nbytes or len(buffer), len(self._pt))
+        buffer[:n] = self._pt[:n]
+        self._pt = self._pt[n:]
+        return n
+
+    def poll_into(self, buffer, nbytes: int = 0) -> int:
+        """recv_into for a readable socket (see RecvDispatcher): at most one read below,
+        raises BlockingIOError instead of waiting for the rest of a record."""
+        if not self._pt:
+            record = self._poll_record()
+            self._pt = memoryview(self._unwrap(record) if record else b"")
+            if not self._pt:
+                return 0
+        n = min(nbytes or len(buffer), len(self._pt))
+        buffer[:n] = self._pt[:n]
+        self._pt = self._pt[n:]
+        return n
+
+    def pending(self) -> int:
+        """Number of unwrapped bytes readable without waiting on the raw socket.
+        A record already buffered below is unwrapped here, selectors cannot see it."""
+        if not self._pt and self._record_buffered():
+            self._pt = memoryview(self.read_record())
+        return len(self._pt)
+
+    def _record_buffered(self) -> bool:
+        frames = getattr(self, "_frames", None)
+        if frames is not None and frames.has_frame():
+            return True
+        inner = getattr(self._sock, "pending", None)
+        return bool(inner and inner())
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+class FrameWriter:
+    """Length-prefixed frame writer with optional send coalescing.
+
+    Low-latency mode writes each frame immediately. Otherwise frames queue up and go out
+    together once 'flush_bytes' are pending or 'flush_delay' seconds after the first one.
+    Either way header and body are handed to send_buffers without concatenation.
+    Errors of a background flush are raised by the next send.
+
+    Args:
+        sock: Socket-like object
+        low_latency (bool): Flush every frame immediately
+        flush_bytes (int): Queued size that triggers a flush
+        flush_delay (float): Max time a frame waits in the queue
+        len_bytes (int): Length prefix size
+        byteorder (str): Length prefix byte order
+    """
+
+    def __init__(
+        self,
+        sock,
+        low_latency: bool = cfg.low_latency,
+        flush_bytes: int = cfg.send_flush_bytes,
+        flush_delay: float = cfg.send_flush_delay,
+        len_bytes: int = cfg.frame_len_bytes,
+        byteorder: Literal['little', 'big'] = cfg.byteorder
+    ) -> None:
+        self._sock = sock
+        self.low_latency = low_latency
+        self.flush_bytes = flush_bytes
+        self.flush_delay = flush_delay
+        self.len_bytes = len_bytes
+        self.byteorder: Literal['little', 'big'] = byteorder
+
+        self._queue: list = []
+        self._queued = 0
+        self._deadline = 0.0
+        self._cond = threading.Condition()
+        self._flusher: threading.Thread | None = None
+        self._closed = False
+        self.error: OSError | None = None
+
+    def send(self, *parts) -> None:
+        """Queue one frame whose body is the concatenation of 'parts'."""
+        length = sum(len(p) for p in parts)
+        with self._cond:
+            if self.error:
+                raise self.error
+            if not self._queue:
+                self._deadline = monotonic() + self.flush_delay
+            self._queue.append(length.to_bytes(self.len_bytes, self.byteorder))
+            self._queue.extend(parts)
+            self._queued += self.len_bytes + length
+
+            if self.low_latency or self._queued >= self.flush_bytes:
+                self._flush_locked()
+                return
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+                self._flusher.start()
+            self._cond.notify()
+
+    def can_sendfile(self) -> bool:
+        """Whether sendfile goes straight to the kernel (plain socket, no wrapping plugin)."""
+        return type(self._sock) is socket.socket
+
+    def sendfile(self, file, offset: int, count: int, *parts) -> None:
+        """Write one frame whose body is 'parts' followed by 'count' bytes of 'file' from 'offset'.
+        Plain sockets only (see can_sendfile), queued frames are flushed first."""
+        length = sum(len(p) for p in parts) + count
+        with self._cond:
+            if self.error:
+                raise self.error
+            self._queue.append(length.to_bytes(self.len_bytes, self.byteorder))
+            self._queue.extend(parts)
+            self._flush_locked()
+            try:
+                sent = self._sock.sendfile(file, offset, count)
+                if sent != count:
+                    raise OSError(f"File truncated while sending ({sent}/{count} bytes)")
+            except OSError as e:
+                self.error = e
+                raise
+
+    def flush(self) -> None:
+        with self._cond:
+            if self.error:
+                raise self.error
+            self._flush_locked()
+
+    def close(self) -> None:
+        """Flush what is queued and stop the background flusher."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            if not self.error:
+                try:
+                    self._flush_locked()
+                except OSError:
+                    pass
+
+    def _flush_locked(self) -> None:
+        if not self._queue:
+            return
+        buffers, self._queue, self._queued = self._queue, [], 0
+        try:
+            send_buffers(self._sock, buffers)
+        except OSError as e:
+            self.error = e
+            raise
+
+    def _flush_loop(self) -> None:
+        with self._cond:
+            while not self._closed and not self.error:
+                if not self._queue:
+                    self._cond.wait()
+                    continue
+                remaining = self._deadline - monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                try:
+                    self._flush_locked()
+                except OSError:
+                    return
@@ -1,7 +1,11 @@
-from typing import List
+from __future__ import annotations
+from typing import List, TYPE_CHECKING
 import importlib
 from socket import socket
 
+if TYPE_CHECKING:
+    import asyncio
+
 def wrap_text(text: str, threshold: int) -> List[str]:
         out = []
         while len(text) > threshold:
@@ -22,10 +26,19 @@ def load_class(path: str):
         return getattr(mod, cls_name)
 
 def recv_exact(sock: socket, n: int) -> bytes:
-    buf = b""
-    while len(buf) < n:
-        chunk = sock.recv(n - len(buf))
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        chunk = sock.recv_into(view[got:], n - got)
         if not chunk:
             return b""
-        buf += chunk
-    return buf
\ No newline at end of file
+        got += chunk
+    return bytes(buf)
+
+async def arecv_exact(reader: asyncio.StreamReader, n: int) -> bytes:
+    try:
+        return await reader.readexactly(n)
+    # asyncio.IncompleteReadError is an EOFError
+    except (EOFError, ConnectionError):
+        return b""
@@ -0,0 +1,62 @@
+from pathlib import Path
+import os
+import json
+import logging
+import importlib.util
+import onionchat.config as cfg
+
+logger = logging.getLogger(__name__)
+
+_index: dict | None = None
+_dirty = False
+
+def class_doc(path: str) -> str:
+    """Docstring of a 'module:Class' component without importing it (help text).
+    Read from the module source, cached in ~/<cache_dir_name>/help_index.json per file version."""
+    mod_path, cls_name = path.split(":", 1) if ":" in path else path.rsplit(".", 1)
+    spec = importlib.util.find_spec(mod_path)
+    if spec is None or not spec.origin:
+        return ""
+    st = os.stat(spec.origin)
+    key = f"{spec.origin}:{cls_name}"
+    stamp = [st.st_mtime_ns, st.st_size]
+
+    index = _load()
+    entry = index.get(key)
+    if entry is None or entry[:2] != stamp:
+        entry = index[key] = [*stamp, _parse_doc(spec.origin, cls_name)]
+        global _dirty
+        _dirty = True
+    return entry[2]
+
+def save() -> None:
+    """Write the index back if new docstrings were parsed."""
+    global _dirty
+    if not _dirty or _index is None:
+        return
+    try:
+        _path().parent.mkdir(parents=True, exist_ok=True)
+        _path().write_text(json.dumps(_index))
+        _dirty = False
+    except OSError as e:
+        logger.debug(f"Cannot cache help index: {e}")
+
+def _parse_doc(file: str, cls_name: str) -> str:
+    import ast
+    tree = ast.parse(Path(file).read_bytes())
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == cls_name:
+            return ast.get_docstring(node, clean=False) or ""
+    return ""
+
+def _path() -> Path:
+    return Path.home() / cfg.cache_dir_name / "help_index.json"
+
+def _load() -> dict:
+    global _index
+    if _index is None:
+        try:
+            _index = json.loads(_path().read_text())
+        except (OSError, ValueError):
+            _index = {}
+    return _index # type: ignore
@@ -0,0 +1,162 @@
+from pathlib import Path
+from time import monotonic
+from typing import List
+import os
+import logging
+import threading
+import onionchat.config as cfg
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ("none", "interval", "always")
+
+class HistoryLog:
+    """Append-only chat log written behind the session by a background thread.
+
+    write() only queues the message, the writer thread appends whatever queued up in one
+    write. Durability follows 'fsync': 'none' leaves flushing to the OS, 'interval' syncs
+    at most every 'fsync_interval' seconds while there is unsynced data, 'always' syncs
+    after every batch. Past 'max_bytes' the file is rotated (log.1 ... log.<backups>).
+    close() writes out what is still queued, its cost doesn't depend on the log size.
+
+    Args:
+        path (Path): Log file, one message per line
+        encoding (str): File encoding
+        fsync (str): 'none', 'interval' or 'always'
+        fsync_interval (float): Seconds between syncs with 'interval'
+        max_bytes (int): Rotate beyond this size, 0 never rotates
+        backups (int): Rotated files kept
+        truncate (bool): Start an empty log
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        encoding: str = cfg.encoding,
+        fsync: str = cfg.log_fsync,
+        fsync_interval: float = cfg.log_fsync_interval,
+        max_bytes: int = cfg.log_max_bytes,
+        backups: int = cfg.log_backups,
+        truncate: bool = False
+    ) -> None:
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync}', expected one of {FSYNC_POLICIES}")
+        self.path = path
+        self.encoding = encoding
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if truncate:
+            # older messages must not come back from the rotated files either
+            for i in range(1, self.backups + 1):
+                self.path.with_name(f"{self.path.name}.{i}").unlink(missing_ok=True)
+        self._file = open(self.path, "wb" if truncate else "ab")
+        self._size = self._file.tell()
+
+        self._pending: List[str] = []
+        self._closing = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="history-log", daemon=True)
+        self._thread.start()
+
+    def write(self, msg: str) -> None:
+        with self._cond:
+            if self._closing:
+                return
+            self._pending.append(msg)
+            self._cond.notify()
+
+    def close(self) -> None:
+        """Write out queued messages and close the file."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self) -> None:
+        unsynced = False
+        last_sync = monotonic()
+        while True:
+            with self._cond:
+                while not self._pending and not self._closing:
+                    # with unsynced data wake up for the next interval sync
+                    timeout = last_sync + self.fsync_interval - monotonic() if unsynced and self.fsync == "interval" else None
+                    if timeout is not None and timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+                batch, self._pending = self._pending, []
+                closing = self._closing
+
+            try:
+                if batch:
+                    data = "".join(msg + "\n" for msg in batch).encode(self.encoding, "replace")
+                    self._file.write(data)
+                    self._file.flush()
+                    self._size += len(data)
+                    unsynced = True
+                if unsynced and (
+                    self.fsync == "always"
+                    or (self.fsync == "interval" and (closing or monotonic() - last_sync >= self.fsync_interval))
+                ):
+                    os.fsync(self._file.fileno())
+                    unsynced = False
+                    last_sync = monotonic()
+                if self.max_bytes and self._size >= self.max_bytes:
+                    self._rotate()
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to write chat history: {e}")
+
+            if closing:
+                self._file.close()
+                return
+
+    def _rotate(self) -> None:
+        if self.fsync != "none":
+            os.fsync(self._file.fileno())
+        self._file.close()
+        mode = "ab"
+        try:
+            if self.backups > 0:
+                for i in range(self.backups - 1, 0, -1):
+                    older = self.path.with_name(f"{self.path.name}.{i}")
+                    if older.exists():
+                        os.replace(older, self.path.with_name(f"{self.path.name}.{i + 1}"))
+                os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+            mode = "wb"
+            logger.debug(f"Rotated chat log {self.path}")
+        finally:
+            # a failed rotation keeps appending to the current file
+            self._file = open(self.path, mode)
+            self._size = self._file.tell()
+
+def read_tail(path: Path, lines: int, encoding: str = cfg.encoding, block: int = 1 << 16) -> List[str]:
+    """Last 'lines' messages of a log, read backwards from the end (the newest rotated file fills up a short one)."""
+    out: List[str] = []
+    for file in (path, path.with_name(f"{path.name}.1")):
+        if len(out) >= lines:
+            break
+        try:
+            out = _tail(file, lines - len(out), encoding, block) + out
+        except FileNotFoundError:
+            continue
+    return out
+
+def _tail(path: Path, lines: int, encoding: str, block: int) -> List[str]:
+    if lines <= 0:
+        return []
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        pos, data = end, b""
+        # one newline more than needed, so the first kept line is complete
+        while pos > 0 and data.count(b"\n") <= lines:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    tail = data.decode(encoding, "replace").split("\n")
+    if tail and tail[-1] == "":
+        tail.pop()
+    return tail[-lines:]
@@ -0,0 +1,152 @@
+from array import array
+from collections import OrderedDict, deque
+from typing import Callable, Iterable, Iterator, List, overload
+import tempfile
+import threading
+import onionchat.config as cfg
+
+class HistoryStore:
+    """Chat history with bounded memory, indexed like a list (append only).
+
+    The newest 'ring_size' messages stay in memory. Older ones are spilled a page at a time
+    to an unnamed temporary file (owner only, gone when closed), an array of their byte offsets
+    (8 bytes per message) finds them again. Reading a spilled message pages in its neighbours
+    too, the last few pages are kept (scrolling back reads mostly from memory).
+    With 'spill' off older messages are dropped instead, indexes still count them (read as
+    empty), 'first' is the oldest one left and iteration starts there.
+    Subscribers (see subscribe) see every appended message, e.g. to log it as it arrives.
+
+    Args:
+        ring_size (int): Messages kept in memory
+        page_size (int): Messages per spill write / read back
+        spill (bool): Keep older messages on disk
+        encoding (str): Encoding of spilled messages
+    """
+
+    _CACHED_PAGES = 4
+
+    def __init__(
+        self,
+        ring_size: int = cfg.history_ring_size,
+        page_size: int = cfg.history_page_size,
+        spill: bool = cfg.history_spill,
+        encoding: str = cfg.encoding
+    ) -> None:
+        self.ring_size = max(1, ring_size)
+        self.page_size = max(1, page_size)
+        self.spill = spill
+        self.encoding = encoding
+
+        self._ring: deque[str] = deque()
+        self._base = 0  # index of the first message in the ring
+        self._offsets = array("Q")  # start of every spilled message in the segment
+        self._segment = None
+        self._segment_end = 0
+        self._pages: OrderedDict[int, List[str]] = OrderedDict()
+        self._lock = threading.RLock()
+        self._subscribers: List[Callable[[str], None]] = []
+
+    def __len__(self) -> int:
+        return self._base + len(self._ring)
+
+    @overload
+    def __getitem__(self, i: int) -> str: ...
+    @overload
+    def __getitem__(self, i: slice) -> List[str]: ...
+
+    def __getitem__(self, i):
+        with self._lock:
+            if isinstance(i, slice):
+                return [self[j] for j in range(*i.indices(len(self)))]
+            if i < 0:
+                i += len(self)
+            if not 0 <= i < len(self):
+                raise IndexError("history index out of range")
+            if i >= self._base:
+                return self._ring[i - self._base]
+            if not self.spill:
+                return ""
+            return self._page(i // self.page_size)[i % self.page_size]
+
+    @property
+    def first(self) -> int:
+        """Index of the oldest message still readable (0 unless dropped with 'spill' off)."""
+        return 0 if self.spill else self._base
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(self.first, len(self)):
+            yield self[i]
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def append(self, msg: str) -> None:
+        with self._lock:
+            self._ring.append(msg)
+            # spill whole pages, the ring holds ring_size to ring_size + page_size messages
+            if len(self._ring) >= self.ring_size + self.page_size:
+                self._spill_page()
+        for fn in self._subscribers:
+            fn(msg)
+
+    def subscribe(self, fn: Callable[[str], None]) -> None:
+        """Call 'fn' with every message appended from now on."""
+        self._subscribers = [*self._subscribers, fn]
+
+    def unsubscribe(self, fn: Callable[[str], None]) -> None:
+        self._subscribers = [f for f in self._subscribers if f is not fn]
+
+    def extend(self, msgs: Iterable[str]) -> None:
+        for msg in msgs:
+            self.append(msg)
+
+    def __iadd__(self, msgs: Iterable[str]) -> "HistoryStore":
+        self.extend(msgs)
+        return self
+
+    def close(self) -> None:
+        """Drop the spilled segment (further reads of spilled messages fail)."""
+        with self._lock:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+
+    def _spill_page(self) -> None:
+        page = [self._ring.popleft() for _ in range(self.page_size)]
+        self._base += len(page)
+        if not self.spill:
+            return
+        if self._segment is None:
+            self._segment = tempfile.TemporaryFile(prefix="onionchat_history_")
+        data = []
+        for msg in page:
+            raw = msg.encode(self.encoding, "replace")
+            self._offsets.append(self._segment_end)
+            self._segment_end += len(raw)
+            data.append(raw)
+        self._segment.seek(0, 2)
+        self._segment.write(b"".join(data))
+
+    def _page(self, n: int) -> List[str]:
+        page = self._pages.get(n)
+        if page is not None:
+            self._pages.move_to_end(n)
+            return page
+
+        first = n * self.page_size
+        last = min(first + self.page_size, len(self._offsets))
+        start = self._offsets[first]
+        end = self._offsets[last] if last < len(self._offsets) else self._segment_end
+        self._segment.flush() # type: ignore
+        self._segment.seek(start) # type: ignore
+        raw = self._segment.read(end - start) # type: ignore
+
+        page = []
+        for i in range(first, last):
+            a = self._offsets[i] - start
+            b = (self._offsets[i + 1] if i + 1 < len(self._offsets) else self._segment_end) - start
+            page.append(raw[a:b].decode(self.encoding, "replace"))
+        self._pages[n] = page
+        if len(self._pages) > self._CACHED_PAGES:
+            self._pages.popitem(last=False)
+        return page
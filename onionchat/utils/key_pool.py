@@ -0,0 +1,69 @@
+from collections import deque
+import logging
+import threading
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+from cryptography.hazmat.primitives import serialization
+import onionchat.config as cfg
+
+logger = logging.getLogger(__name__)
+
+def generate_keypair() -> tuple[X25519PrivateKey, bytes]:
+    """Fresh ephemeral X25519 keypair, public key serialized raw (32 bytes)."""
+    priv = X25519PrivateKey.generate()
+    pub = priv.public_key().public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
+    )
+    return priv, pub
+
+class KeyPool:
+    """Ephemeral X25519 keypairs generated ahead of time on a background thread.
+
+    take() hands out each keypair exactly once (removed from the pool), the refill thread
+    tops the pool up to 'size' afterwards. An empty pool generates on the caller's thread.
+
+    Args:
+        size (int): Keypairs kept ready, 0 disables the pool
+    """
+
+    def __init__(self, size: int = cfg.key_pool_size) -> None:
+        self.size = size
+        self._keys: deque[tuple[X25519PrivateKey, bytes]] = deque()
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Start filling the pool (idempotent)."""
+        with self._cond:
+            if self._thread is None and self.size > 0:
+                self._thread = threading.Thread(target=self._refill_loop, daemon=True)
+                self._thread.start()
+
+    def take(self) -> tuple[X25519PrivateKey, bytes]:
+        """A keypair nobody else gets."""
+        with self._cond:
+            keys = self._keys.popleft() if self._keys else None
+            self._cond.notify()
+        if self._thread is None:
+            self.start()
+        return keys if keys is not None else generate_keypair()
+
+    def _refill_loop(self) -> None:
+        while True:
+            with self._cond:
+                while len(self._keys) >= self.size:
+                    self._cond.wait()
+            keys = generate_keypair()
+            with self._cond:
+                self._keys.append(keys)
+
+_shared: KeyPool | None = None
+_shared_lock = threading.Lock()
+
+def key_pool() -> KeyPool:
+    """Process wide keypair pool."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = KeyPool()
+        return _shared
@@ -1,46 +1,95 @@
 from __future__ import annotations
-from typing import Iterable, List, Dict, Optional
-import importlib, json
+from typing import Iterable, List, Dict, Optional, TYPE_CHECKING
+import importlib, importlib.util, json, os, sys, threading
 from pathlib import Path
 from socket import socket
-from cryptography.hazmat.primitives import hashes
 import onionchat.config as cfg
-from onionchat.utils.funcs import recv_exact
+from onionchat.components import CONNS, CHATS, HANDLERS, PLUGINS
+from onionchat.utils.funcs import recv_exact, arecv_exact
+from onionchat.utils.framing import FrameReader
+
+if TYPE_CHECKING:
+    import asyncio
 
 def _class_file(cls: type) -> Path:
-    mod = importlib.import_module(cls.__module__)
+    mod = sys.modules.get(cls.__module__) or importlib.import_module(cls.__module__)
     path = getattr(mod, "__file__", None)
     if not path:
         raise ValueError(f"No file for module {mod.__name__}")
     return Path(path).resolve()
 
+def _module_file(module: str) -> Path:
+    """File of a module, without importing it."""
+    if (mod := sys.modules.get(module)) is not None and getattr(mod, "__file__", None):
+        return Path(mod.__file__).resolve() # type: ignore
+    spec = importlib.util.find_spec(module)
+    if spec is None or not spec.origin:
+        raise ValueError(f"No file for module {module}")
+    return Path(spec.origin).resolve()
+
 def _sha256(data: bytes) -> bytes:
+    from cryptography.hazmat.primitives import hashes  # not needed for --help
     h = hashes.Hash(hashes.SHA256())
     h.update(data)
     return h.finalize()
 
+class AttestationStore:
+    """SHA-256 of module files, each read and hashed once per process and file version
+    (path, mtime, size). Only hashes computed here are cached, an attestation never stands
+    in for reading the file (a same size edit with a restored mtime would pass)."""
+
+    def __init__(self) -> None:
+        self._hashes: Dict[str, tuple[int, int, str]] = {}
+        self._lock = threading.Lock()
+
+    def file_hash(self, path: Path) -> str:
+        st = os.stat(path)
+        key = str(path)
+        with self._lock:
+            cached = self._hashes.get(key)
+        if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+            return cached[2]
+        with open(path, "rb") as f:
+            digest = _sha256(f.read()).hex()
+        with self._lock:
+            self._hashes[key] = (st.st_mtime_ns, st.st_size, digest)
+        return digest
+
+store = AttestationStore()
+
+# bound of the manifest / verified attestation caches (distinct pipelines or files per process)
+_CACHE_LIMIT = 64
+
+def _remember(cache: Dict, key, value):
+    cache[key] = value
+    while len(cache) > _CACHE_LIMIT:
+        # oldest first (insertion order)
+        del cache[next(iter(cache))]
+    return value
+
 def digest_for_classes(classes: Iterable[type]) -> bytes:
     """Canonical digest of module files hosting the given classes."""
     entries = []
     for cls in classes:
         path = _class_file(cls)
-        with open(path, "rb") as f:
-            file_bytes = f.read()
-        file_hash = _sha256(file_bytes).hex()
-        entries.append({"module": cls.__module__, "class": cls.__name__, "path": str(path), "sha256": file_hash})
+        entries.append({"module": cls.__module__, "class": cls.__name__, "path": str(path), "sha256": store.file_hash(path)})
     entries.sort(key=lambda e: (e["module"], e["class"]))
     payload = json.dumps(entries, separators=(",", ":"), sort_keys=True).encode("utf-8")
     return _sha256(payload)
 
 def manifest_for_classes(
     classes: Iterable[type],
-    alias_by_cls: Optional[Dict[type, str]] = None
+    alias_by_cls: Optional[Dict[type, str]] = None,
+    options: Optional[Dict[str, Dict]] = None
 ) -> Dict:
-    """Create a canonical manifest describing selected modules."""
+    """Create a canonical manifest describing selected modules and their wire options.
+    A class with 'manifest_as' (same wire protocol, e.g. an asyncio variant) is listed as that class."""
     entries = []
     for cls in classes:
-        mod_path = f"{cls.__module__}.{cls.__name__}"
         alias = alias_by_cls.get(cls) if alias_by_cls else None
+        if (same := getattr(cls, "manifest_as", None)) is not None:
+            cls, alias = same, _alias_of(same)
+        mod_path = f"{cls.__module__}.{cls.__name__}"
         entries.append({
             "alias": alias or mod_path,
             "import": mod_path,
@@ -48,10 +97,19 @@ def manifest_for_classes(
         })
     # sort for canonical form
     entries.sort(key=lambda e: (e["alias"], e["import"]))
-    return {
+    manifest = {
         "level": getattr(cfg, "module_sign_level"),
         "entries": entries,
     }
+    # only present when set, so manifests without options stay byte-identical
+    if options:
+        manifest["options"] = options
+    return manifest
+
+def _alias_of(cls: type) -> str | None:
+    """Registered component alias of a class (components.py), None if unregistered."""
+    paths = {f"{cls.__module__}:{cls.__name__}", f"{cls.__module__}.{cls.__name__}"}
+    return next((alias for reg in (CONNS, CHATS, HANDLERS, PLUGINS) for alias, p in reg.items() if p in paths), None)
 
 def serialize_manifest(manifest: Dict) -> bytes:
     return json.dumps(manifest, separators=(",", ":"), sort_keys=True).encode("utf-8")
@@ -59,27 +117,145 @@ def serialize_manifest(manifest: Dict) -> bytes:
 def digest_for_manifest_bytes(manifest_bytes: bytes) -> bytes:
     return _sha256(manifest_bytes)
 
-def exchange_manifest(sock: socket, manifest_bytes: bytes) -> Dict:
-    """Symmetric exchange of a length-prefixed JSON manifest; returns peer manifest dict."""
-    length = len(manifest_bytes).to_bytes(4, "big")
-    # send ours
-    sock.sendall(length + manifest_bytes)
-    # recv peer
-    peer_len_b = recv_exact(sock, 4)
+def manifest_frame(manifest_bytes: bytes) -> bytes:
+    """Wire form of a serialized manifest (4-byte big-endian length prefix)."""
+    return len(manifest_bytes).to_bytes(4, "big") + manifest_bytes
+
+def read_manifest(sock: socket) -> Dict:
+    """Read the peer's manifest frame, without reading past it (later handshake steps own the socket).
+    Empty if the peer closed or sent garbage."""
+    peer_b = FrameReader(sock, len_bytes=4, byteorder="big", greedy=False).read_frame()
+    if peer_b is None:
+        return {}
+    try:
+        return json.loads(str(peer_b, "utf-8"))
+    except Exception:
+        return {}
+
+async def aread_manifest(reader: asyncio.StreamReader) -> Dict:
+    """Asyncio variant of read_manifest."""
+    peer_len_b = await arecv_exact(reader, 4)
     if not peer_len_b:
         return {}
-    peer_len = int.from_bytes(peer_len_b, "big")
-    peer_b = recv_exact(sock, peer_len)
+    peer_b = await arecv_exact(reader, int.from_bytes(peer_len_b, "big"))
     try:
         return json.loads(peer_b.decode("utf-8"))
     except Exception:
         return {}
 
+def exchange_manifest(sock: socket, manifest_bytes: bytes) -> Dict:
+    """Symmetric exchange of a length-prefixed JSON manifest; returns peer manifest dict."""
+    sock.sendall(manifest_frame(manifest_bytes))
+    return read_manifest(sock)
+
+async def aexchange_manifest(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, manifest_bytes: bytes) -> Dict:
+    """Asyncio variant of exchange_manifest."""
+    writer.write(manifest_frame(manifest_bytes))
+    await writer.drain()
+    return await aread_manifest(reader)
+
+_manifests: Dict[tuple, tuple[Dict, bytes]] = {}
+
+def default_attestation_path() -> Path:
+    """cfg.attestation_path, else attestation.json in the package directory."""
+    if cfg.attestation_path:
+        return Path(cfg.attestation_path).expanduser()
+    return Path(__file__).resolve().parent.parent / "attestation.json"
+
+def cached_manifest(
+    classes: Iterable[type],
+    alias_by_cls: Optional[Dict[type, str]] = None,
+    options: Optional[Dict[str, Dict]] = None
+) -> tuple[Dict, bytes]:
+    """(manifest, serialized manifest) of manifest_for_classes, built once per input."""
+    classes = list(classes)
+    key = (
+        getattr(cfg, "module_sign_level"),
+        tuple((cls, (alias_by_cls or {}).get(cls)) for cls in classes),
+        json.dumps(options, sort_keys=True) if options else None
+    )
+    if (cached := _manifests.get(key)) is None:
+        manifest = manifest_for_classes(classes, alias_by_cls, options)
+        cached = _remember(_manifests, key, (manifest, serialize_manifest(manifest)))
+    return cached
+
+def component_modules() -> List[str]:
+    """Modules of every registered pipeline component."""
+    paths = {**CONNS, **CHATS, **HANDLERS, **PLUGINS}.values()
+    return sorted({p.split(":", 1)[0] if ":" in p else p.rsplit(".", 1)[0] for p in paths})
+
+def sign_attestation(private_key_pem: bytes, modules: Iterable[str] | None = None) -> Dict:
+    """Signed attestation of module files (all registered components by default), meant to be
+    generated at install time: {"modules": {module: {sha256, size, mtime_ns}}, "signature": hex}.
+    The signature (Ed25519) covers the canonical JSON of "modules"."""
+    # signing keys are only needed here, keep them off the startup path
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+    key = serialization.load_pem_private_key(private_key_pem, password=None)
+    if not isinstance(key, Ed25519PrivateKey):
+        raise ValueError("Attestation signing key must be Ed25519")
+    entries = {}
+    for module in modules or component_modules():
+        path = _module_file(module)
+        st = os.stat(path)
+        entries[module] = {"sha256": store.file_hash(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    payload = json.dumps(entries, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    return {"modules": entries, "signature": key.sign(payload).hex()}
+
+_verified: Dict[tuple, Dict[str, str]] = {}
+
+def verify_attestation(path: str | Path, trusted_pubkeys: List[str]) -> Dict[str, str]:
+    """Check an attestation file against the trusted Ed25519 keys (PEM), one signature check
+    per file version. Returns module -> sha256 (compare with check_attested), raises ValueError if the
+    file is missing, malformed or signed by no trusted key."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+    from cryptography.exceptions import InvalidSignature
+    path = Path(path).expanduser()
+    try:
+        st = os.stat(path)
+        cache_key = (str(path), st.st_mtime_ns, st.st_size, tuple(trusted_pubkeys))
+        if (attested := _verified.get(cache_key)) is not None:
+            return attested
+        doc = json.loads(path.read_bytes())
+        entries, signature = doc["modules"], bytes.fromhex(doc["signature"])
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Unreadable module attestation {path}: {e}") from e
+
+    payload = json.dumps(entries, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    for pem in trusted_pubkeys:
+        pub = serialization.load_pem_public_key(pem.encode() if isinstance(pem, str) else pem)
+        if not isinstance(pub, Ed25519PublicKey):
+            continue
+        try:
+            pub.verify(signature, payload)
+            break
+        except InvalidSignature:
+            continue
+    else:
+        raise ValueError(f"Module attestation {path} is not signed by a trusted key")
+
+    try:
+        attested = {module: str(e["sha256"]) for module, e in entries.items()}
+    except (AttributeError, KeyError, TypeError) as e:
+        raise ValueError(f"Malformed module attestation {path}: {e}") from e
+    return _remember(_verified, cache_key, attested)
+
+def check_attested(classes: Iterable[type], attested: Dict[str, str]) -> None:
+    """Raise ValueError unless every class's module file matches its attested hash."""
+    for cls in classes:
+        expected = attested.get(cls.__module__)
+        if expected is None:
+            raise ValueError(f"Module {cls.__module__} is not attested")
+        if store.file_hash(_class_file(cls)) != expected:
+            raise ValueError(f"Module {cls.__module__} does not match its attestation")
+
 def summarize_manifest(manifest: Dict) -> str:
     try:
         level = manifest.get("level", "?")
         mods = [e.get("alias") or e.get("import", "?") for e in manifest.get("entries", [])]
-        return f"level={level}; modules={mods}"
+        options = manifest.get("options")
+        return f"level={level}; modules={mods}" + (f"; options={options}" if options else "")
     except Exception:
         return "invalid manifest"
 
@@ -103,4 +279,13 @@ def exchange_and_match(sock: socket, local_digest: bytes) -> bool:
     sock.sendall(local_digest)
     # recv
     peer = recv_exact(sock, 32)
-    return peer == local_digest
\ No newline at end of file
+    return peer == local_digest
+
+if __name__ == "__main__":
+    # install-time attestation: python -m onionchat.utils.module_sign <ed25519 key.pem> [output]
+    if len(sys.argv) < 2:
+        print("Usage: python -m onionchat.utils.module_sign <ed25519 private key.pem> [output]")
+        sys.exit(1)
+    out = Path(sys.argv[2]) if len(sys.argv) > 2 else default_attestation_path()
+    out.write_text(json.dumps(sign_attestation(Path(sys.argv[1]).read_bytes()), indent=1, sort_keys=True))
+    print(f"Wrote {out}")
@@ -0,0 +1,180 @@
+from collections import deque
+from time import monotonic
+import struct
+import threading
+import onionchat.config as cfg
+from onionchat.utils.framing import FrameWriter
+
+# stream id prefix of every multiplexed frame body
+STREAM_HEADER = struct.Struct("!H")
+
+# reserved streams, everything above is opened per transfer
+CONTROL, CHAT = 0, 1
+FIRST_DATA_STREAM = 2
+MAX_STREAM = 0xFFFF
+
+class MuxWriter:
+    """Interleaves frames of logical streams over one FrameWriter.
+
+    The control stream has strict priority, other streams are served round-robin one frame
+    at a time, so a long transfer never holds a chat message back by more than one frame.
+    Each stream queues at most 'window' frames, senders block once theirs is full.
+    With nothing queued the caller writes directly, the scheduler thread only runs under load.
+    Errors of a background write are raised by the next send.
+
+    Args:
+        writer (FrameWriter): Frame writer of the connection
+        window (int): Max queued frames per stream
+        keepalive (tuple | None): Frame body parts sent on the control stream when idle
+        keepalive_interval (float): Idle time before a keepalive frame, 0 disables
+    """
+
+    def __init__(
+        self,
+        writer: FrameWriter,
+        window: int = cfg.mux_window,
+        keepalive: tuple | None = None,
+        keepalive_interval: float = cfg.keepalive_interval
+    ) -> None:
+        self.writer = writer
+        self.window = window
+        self.keepalive = keepalive if keepalive_interval > 0 else None
+        self.keepalive_interval = keepalive_interval
+
+        self._queues: dict[int, deque] = {}
+        self._rr: deque[int] = deque()  # data streams with queued frames, in service order
+        self._cond = threading.Condition()
+        self._busy: int | None = None  # stream of the frame being written
+        self._last_write = monotonic()
+        self._scheduler: threading.Thread | None = None
+        self._closed = False
+        self.error: OSError | None = None
+
+        if self.keepalive is not None:
+            self._start_scheduler()
+
+    def send(self, sid: int, *parts) -> None:
+        """Queue one frame of stream 'sid' whose body is the concatenation of 'parts'."""
+        self._put(sid, (parts, None))
+
+    def sendfile(self, sid: int, file, offset: int, count: int, *parts) -> None:
+        """Queue one frame of stream 'sid': 'parts' followed by 'count' bytes of 'file' from 'offset'.
+        See FrameWriter.can_sendfile."""
+        self._put(sid, (parts, (file, offset, count)))
+
+    def drain(self, sid: int) -> None:
+        """Block until every queued frame of stream 'sid' is handed to the frame writer."""
+        with self._cond:
+            while not self.error and (self._queues.get(sid) or self._busy == sid):
+                self._cond.wait()
+            if self.error:
+                raise self.error
+
+    def close(self) -> None:
+        """Write pending control frames and stop the scheduler, queued data frames are dropped."""
+        with self._cond:
+            while not self.error and (self._queues.get(CONTROL) or self._busy is not None):
+                self._cond.wait()
+            self._closed = True
+            self._queues.clear()
+            self._rr.clear()
+            self._cond.notify_all()
+
+    def _put(self, sid: int, item: tuple) -> None:
+        with self._cond:
+            if self.error:
+                raise self.error
+            if self._closed:
+                raise OSError("Stream multiplexer is closed")
+
+            if self._busy is None and not self._queues:
+                # idle, write on the caller's thread
+                self._busy = sid
+            else:
+                q = self._queues.get(sid)
+                while q is not None and len(q) >= self.window and not self.error and not self._closed:
+                    self._cond.wait()
+                    q = self._queues.get(sid)
+                if self.error:
+                    raise self.error
+                if self._closed:
+                    raise OSError("Stream multiplexer is closed")
+                if q is None:
+                    q = self._queues[sid] = deque()
+                    if sid != CONTROL:
+                        self._rr.append(sid)
+                q.append(item)
+                self._start_scheduler()
+                self._cond.notify_all()
+                return
+
+        self._write(sid, item)
+
+    def _next_locked(self) -> tuple[int, tuple] | None:
+        """Pop the next frame: control first, then one frame per data stream in turn."""
+        if q := self._queues.get(CONTROL):
+            sid = CONTROL
+        elif self._rr:
+            sid = self._rr.popleft()
+            q = self._queues[sid]
+        else:
+            return None
+
+        item = q.popleft()
+        if q:
+            if sid != CONTROL:
+                self._rr.append(sid)
+        else:
+            del self._queues[sid]
+        return sid, item
+
+    def _write(self, sid: int, item: tuple) -> None:
+        """Write one frame, self._busy must be set by the caller."""
+        parts, file = item
+        header = STREAM_HEADER.pack(sid)
+        try:
+            if file is None:
+                self.writer.send(header, *parts)
+            else:
+                self.writer.sendfile(*file, header, *parts)
+        except OSError as e:
+            with self._cond:
+                self.error = e
+            raise
+        finally:
+            with self._cond:
+                self._busy = None
+                self._last_write = monotonic()
+                self._cond.notify_all()
+
+    def _start_scheduler(self) -> None:
+        if self._scheduler is None:
+            self._scheduler = threading.Thread(target=self._schedule_loop, daemon=True)
+            self._scheduler.start()
+
+    def _schedule_loop(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed or self.error:
+                        return
+                    if self._busy is None and (nxt := self._next_locked()) is not None:
+                        break
+                    if self.keepalive is not None and self._busy is None:
+                        remaining = self._last_write + self.keepalive_interval - monotonic()
+                        if remaining <= 0:
+                            nxt = (CONTROL, (self.keepalive, None))
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                sid, item = nxt
+                self._busy = sid
+                del nxt
+            try:
+                self._write(sid, item)
+            except OSError:
+                return
+            finally:
+                # written parts may be views of a mapping the sender is about to close
+                del item
@@ -0,0 +1,142 @@
+from typing import Any, Dict, Literal
+import json
+import socket
+import struct
+
+# flag -> payload key, declaration order is the canonical binary field order
+FLAG_TITLES = {
+    's': "sender_ip",
+    'r': "recv_ip",
+    't': "timestamp",
+    'x': "data_type",
+    'v': "ver",
+    'e': "sig_data",
+    'n': "seq_num",
+    'p': "push"
+}
+
+# values of the 'x' flag, the binary codec sends the index
+DATA_TYPES = ("text", "file")
+
+_NONE_LEN = 0xFFFF
+
+def canonical_flags(flags: str) -> str:
+    """Deduplicate and order flags canonically."""
+    if unknown := set(flags) - FLAG_TITLES.keys():
+        raise ValueError(f"Unknown payload flags: {''.join(sorted(unknown))}")
+    return "".join(f for f in FLAG_TITLES if f in flags)
+
+class JsonCodec:
+    """Self-describing JSON payload, every message repeats its keys.
+
+    Args:
+        flags (str): Active payload flags
+        encoding (str): Text encoding
+    """
+
+    name = "json"
+
+    def __init__(self, flags: str, encoding: str) -> None:
+        self.flags = canonical_flags(flags)
+        self.encoding = encoding
+
+    def encode(self, fields: Dict[str, Any], msg: str) -> bytes:
+        payload = {FLAG_TITLES[flag]: val for flag, val in fields.items()}
+        payload["msg"] = msg
+        return json.dumps(payload).encode(self.encoding)
+
+    def decode(self, data: bytes | memoryview) -> Dict:
+        return json.loads(str(data, self.encoding))
+
+class BinaryCodec:
+    """Fixed struct header for the session's flag set followed by the raw message body.
+    Both peers must use the same flag set, it is agreed once through the module-sign manifest.
+
+    Layout: [struct of flag fields] [variable field bytes] [msg]
+        s, r: IPv4 (4s), t: float64, x: DATA_TYPES index (B), v: major/minor (BB),
+        n: int64 (-1 = None), e, p: uint16 length (0xFFFF = None), bytes follow the struct
+
+    Args:
+        flags (str): Active payload flags
+        encoding (str): Text encoding
+    """
+
+    name = "binary"
+
+    _FORMATS = {'s': "4s", 'r': "4s", 't': "d", 'x': "B", 'v': "BB", 'n': "q", 'e': "H", 'p': "H"}
+
+    def __init__(self, flags: str, encoding: str) -> None:
+        self.flags = canonical_flags(flags)
+        self.encoding = encoding
+        self._struct = struct.Struct("!" + "".join(self._FORMATS[f] for f in self.flags))
+
+    def encode(self, fields: Dict[str, Any], msg: str) -> bytes:
+        values = []
+        tail = []
+        for flag in self.flags:
+            val = fields.get(flag)
+            match flag:
+                case 's' | 'r':
+                    values.append(socket.inet_aton(val or "0.0.0.0"))
+                case 't':
+                    values.append(val)
+                case 'x':
+                    values.append(DATA_TYPES.index(val))
+                case 'v':
+                    values.extend(int(p) for p in str(val).split(".", 1))
+                case 'n':
+                    values.append(-1 if val is None else val)
+                case _:
+                    if val is None:
+                        values.append(_NONE_LEN)
+                    else:
+                        raw = str(val).encode(self.encoding)
+                        values.append(len(raw))
+                        tail.append(raw)
+        return b"".join((self._struct.pack(*values), *tail, msg.encode(self.encoding)))
+
+    def decode(self, data: bytes | memoryview) -> Dict:
+        try:
+            values = iter(self._struct.unpack_from(data))
+        except struct.error as e:
+            raise ValueError(f"Truncated binary payload: {e}") from e
+
+        payload: Dict[str, Any] = {}
+        var_lens = []
+        for flag in self.flags:
+            val = next(values)
+            match flag:
+                case 's' | 'r':
+                    val = socket.inet_ntoa(val)
+                case 'x':
+                    if val >= len(DATA_TYPES):
+                        raise ValueError(f"Unknown data type index {val}")
+                    val = DATA_TYPES[val]
+                case 'v':
+                    val = f"{val}.{next(values)}"
+                case 'n':
+                    val = None if val < 0 else val
+                case 'e' | 'p':
+                    var_lens.append((flag, val))
+                    continue
+            payload[FLAG_TITLES[flag]] = val
+
+        pos = self._struct.size
+        for flag, length in var_lens:
+            if length == _NONE_LEN:
+                payload[FLAG_TITLES[flag]] = None
+                continue
+            payload[FLAG_TITLES[flag]] = str(data[pos:pos + length], self.encoding)
+            pos += length
+        payload["msg"] = str(data[pos:], self.encoding)
+        return payload
+
+CODECS = {
+    JsonCodec.name: JsonCodec,
+    BinaryCodec.name: BinaryCodec,
+}
+
+def make_codec(name: Literal['json', 'binary'], flags: str, encoding: str) -> JsonCodec | BinaryCodec:
+    if name not in CODECS:
+        raise ValueError(f"Unknown payload codec '{name}', expected one of {list(CODECS)}")
+    return CODECS[name](flags, encoding)
@@ -0,0 +1,108 @@
+from collections import deque
+import socket
+import threading
+from onionchat.utils.framing import FrameReader
+
+class FramePipeline:
+    """Reads length-prefixed frames of a socket on a background thread into a bounded queue.
+
+    The consumer unwraps and decodes while the reader thread waits on the network, so bursts
+    overlap I/O with crypto. Frames are handed out in arrival order, the reader blocks once
+    'depth' frames are queued. fileno() is readable exactly while frames are queued, so
+    selectors (RecvDispatcher) keep working although the socket itself is drained here.
+
+    Args:
+        sock: Connected socket, read only by this pipeline once started
+        depth (int): Max queued frames
+        len_bytes (int): Length prefix size
+        byteorder (str): Length prefix byte order
+    """
+
+    def __init__(self, sock, depth: int, len_bytes: int = 4, byteorder: str = "big") -> None:
+        self.depth = depth
+        self._frames = FrameReader(sock, len_bytes=len_bytes, byteorder=byteorder) # type: ignore
+        self._queue: deque[bytes | None] = deque()
+        self._cond = threading.Condition()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._closed = False
+
+        # metrics
+        self.frames = 0
+        self.peak_depth = 0
+
+        self._thread = threading.Thread(target=self._read_loop, daemon=True)
+        self._thread.start()
+
+    def queue_depth(self) -> int:
+        """Frames read but not yet consumed."""
+        return len(self._queue)
+
+    def has_frame(self) -> bool:
+        return bool(self._queue)
+
+    def get(self, timeout: float | None = None) -> bytes | None:
+        """Next frame body, None once the socket or the pipeline is closed or failed.
+        Raises socket.timeout if nothing arrives within 'timeout' seconds."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._queue or self._closed, timeout):
+                raise socket.timeout("timed out")
+            if self._closed:
+                return None
+            frame = self._queue[0]
+            if frame is None:
+                # keep the end marker, every later call sees EOF too
+                return None
+            self._queue.popleft()
+            if not self._queue:
+                self._drain_wakeup()
+            if len(self._queue) == self.depth - 1:
+                # the reader may be waiting for room
+                self._cond.notify_all()
+            return frame
+
+    def fileno(self) -> int:
+        return self._wake_r.fileno()
+
+    def close(self) -> None:
+        """Stop handing out frames, the reader thread ends with the socket (close it too)."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._wake_r.close()
+        self._wake_w.close()
+
+    def _read_loop(self) -> None:
+        while True:
+            # one blocking read, then whatever else is already buffered, queued in one go
+            try:
+                frame = self._frames.read_frame()
+                batch = [bytes(frame) if frame is not None else None]
+                while batch[-1] is not None and len(batch) < self.depth and (frame := self._frames.next_frame()) is not None:
+                    batch.append(bytes(frame))
+            except OSError:
+                batch = [None]
+            with self._cond:
+                for frame in batch:
+                    while len(self._queue) >= self.depth and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        # end marker for consumers, the wakeup socket is gone already
+                        if not self._queue or self._queue[-1] is not None:
+                            self._queue.append(None)
+                        return
+                    if not self._queue:
+                        # one wakeup byte while the queue is non-empty
+                        self._wake_w.send(b"\x00")
+                        self._cond.notify_all()
+                    self._queue.append(frame)
+                    if frame is None:
+                        return
+                    self.frames += 1
+                self.peak_depth = max(self.peak_depth, len(self._queue))
+
+    def _drain_wakeup(self) -> None:
+        try:
+            self._wake_r.recv(1)
+        except (BlockingIOError, OSError):
+            pass
@@ -0,0 +1,122 @@
+from collections import OrderedDict
+from typing import List, Sequence
+import threading
+import onionchat.config as cfg
+from onionchat.utils.funcs import wrap_text
+
+class ScrollView:
+    """Virtual scrolling window over unwrapped messages.
+
+    Messages are wrapped when first shown, per terminal width (LRU cache, a width change
+    drops it and re-wraps lazily). The view follows the newest message until scrolled up,
+    then stays anchored at its top line (message index, wrapped line) while more arrive.
+    Scrolling and rendering walk only the lines they move over or show, whatever the history length.
+    Thread safe, scrolling (input thread) and rendering (render thread) share the cache and anchor.
+    Scrolling stops at 'lines.first' when the sequence has it (messages before it were dropped).
+
+    Args:
+        lines (Sequence[str]): Messages, appended to by the owner
+        width (int): Wrap width
+        cache_size (int): Wrapped messages kept
+    """
+
+    def __init__(self, lines: Sequence[str], width: int = 80, cache_size: int = cfg.cedit_wrap_cache_size) -> None:
+        self.lines = lines
+        self.width = max(1, width)
+        self.cache_size = cache_size
+        self._wrapped_cache: OrderedDict[int, List[str]] = OrderedDict()
+        self._top: tuple[int, int] | None = None  # None follows the newest message
+        self._lock = threading.Lock()
+
+    @property
+    def following(self) -> bool:
+        return self._top is None
+
+    def resize(self, width: int) -> None:
+        width = max(1, width)
+        with self._lock:
+            if width != self.width:
+                self.width = width
+                self._wrapped_cache.clear()
+
+    def window(self, height: int) -> List[str]:
+        """The wrapped lines on screen, top to bottom (at most 'height')."""
+        with self._lock:
+            return self._window(height)
+
+    def _window(self, height: int) -> List[str]:
+        if not self.lines or height <= 0:
+            return []
+        self._drop_stale_top()
+        if self._top is not None and self._step(self._top, height - 1) == self._end():
+            # after a resize the anchored window may reach the newest line, follow it again
+            self._top = None
+        i, j = self._top_pos(height)
+        out: List[str] = []
+        while len(out) < height and i < len(self.lines):
+            out.extend(self._wrapped(i)[j : j + height - len(out)])
+            i, j = i + 1, 0
+        return out
+
+    def scroll(self, delta: int, height: int) -> bool:
+        """Move the window by 'delta' lines (negative is up). Returns whether it moved."""
+        with self._lock:
+            return self._scroll(delta, height)
+
+    def _scroll(self, delta: int, height: int) -> bool:
+        if not self.lines or height <= 0:
+            return False
+        self._drop_stale_top()
+        old = self._top
+        top = self._step(self._top_pos(height), delta)
+        # a window reaching the newest line follows it again
+        self._top = None if self._step(top, height - 1) == self._end() else top
+        return self._top != old
+
+    def _first(self) -> int:
+        return getattr(self.lines, "first", 0)
+
+    def _drop_stale_top(self) -> None:
+        # the anchored message may have been dropped meanwhile
+        if self._top is not None and self._top[0] < self._first():
+            self._top = (self._first(), 0)
+
+    def _top_pos(self, height: int) -> tuple[int, int]:
+        return self._top if self._top is not None else self._step(self._end(), -(height - 1))
+
+    def _end(self) -> tuple[int, int]:
+        last = len(self.lines) - 1
+        return last, len(self._wrapped(last)) - 1
+
+    def _step(self, pos: tuple[int, int], n: int) -> tuple[int, int]:
+        """Position 'n' wrapped lines from 'pos', clamped to the first / last line."""
+        i, j = pos
+        j = min(j, len(self._wrapped(i)) - 1)  # anchor may predate a resize
+        if n < 0:
+            n = -n
+            first = self._first()
+            while n > j and i > first:
+                n -= j + 1
+                i -= 1
+                j = len(self._wrapped(i)) - 1
+            return i, max(0, j - n)
+        while n > 0:
+            rest = len(self._wrapped(i)) - 1 - j
+            if n <= rest:
+                return i, j + n
+            if i + 1 >= len(self.lines):
+                return i, j + rest
+            n -= rest + 1
+            i, j = i + 1, 0
+        return i, j
+
+    def _wrapped(self, i: int) -> List[str]:
+        wrapped = self._wrapped_cache.get(i)
+        if wrapped is not None:
+            self._wrapped_cache.move_to_end(i)
+            return wrapped
+        wrapped = [part for line in self.lines[i].split("\n") for part in wrap_text(line, self.width)]
+        self._wrapped_cache[i] = wrapped
+        if len(self._wrapped_cache) > self.cache_size:
+            self._wrapped_cache.popitem(last=False)
+        return wrapped
@@ -0,0 +1,149 @@
+from collections import OrderedDict
+from pathlib import Path
+from time import time
+import os
+import json
+import atexit
+import hashlib
+import logging
+import threading
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+import onionchat.config as cfg
+
+logger = logging.getLogger(__name__)
+
+TICKET_ID_SIZE = 16
+SECRET_SIZE = 32
+
+class SessionCache:
+    """Resumption tickets of past sessions, keyed by peer (address + manifest digest).
+
+    A ticket is (id, secret), both derived from the session that issued it, the id is
+    what peers send to find a common ticket. Tickets are single use: take() removes them,
+    the resumed session issues the next one. Entries expire after 'ttl' seconds, the least
+    recently stored are evicted beyond 'max_entries'.
+    Tickets are kept in memory only unless a 'secret' is configured. With one the cache is
+    persisted encrypted (ChaCha20-Poly1305, key derived from the secret with scrypt and a random
+    salt stored in the file), nothing that decrypts it is stored on disk. Changes are written
+    together 'flush_delay' seconds after the first one (and at exit), by replacing the file
+    atomically (owner only), a crash mid-write keeps the previous tickets.
+    A missing or unreadable file (e.g. another secret) starts an empty cache.
+
+    Args:
+        path (str | None): Cache file, defaults to ~/<cache_dir_name>/sessions.bin
+        ttl (float): Ticket lifetime in seconds
+        max_entries (int): Max cached peers
+        flush_delay (float): Seconds changes are collected before writing them
+        secret (str | None): Passphrase the file key is derived from, None keeps tickets in memory
+    """
+
+    def __init__(
+        self,
+        path: str | None = cfg.session_cache_path,
+        ttl: float = cfg.session_ticket_ttl,
+        max_entries: int = cfg.session_cache_size,
+        flush_delay: float = cfg.session_cache_flush_delay,
+        secret: str | None = cfg.session_cache_secret
+    ) -> None:
+        self.path = Path(path).expanduser() if path else Path.home() / cfg.cache_dir_name / "sessions.bin"
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.flush_delay = flush_delay
+        self.secret = secret
+        self._salt = b""
+        self._key = b""
+        self._entries: OrderedDict[str, tuple[bytes, bytes, float]] | None = None
+        self._lock = threading.Lock()
+        self._flush_timer: threading.Timer | None = None
+        atexit.register(self.flush)
+
+    def take(self, peer: str) -> tuple[bytes, bytes] | None:
+        """Remove and return the (ticket id, secret) for 'peer', None if missing or expired."""
+        with self._lock:
+            entries = self._load()
+            entry = entries.pop(peer, None)
+            if entry is None:
+                return None
+            self._schedule()
+            tid, secret, expires = entry
+            return (tid, secret) if expires > time() else None
+
+    def put(self, peer: str, tid: bytes, secret: bytes) -> None:
+        """Store the ticket of the current session with 'peer', replacing an older one."""
+        with self._lock:
+            entries = self._load()
+            entries.pop(peer, None)
+            entries[peer] = (tid, secret, time() + self.ttl)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            self._schedule()
+
+    def flush(self) -> None:
+        """Write pending changes now."""
+        with self._lock:
+            if self._flush_timer is None:
+                return
+            self._flush_timer.cancel()
+            self._flush_timer = None
+            self._save()
+
+    def _schedule(self) -> None:
+        if self._flush_timer is None and self.secret:
+            self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _load(self) -> OrderedDict:
+        if self._entries is not None:
+            return self._entries
+        self._entries = OrderedDict()
+        if not self.secret:
+            return self._entries
+        try:
+            blob = self.path.read_bytes()
+            salt, nonce, sealed = blob[:16], blob[16:28], blob[28:]
+            data = json.loads(ChaCha20Poly1305(self._derive(salt)).decrypt(nonce, sealed, None))
+        except FileNotFoundError:
+            return self._entries
+        except Exception as e:
+            logger.warning(f"Discarding unreadable session cache {self.path}: {e}")
+            return self._entries
+
+        now = time()
+        for peer, (tid, secret, expires) in data:
+            if expires > now:
+                self._entries[peer] = (bytes.fromhex(tid), bytes.fromhex(secret), expires)
+        return self._entries
+
+    def _save(self) -> None:
+        data = [(peer, (tid.hex(), secret.hex(), expires)) for peer, (tid, secret, expires) in self._entries.items()] # type: ignore
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if not self._salt:
+                self._derive(os.urandom(16))
+            nonce = os.urandom(12)
+            blob = self._salt + nonce + ChaCha20Poly1305(self._key).encrypt(nonce, json.dumps(data).encode(), None)
+            tmp = self.path.with_suffix(".tmp")
+            with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as f:
+                f.write(blob)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.debug(f"Cannot persist session cache: {e}")
+
+    def _derive(self, salt: bytes) -> bytes:
+        # scrypt is slow on purpose, derive once per salt
+        if salt != self._salt:
+            self._key = hashlib.scrypt(self.secret.encode(), salt=salt, n=1 << 14, r=8, p=1, dklen=32) # type: ignore
+            self._salt = salt
+        return self._key
+
+_shared: SessionCache | None = None
+_shared_lock = threading.Lock()
+
+def session_cache() -> SessionCache:
+    """Process wide session cache."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = SessionCache()
+        return _shared